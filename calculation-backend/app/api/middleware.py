@@ -0,0 +1,46 @@
+# app/api/middleware.py
+import time
+
+from app.config import PROFILE_REQUESTS
+from app.utils.metrics import REQUEST_SECONDS, RequestMetrics, end_request, start_request
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware that times every HTTP request, collects the spans recorded while handling
+    it and reports them in a Server-Timing header ("app" is the time to the first response
+    byte). Streamed responses only report what happened before streaming started.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get("headers") or [])
+        profile = PROFILE_REQUESTS == "slow" or (
+            PROFILE_REQUESTS == "header" and headers.get(b"x-profile", b"") not in (b"", b"0")
+        )
+        request_metrics = RequestMetrics(profile=profile)
+        token = start_request(request_metrics)
+        started = time.perf_counter()
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                elapsed = time.perf_counter() - started
+                route = getattr(scope.get("route"), "path", "unmatched")
+                REQUEST_SECONDS.observe(elapsed, method=scope["method"], route=route, status=message["status"])
+                timing = request_metrics.server_timing()
+                timing = f"app;dur={elapsed * 1000:.1f}" + (f", {timing}" if timing else "")
+                message = {**message, "headers": [*message.get("headers", []), (b"server-timing", timing.encode())]}
+                if request_metrics.profile_path:
+                    message["headers"].append((b"x-profile", request_metrics.profile_path.encode()))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            end_request(token)
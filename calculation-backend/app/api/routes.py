@@ -1,22 +1,128 @@
 # app/api/routes.py
-from fastapi import APIRouter
-from app.models.flowchart import Flowchart
+import json
+from typing import Optional
+from fastapi import APIRouter, Header, Request, Response
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from fastapi.routing import APIRoute
+from starlette.requests import ClientDisconnect
+from app.config import BATCH_RUN_PRIORITY, FLOWCHART_IMPORT_BATCH_SIZE
+from app.models.flowchart import BatchRunRequest, Flowchart
 from app.services.flowchart_service import (
     save_flowchart_service,
     get_flowchart_service,
-    run_flowchart_service
+    import_flowcharts_service,
+    export_flowcharts_service,
+    list_nodes_service,
+    list_edges_service,
+    run_flowchart_service,
+    stream_run_flowchart_service
 )
+from app.services.job_service import (
+    submit_run_job_service,
+    get_job_service,
+    submit_batch_run_service,
+    get_batch_run_service
+)
+from app.utils.etag import make_etag
+from app.utils.metrics import registry
+from app.utils.ndjson import RequestStreamingResponse, ndjson_groups
+from app.utils.profiling import profiled
+
+
+class ProfiledRoute(APIRoute):
+    # Any endpoint can be profiled per request; see PROFILE_REQUESTS in app/config.py.
+    def __init__(self, path, endpoint, **kwargs):
+        super().__init__(path, profiled(endpoint), **kwargs)
+
+
+router = APIRouter(route_class=ProfiledRoute)
+
+
+def _split_fields(fields: Optional[str]):
+    # "?fields=a,b.c" -> ["a", "b.c"]; no parameter means every field.
+    if fields is None:
+        return None
+    return [field.strip() for field in fields.split(",") if field.strip()]
 
-router = APIRouter()
 
 @router.post("/flowchart/{flowchart_id}")
-def save_flowchart(flowchart_id: str, flowchart: Flowchart):
-    return save_flowchart_service(flowchart)
+async def save_flowchart(flowchart_id: str, flowchart: Flowchart, response: Response,
+                         if_match: Optional[str] = Header(None)):
+    result = await save_flowchart_service(flowchart, if_match=if_match)
+    response.headers["ETag"] = make_etag(result["version"])
+    return result
 
 @router.get("/flowchart/{flowchart_id}")
-def get_flowchart(flowchart_id: str):
-    return get_flowchart_service(flowchart_id)
+async def get_flowchart(flowchart_id: str, fields: Optional[str] = None,
+                        if_none_match: Optional[str] = Header(None)):
+    return await get_flowchart_service(flowchart_id, fields=_split_fields(fields), if_none_match=if_none_match)
+
+@router.get("/flowchart/{flowchart_id}/nodes")
+async def list_nodes(flowchart_id: str, bbox: Optional[str] = None, fields: Optional[str] = None,
+                     limit: int = 500, cursor: Optional[str] = None):
+    return await list_nodes_service(flowchart_id, bbox=bbox, fields=_split_fields(fields), limit=limit, cursor=cursor)
+
+@router.get("/flowchart/{flowchart_id}/edges")
+async def list_edges(flowchart_id: str, bbox: Optional[str] = None, fields: Optional[str] = None,
+                     limit: int = 500, cursor: Optional[str] = None):
+    return await list_edges_service(flowchart_id, bbox=bbox, fields=_split_fields(fields), limit=limit, cursor=cursor)
 
 @router.post("/flowchart/{flowchart_id}/run")
-def run_flowchart(flowchart_id: str):
-    return run_flowchart_service(flowchart_id)
+async def run_flowchart(flowchart_id: str, force: bool = False):
+    return await run_flowchart_service(flowchart_id, force=force)
+
+@router.post("/flowchart/{flowchart_id}/run/stream")
+async def stream_run_flowchart(flowchart_id: str, force: bool = False):
+    # The flowchart is loaded (and a missing one reported) before the response starts.
+    events = await stream_run_flowchart_service(flowchart_id, force=force)
+    return StreamingResponse(events, media_type="application/x-ndjson")
+
+@router.post("/flowchart/{flowchart_id}/jobs", status_code=202)
+async def submit_run_job(flowchart_id: str, force: bool = False):
+    return await submit_run_job_service(flowchart_id, force=force)
+
+@router.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    return await get_job_service(job_id)
+
+@router.post("/flowcharts/import")
+async def import_flowcharts(request: Request, check_versions: bool = False):
+    # The body is read as it arrives, one group of flowcharts at a time, and the results of
+    # each group are streamed back before the next group is read.
+    async def lines():
+        imported = failed = 0
+        try:
+            async for group in ndjson_groups(request.stream(), FLOWCHART_IMPORT_BATCH_SIZE):
+                for result in await import_flowcharts_service(group, check_versions):
+                    if result["status"] == 200:
+                        imported += 1
+                    else:
+                        failed += 1
+                    yield json.dumps(result) + "\n"
+        except ClientDisconnect:
+            return
+        except Exception as e:
+            yield json.dumps({"type": "error", "detail": str(e)}) + "\n"
+        yield json.dumps({"type": "summary", "imported": imported, "failed": failed}) + "\n"
+
+    return RequestStreamingResponse(lines(), media_type="application/x-ndjson")
+
+@router.get("/flowcharts/export")
+async def export_flowcharts(ids: Optional[str] = None):
+    return StreamingResponse(
+        export_flowcharts_service(_split_fields(ids)),
+        media_type="application/x-ndjson"
+    )
+
+@router.post("/batch-runs", status_code=202)
+async def submit_batch_run(batch: BatchRunRequest):
+    priority = BATCH_RUN_PRIORITY if batch.priority is None else batch.priority
+    return await submit_batch_run_service(batch.flowchart_ids, force=batch.force, priority=priority)
+
+@router.get("/batch-runs/{batch_id}")
+async def get_batch_run(batch_id: str):
+    return await get_batch_run_service(batch_id)
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
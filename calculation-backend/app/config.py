@@ -0,0 +1,105 @@
+# app/config.py
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# DynamoDB endpoint, DynamoDB Local by default. Set it to an empty string to use AWS itself.
+DYNAMODB_ENDPOINT_URL = os.getenv("DYNAMODB_ENDPOINT_URL", "http://localhost:8000")
+AWS_REGION = os.getenv("AWS_REGION", "us-east-1")
+
+# The async DynamoDB client keeps up to DYNAMODB_MAX_POOL_CONNECTIONS connections open; calls
+# beyond that wait for a free one. Tables and indexes are set up by a one-time task started
+# with the app: missing ones are created, unless DYNAMODB_CREATE_TABLES is "false" (tables
+# managed elsewhere), in which case they are only checked to exist.
+DYNAMODB_MAX_POOL_CONNECTIONS = int(os.getenv("DYNAMODB_MAX_POOL_CONNECTIONS", "100"))
+DYNAMODB_CREATE_TABLES = os.getenv("DYNAMODB_CREATE_TABLES", "true").lower() not in ("0", "false", "no")
+
+# Threads for CPU-bound work (encoding, hashing, solving, prompt building) that is moved off
+# the event loop, shared with any sync code run by the framework.
+THREADPOOL_SIZE = int(os.getenv("THREADPOOL_SIZE", "40"))
+
+# OpenAI model used for property recommendations.
+LLM_MODEL = os.getenv("LLM_MODEL", "gpt-3.5-turbo")
+
+# LLM recommendation cache: in-process LRU in front of the LLMCache DynamoDB table.
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "512"))
+LLM_CACHE_TTL_SECONDS = int(os.getenv("LLM_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+
+# Large flowcharts are split into chunks of at most this many estimated prompt tokens,
+# and up to LLM_MAX_CONCURRENCY chunks are sent to the model at the same time.
+LLM_CHUNK_TOKEN_BUDGET = int(os.getenv("LLM_CHUNK_TOKEN_BUDGET", "6000"))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "4"))
+
+# Connection pool of the async OpenAI client: connections open at once, and how many of them
+# are kept alive between requests.
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "100"))
+LLM_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", "20"))
+
+# Model rate limits shared by every run of this process, enforced with token buckets:
+# requests and tokens per minute (0 disables a limit) and requests in flight at once. Each
+# request reserves its prompt tokens plus LLM_EXPECTED_COMPLETION_TOKENS and is settled with
+# the actual usage afterwards. Rate-limited (429) and failed requests are retried up to
+# LLM_MAX_RETRIES times with exponential backoff from LLM_RETRY_BASE_SECONDS.
+LLM_REQUESTS_PER_MINUTE = int(os.getenv("LLM_REQUESTS_PER_MINUTE", "3500"))
+LLM_TOKENS_PER_MINUTE = int(os.getenv("LLM_TOKENS_PER_MINUTE", "200000"))
+LLM_MAX_IN_FLIGHT = int(os.getenv("LLM_MAX_IN_FLIGHT", "16"))
+LLM_EXPECTED_COMPLETION_TOKENS = int(os.getenv("LLM_EXPECTED_COMPLETION_TOKENS", "1000"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "5"))
+LLM_RETRY_BASE_SECONDS = float(os.getenv("LLM_RETRY_BASE_SECONDS", "1"))
+LLM_RETRY_MAX_SECONDS = float(os.getenv("LLM_RETRY_MAX_SECONDS", "60"))
+
+# Prompt encoding: "compact" (numbered property header and one row per item) or "verbose".
+# Prompts measured above LLM_PROMPT_TOKEN_LIMIT tokens are split further or refused.
+PROMPT_ENCODING = os.getenv("PROMPT_ENCODING", "compact")
+LLM_PROMPT_TOKEN_LIMIT = int(os.getenv("LLM_PROMPT_TOKEN_LIMIT", "12000"))
+
+# On a run, nodes within this many hops of a changed node or edge are sent to the model again.
+RUN_DIRTY_RADIUS = int(os.getenv("RUN_DIRTY_RADIUS", "1"))
+
+# Run jobs: how many run at the same time, how many may wait for their turn, and where job
+# state lives ("memory" for a single node, "dynamodb" to share it between nodes). A job's
+# lock of its flowchart expires after JOB_LOCK_TTL_SECONDS unless its run renews it.
+RUN_WORKERS = int(os.getenv("RUN_WORKERS", "4"))
+RUN_QUEUE_LIMIT = int(os.getenv("RUN_QUEUE_LIMIT", "100"))
+JOB_STORE = os.getenv("JOB_STORE", "memory")
+JOB_LOCK_TTL_SECONDS = int(os.getenv("JOB_LOCK_TTL_SECONDS", "900"))
+# Finished jobs and batches can be polled for this long before they are dropped.
+JOB_RETENTION_SECONDS = int(os.getenv("JOB_RETENTION_SECONDS", "86400"))
+
+# Batch runs: how many of their flowcharts run at the same time, the model priority of
+# batch runs (interactive runs have priority 0; lower goes first) and the largest batch.
+BATCH_RUN_WORKERS = int(os.getenv("BATCH_RUN_WORKERS", "8"))
+BATCH_RUN_PRIORITY = int(os.getenv("BATCH_RUN_PRIORITY", "10"))
+BATCH_RUN_MAX_FLOWCHARTS = int(os.getenv("BATCH_RUN_MAX_FLOWCHARTS", "10000"))
+
+# Bulk import: flowcharts read from the NDJSON body and written together, sharing batched
+# node/edge writes.
+FLOWCHART_IMPORT_BATCH_SIZE = int(os.getenv("FLOWCHART_IMPORT_BATCH_SIZE", "25"))
+
+# Flowchart storage: bodies larger than FLOWCHART_INLINE_MAX_BYTES of JSON are stored
+# compressed, in parts of FLOWCHART_PART_BYTES when needed, to stay under the 400 KB item
+# limit. Node/edge style and markerEnd values are compressed from FLOWCHART_BLOB_MIN_BYTES.
+FLOWCHART_INLINE_MAX_BYTES = int(os.getenv("FLOWCHART_INLINE_MAX_BYTES", str(256 * 1024)))
+FLOWCHART_PART_BYTES = int(os.getenv("FLOWCHART_PART_BYTES", str(350 * 1024)))
+FLOWCHART_BLOB_MIN_BYTES = int(os.getenv("FLOWCHART_BLOB_MIN_BYTES", "256"))
+
+# Viewport reads: nodes are bucketed into square grid cells of FLOWCHART_GRID_CELL_SIZE canvas
+# units. Boxes covering more than FLOWCHART_GRID_MAX_CELLS cells are answered from the
+# flowchart's own rows instead. Node/edge listings return at most FLOWCHART_PAGE_MAX_ITEMS
+# items per page.
+FLOWCHART_GRID_CELL_SIZE = float(os.getenv("FLOWCHART_GRID_CELL_SIZE", "500"))
+FLOWCHART_GRID_MAX_CELLS = int(os.getenv("FLOWCHART_GRID_MAX_CELLS", "256"))
+FLOWCHART_PAGE_MAX_ITEMS = int(os.getenv("FLOWCHART_PAGE_MAX_ITEMS", "1000"))
+
+# Read-through cache of recently read flowcharts, invalidated by writes from this process.
+# Entries expire after FLOWCHART_CACHE_TTL_SECONDS so writes from other nodes show up too.
+FLOWCHART_CACHE_MAX_ENTRIES = int(os.getenv("FLOWCHART_CACHE_MAX_ENTRIES", "64"))
+FLOWCHART_CACHE_TTL_SECONDS = int(os.getenv("FLOWCHART_CACHE_TTL_SECONDS", "30"))
+
+# Request profiling: "off", "header" (requests sent with "X-Profile: 1" are profiled) or
+# "slow" (every request is profiled and the profile is kept if the request took longer than
+# PROFILE_SLOW_MS). cProfile dumps are written to PROFILE_DIR.
+PROFILE_REQUESTS = os.getenv("PROFILE_REQUESTS", "off")
+PROFILE_SLOW_MS = float(os.getenv("PROFILE_SLOW_MS", "1000"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
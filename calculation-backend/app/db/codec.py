@@ -0,0 +1,161 @@
+# app/db/codec.py
+import json
+import zlib
+from decimal import Decimal
+from typing import Any, Dict
+
+from boto3.dynamodb.types import Binary
+
+from app.utils.decimal_converter import convert_decimal_to_number, convert_floats_to_decimal
+
+# Node and edge attributes that are stored as compressed JSON (<name>_z) once they are large.
+BLOB_FIELDS = ("style", "markerEnd")
+# Plain values that never need converting in either direction.
+_SCALARS = (str, bool, int, type(None))
+
+
+def _to_decimal(value: Any) -> Any:
+    return Decimal(str(value)) if isinstance(value, float) else value
+
+
+def _to_float(value: Any) -> Any:
+    return float(value) if isinstance(value, Decimal) else value
+
+
+def _to_number(value: Any) -> Any:
+    # Integral numbers come back as int, so that a decoded item hashes like the one saved.
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    return value
+
+
+def compress_json(value: Any) -> Binary:
+    return Binary(zlib.compress(json.dumps(value, separators=(",", ":")).encode("utf-8")))
+
+
+def decompress_json(blob: Any) -> Any:
+    raw = blob.value if isinstance(blob, Binary) else bytes(blob)
+    return json.loads(zlib.decompress(raw))
+
+
+def _is_plain_property(prop: Any) -> bool:
+    # {"value": <scalar or float>, "isLocked": ..., ...} with no other numbers to convert:
+    # the shape almost every property has.
+    return isinstance(prop, dict) and all(
+        isinstance(value, _SCALARS) or (key == "value" and isinstance(value, (float, Decimal)))
+        for key, value in prop.items()
+    )
+
+
+def _encode_property(prop: Any) -> Any:
+    if not _is_plain_property(prop):
+        return convert_floats_to_decimal(prop)
+    if isinstance(prop.get("value"), float):
+        return {**prop, "value": _to_decimal(prop["value"])}
+    return prop
+
+
+def _encode_data(data: Dict[str, Any]) -> Dict[str, Any]:
+    encoded = dict(data)
+    properties = data.get("properties")
+    if isinstance(properties, dict):
+        encoded["properties"] = {name: _encode_property(prop) for name, prop in properties.items()}
+    elif properties is not None:
+        encoded["properties"] = convert_floats_to_decimal(properties)
+    for key, value in data.items():
+        if key != "properties" and not isinstance(value, _SCALARS):
+            encoded[key] = convert_floats_to_decimal(value)
+    return encoded
+
+
+def _decode_data(data: Dict[str, Any]) -> Dict[str, Any]:
+    properties = data.get("properties")
+    if isinstance(properties, dict):
+        for name, prop in properties.items():
+            if not _is_plain_property(prop):
+                properties[name] = convert_decimal_to_number(prop)
+            elif isinstance(prop.get("value"), Decimal):
+                prop["value"] = _to_number(prop["value"])
+    elif properties is not None:
+        data["properties"] = convert_decimal_to_number(properties)
+    for key, value in data.items():
+        if key != "properties" and not isinstance(value, _SCALARS):
+            data[key] = convert_decimal_to_number(value)
+    return data
+
+
+def _encode_blobs(encoded: Dict[str, Any], blob_min_bytes: int) -> None:
+    for field in BLOB_FIELDS:
+        value = encoded.get(field)
+        if not value:
+            continue
+        blob = compress_json(value)
+        if len(blob.value) >= blob_min_bytes:
+            del encoded[field]
+            encoded[f"{field}_z"] = blob
+        else:
+            encoded[field] = convert_floats_to_decimal(value)
+
+
+def _decode_blobs(item: Dict[str, Any]) -> None:
+    for field in BLOB_FIELDS:
+        if f"{field}_z" in item:
+            item[field] = decompress_json(item.pop(f"{field}_z"))
+        elif item.get(field):
+            item[field] = convert_decimal_to_number(item[field])
+
+
+def encode_node(node: Dict[str, Any], blob_min_bytes: int) -> Dict[str, Any]:
+    """
+    Return a DynamoDB-ready copy of a plain node. Only the known numeric fields (position,
+    width, height, numeric property values) are converted; untouched subtrees are shared
+    with `node`, which is left as it is.
+    """
+    encoded = dict(node)
+    if isinstance(node.get("position"), dict):
+        encoded["position"] = {axis: _to_decimal(value) for axis, value in node["position"].items()}
+    for field in ("width", "height"):
+        if field in node:
+            encoded[field] = _to_decimal(node[field])
+    if node.get("data"):
+        encoded["data"] = _encode_data(node["data"])
+    _encode_blobs(encoded, blob_min_bytes)
+    return encoded
+
+
+def decode_node(item: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Turn a node read from DynamoDB back into plain JSON types, in place.
+    """
+    if isinstance(item.get("position"), dict):
+        # Saves validate these as floats (see app/models/flowchart.py); property values keep
+        # their ints.
+        item["position"] = {axis: _to_float(value) for axis, value in item["position"].items()}
+    for field in ("width", "height"):
+        if field in item:
+            item[field] = _to_float(item[field])
+    if item.get("data"):
+        _decode_data(item["data"])
+    _decode_blobs(item)
+    return item
+
+
+def encode_edge(edge: Dict[str, Any], blob_min_bytes: int) -> Dict[str, Any]:
+    """
+    Return a DynamoDB-ready copy of a plain edge; see encode_node.
+    """
+    encoded = dict(edge)
+    if edge.get("data"):
+        encoded["data"] = _encode_data(edge["data"])
+    _encode_blobs(encoded, blob_min_bytes)
+    return encoded
+
+
+def decode_edge(item: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Turn an edge read from DynamoDB back into plain JSON types, in place.
+    """
+    if item.get("data"):
+        _decode_data(item["data"])
+    _decode_blobs(item)
+    return item
@@ -1,47 +1,317 @@
-import boto3
+# app/db/dynamodb.py
+import asyncio
+import contextvars
+import time
+from contextlib import AsyncExitStack, asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
 from botocore.exceptions import ClientError
 
-# Configure connection to DynamoDB Local with dummy credentials.
-dynamodb = boto3.resource(
-    "dynamodb",
-    endpoint_url="http://localhost:8000",
-    region_name="us-east-1",
-    aws_access_key_id="dummy",
-    aws_secret_access_key="dummy"
-)
+from app.config import AWS_REGION, DYNAMODB_CREATE_TABLES, DYNAMODB_ENDPOINT_URL, DYNAMODB_MAX_POOL_CONNECTIONS
+from app.utils.metrics import DYNAMODB_BYTES, DYNAMODB_CAPACITY, record_span
+
+# Operations that report the capacity they consume when asked to.
+_CAPACITY_OPERATIONS = {
+    "GetItem", "PutItem", "UpdateItem", "DeleteItem", "Query", "Scan",
+    "BatchGetItem", "BatchWriteItem", "TransactGetItems", "TransactWriteItems"
+}
+
+
+def _ask_for_capacity(params, model, **kwargs):
+    if model.name in _CAPACITY_OPERATIONS:
+        params.setdefault("ReturnConsumedCapacity", "TOTAL")
+
+
+def _start_timer(params, model, context, **kwargs):
+    context["started_at"] = time.perf_counter()
+    DYNAMODB_BYTES.observe(len(params.get("body") or b""), operation=model.name, direction="request")
+
+
+async def _record_call(http_response, parsed, model, context, **kwargs):
+    # Every DynamoDB call is a span of its own, "dynamodb.<Operation>".
+    if "started_at" in context:
+        record_span(f"dynamodb.{model.name}", time.perf_counter() - context["started_at"])
+    if http_response is not None:
+        content = await http_response.content
+        DYNAMODB_BYTES.observe(len(content or b""), operation=model.name, direction="response")
+    consumed = parsed.get("ConsumedCapacity") if isinstance(parsed, dict) else None
+    for capacity in consumed if isinstance(consumed, list) else [consumed] if consumed else []:
+        DYNAMODB_CAPACITY.inc(capacity.get("CapacityUnits", 0),
+                              table=capacity.get("TableName", ""), operation=model.name)
+
+
+def _global_secondary_index(name: str, hash_key: str, range_key: str) -> dict:
+    return {
+        "IndexName": name,
+        "KeySchema": [
+            {"AttributeName": hash_key, "KeyType": "HASH"},
+            {"AttributeName": range_key, "KeyType": "RANGE"}
+        ],
+        "Projection": {"ProjectionType": "ALL"},
+        "ProvisionedThroughput": {"ReadCapacityUnits": 5, "WriteCapacityUnits": 5}
+    }
+
+
+FLOWCHART_TABLE = "Flowcharts"
+NODE_TABLE = "FlowchartNodes"
+EDGE_TABLE = "FlowchartEdges"
+LLM_CACHE_TABLE = "LLMCache"
+JOB_TABLE = "Jobs"
+
+# Tables of earlier versions that newer ones replace: the Nodes and Edges tables, keyed by
+# node or edge id alone. A set-up that finds one runs the registered migrations, which fill
+# their successors from the Flowcharts table, and then deletes it (see DynamoDB).
+LEGACY_TABLES = ("Nodes", "Edges")
+
+# Secondary indexes on the Nodes and Edges tables: the grid cells used for viewport queries
+# (see app/services/spatial_index.py). The cell attributes are only set on items with a
+# position, so the cell indexes stay sparse.
+CELL_INDEX = "fc_cell-index"
+TARGET_CELL_INDEX = "fc_target_cell-index"
+
+# Every table the app uses, by name: key schema, attribute definitions and secondary indexes,
+# and the attribute DynamoDB's TTL deletes expired items by, if any ("TimeToLiveAttribute").
+TABLES: Dict[str, Dict[str, Any]] = {
+    # Flowcharts, keyed by "id".
+    FLOWCHART_TABLE: {
+        "KeySchema": [{"AttributeName": "id", "KeyType": "HASH"}],
+        "AttributeDefinitions": [{"AttributeName": "id", "AttributeType": "S"}]
+    },
+    # Nodes, keyed by flowchart and node id (ids are only unique within a flowchart) and
+    # queryable by grid cell.
+    NODE_TABLE: {
+        "KeySchema": [
+            {"AttributeName": "flowchart_id", "KeyType": "HASH"},
+            {"AttributeName": "id", "KeyType": "RANGE"}
+        ],
+        "AttributeDefinitions": [
+            {"AttributeName": "flowchart_id", "AttributeType": "S"},
+            {"AttributeName": "id", "AttributeType": "S"},
+            {"AttributeName": "fc_cell", "AttributeType": "S"}
+        ],
+        "GlobalSecondaryIndexes": [
+            _global_secondary_index(CELL_INDEX, "fc_cell", "id")
+        ]
+    },
+    # Edges, keyed like nodes and queryable by the grid cells of both endpoints.
+    EDGE_TABLE: {
+        "KeySchema": [
+            {"AttributeName": "flowchart_id", "KeyType": "HASH"},
+            {"AttributeName": "id", "KeyType": "RANGE"}
+        ],
+        "AttributeDefinitions": [
+            {"AttributeName": "flowchart_id", "AttributeType": "S"},
+            {"AttributeName": "id", "AttributeType": "S"},
+            {"AttributeName": "fc_cell", "AttributeType": "S"},
+            {"AttributeName": "fc_target_cell", "AttributeType": "S"}
+        ],
+        "GlobalSecondaryIndexes": [
+            _global_secondary_index(CELL_INDEX, "fc_cell", "id"),
+            _global_secondary_index(TARGET_CELL_INDEX, "fc_target_cell", "id")
+        ]
+    },
+    # Cached LLM recommendations, keyed by a hash of the flowchart state.
+    LLM_CACHE_TABLE: {
+        "KeySchema": [{"AttributeName": "cache_key", "KeyType": "HASH"}],
+        "AttributeDefinitions": [{"AttributeName": "cache_key", "AttributeType": "S"}],
+        "TimeToLiveAttribute": "expires_at"
+    },
+    # Run jobs and the per-flowchart locks used to deduplicate them; expired locks and finished
+    # jobs past their retention are deleted by TTL.
+    JOB_TABLE: {
+        "KeySchema": [{"AttributeName": "job_id", "KeyType": "HASH"}],
+        "AttributeDefinitions": [{"AttributeName": "job_id", "AttributeType": "S"}],
+        "TimeToLiveAttribute": "expires_at"
+    }
+}
+
+
+async def _add_missing_indexes(client, table_name: str, description: dict, spec: dict) -> None:
+    # Tables created before an index was introduced get it added one index at a time, which
+    # is all DynamoDB allows per update.
+    existing = {index["IndexName"] for index in description.get("GlobalSecondaryIndexes", [])}
+    for index in spec.get("GlobalSecondaryIndexes", []):
+        if index["IndexName"] in existing:
+            continue
+        await client.update_table(
+            TableName=table_name,
+            AttributeDefinitions=spec["AttributeDefinitions"],
+            GlobalSecondaryIndexUpdates=[{"Create": index}]
+        )
+        while True:
+            description = (await client.describe_table(TableName=table_name))["Table"]
+            statuses = {i["IndexName"]: i.get("IndexStatus") for i in description.get("GlobalSecondaryIndexes", [])}
+            if statuses.get(index["IndexName"]) in (None, "ACTIVE"):
+                break
+            await asyncio.sleep(1)
+
+
+async def _enable_time_to_live(client, table_name: str, attribute: str) -> None:
+    ttl = (await client.describe_time_to_live(TableName=table_name))["TimeToLiveDescription"]
+    if ttl.get("TimeToLiveStatus") in ("ENABLED", "ENABLING") and ttl.get("AttributeName") == attribute:
+        return
+    await client.update_time_to_live(
+        TableName=table_name,
+        TimeToLiveSpecification={"Enabled": True, "AttributeName": attribute}
+    )
+
+
+async def _table_exists(client, table_name: str) -> bool:
+    # A table that is being deleted no longer counts.
+    try:
+        description = (await client.describe_table(TableName=table_name))["Table"]
+        return description["TableStatus"] != "DELETING"
+    except ClientError as e:
+        if e.response["Error"]["Code"] != "ResourceNotFoundException":
+            raise
+        return False
+
 
-def create_table_if_not_exists(table_name: str, key_schema: list, attribute_definitions: list):
+async def create_table_if_not_exists(client, table_name: str, spec: dict, create: bool = True) -> None:
+    """
+    Make sure `table_name` exists with the key schema, secondary indexes and TTL of `spec`,
+    creating the table, the missing indexes or the TTL when `create` is set. A table with
+    another key schema cannot be changed in place and raises RuntimeError.
+    """
+    table_spec = {key: value for key, value in spec.items() if key != "TimeToLiveAttribute"}
     try:
-        table = dynamodb.Table(table_name)
-        table.load()  # This will raise an exception if table doesn't exist.
-        return table
+        description = (await client.describe_table(TableName=table_name))["Table"]
     except ClientError as e:
-        table = dynamodb.create_table(
+        if e.response["Error"]["Code"] != "ResourceNotFoundException" or not create:
+            raise
+        await client.create_table(
             TableName=table_name,
-            KeySchema=key_schema,
-            AttributeDefinitions=attribute_definitions,
-            ProvisionedThroughput={"ReadCapacityUnits": 5, "WriteCapacityUnits": 5}
+            ProvisionedThroughput={"ReadCapacityUnits": 5, "WriteCapacityUnits": 5},
+            **table_spec
         )
-        table.wait_until_exists()
-        return table
-
-# Create a table for flowcharts. We use "id" as the primary key.
-flowchart_table = create_table_if_not_exists(
-    "Flowcharts",
-    key_schema=[{"AttributeName": "id", "KeyType": "HASH"}],
-    attribute_definitions=[{"AttributeName": "id", "AttributeType": "S"}]
-)
-
-# Create a table for nodes.
-node_table = create_table_if_not_exists(
-    "Nodes",
-    key_schema=[{"AttributeName": "id", "KeyType": "HASH"}],
-    attribute_definitions=[{"AttributeName": "id", "AttributeType": "S"}]
-)
-
-# Create a table for edges.
-edge_table = create_table_if_not_exists(
-    "Edges",
-    key_schema=[{"AttributeName": "id", "KeyType": "HASH"}],
-    attribute_definitions=[{"AttributeName": "id", "AttributeType": "S"}]
-)
+        await client.get_waiter("table_exists").wait(TableName=table_name)
+        description = None
+    if description is not None and description["KeySchema"] != spec["KeySchema"]:
+        raise RuntimeError(
+            f"Table {table_name} is keyed on {description['KeySchema']} instead of {spec['KeySchema']}; "
+            "it has to be recreated (and its flowcharts saved again)"
+        )
+    if create:
+        if description is not None:
+            await _add_missing_indexes(client, table_name, description, spec)
+        if "TimeToLiveAttribute" in spec:
+            await _enable_time_to_live(client, table_name, spec["TimeToLiveAttribute"])
+
+
+# Set in the set-up task (and the tasks it starts) while it runs migrations.
+_migrating: contextvars.ContextVar[bool] = contextvars.ContextVar("dynamodb_migrating", default=False)
+
+
+class DynamoDB:
+    """
+    The async DynamoDB resource of this process and its tables. It is opened and closed by
+    the app's lifespan (see app/main.py), which makes no network calls; the tables are set up
+    by a one-time task started on opening, and `table` waits for that task. A failed set-up
+    is started again by the next caller.
+    When the set-up creates tables and finds LEGACY_TABLES, it also runs the migrations
+    registered with `add_migration` and then deletes the legacy tables; requests wait for
+    that as well. An interrupted migration is run again by the next set-up.
+    """
+
+    def __init__(self):
+        self.resource = None
+        self._stack: Optional[AsyncExitStack] = None
+        self._setup: Optional[asyncio.Task] = None
+        self._tables: Dict[str, Any] = {}
+        self._ready = False
+        self._migrations: List[Callable[[], Awaitable[None]]] = []
+
+    def add_migration(self, migration: Callable[[], Awaitable[None]]) -> None:
+        """
+        Register a coroutine function that fills the current tables from the Flowcharts table,
+        run by set-ups that find legacy tables. It can use `table` like any request.
+        """
+        self._migrations.append(migration)
+
+    async def open(self) -> None:
+        # Imported here rather than with the app, whose start-up it would slow down.
+        import aioboto3
+        from aiobotocore.config import AioConfig
+
+        # Against a custom endpoint (DynamoDB Local) dummy credentials are used; otherwise
+        # the regular AWS endpoint and credential chain.
+        options: Dict[str, Any] = {}
+        if DYNAMODB_ENDPOINT_URL:
+            options = {"endpoint_url": DYNAMODB_ENDPOINT_URL, "aws_access_key_id": "dummy",
+                       "aws_secret_access_key": "dummy"}
+        self._stack = AsyncExitStack()
+        self.resource = await self._stack.enter_async_context(aioboto3.Session().resource(
+            "dynamodb", region_name=AWS_REGION,
+            config=AioConfig(max_pool_connections=DYNAMODB_MAX_POOL_CONNECTIONS), **options
+        ))
+        events = self.resource.meta.client.meta.events
+        events.register("provide-client-params.dynamodb.*", _ask_for_capacity)
+        events.register("before-call.dynamodb.*", _start_timer)
+        events.register("after-call.dynamodb.*", _record_call)
+        self.start_setup()
+
+    async def close(self) -> None:
+        if self._setup is not None and not self._setup.done():
+            self._setup.cancel()
+            await asyncio.gather(self._setup, return_exceptions=True)
+        self._setup = None
+        self._tables = {}
+        self._ready = False
+        if self._stack is not None:
+            await self._stack.aclose()
+        self._stack = None
+        self.resource = None
+
+    def start_setup(self) -> asyncio.Task:
+        """Start setting up the tables, unless that is under way or has succeeded already."""
+        if self._setup is None or (self._setup.done() and (self._setup.cancelled() or self._setup.exception())):
+            self._setup = asyncio.ensure_future(self._set_up_tables())
+        return self._setup
+
+    async def _set_up_tables(self) -> None:
+        client = self.resource.meta.client
+        await asyncio.gather(*(
+            create_table_if_not_exists(client, name, spec, create=DYNAMODB_CREATE_TABLES)
+            for name, spec in TABLES.items()
+        ))
+        self._tables = {name: await self.resource.Table(name) for name in TABLES}
+        if DYNAMODB_CREATE_TABLES and self._migrations:
+            legacy = [name for name in LEGACY_TABLES if await _table_exists(client, name)]
+            if legacy:
+                # The migrations use the tables before the set-up has finished.
+                _migrating.set(True)
+                for migration in self._migrations:
+                    await migration()
+                for name in legacy:
+                    await client.delete_table(TableName=name)
+        self._ready = True
+
+    async def ready(self) -> None:
+        """Wait until the tables have been set up."""
+        if self.resource is None:
+            raise RuntimeError("DynamoDB is not open; run the app with its lifespan or inside open_dynamodb()")
+        if not self._ready and not _migrating.get():
+            # Shielded: a cancelled request must not cancel the set-up other requests wait for.
+            await asyncio.shield(self.start_setup())
+
+    async def table(self, name: str):
+        """The resource of table `name`, once the tables have been set up."""
+        await self.ready()
+        return self._tables[name]
+
+    async def batch_get_item(self, **kwargs) -> dict:
+        await self.ready()
+        return await self.resource.batch_get_item(**kwargs)
+
+
+dynamodb = DynamoDB()
+
+
+@asynccontextmanager
+async def open_dynamodb() -> AsyncIterator[DynamoDB]:
+    """Open `dynamodb` for the duration of the block, e.g. in scripts that use the services."""
+    await dynamodb.open()
+    try:
+        yield dynamodb
+    finally:
+        await dynamodb.close()
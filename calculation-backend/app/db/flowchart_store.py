@@ -0,0 +1,262 @@
+# app/db/flowchart_store.py
+import hashlib
+import json
+import zlib
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from boto3.dynamodb.conditions import Attr
+from boto3.dynamodb.types import Binary
+from botocore.exceptions import ClientError
+from fastapi.concurrency import run_in_threadpool
+
+from app.config import FLOWCHART_BLOB_MIN_BYTES, FLOWCHART_INLINE_MAX_BYTES, FLOWCHART_PART_BYTES
+from app.db.codec import decode_edge, decode_node, encode_edge, encode_node
+from app.db.dynamodb import FLOWCHART_TABLE, dynamodb
+from app.utils.decimal_converter import convert_decimal_to_number, convert_floats_to_decimal
+from app.utils.metrics import FLOWCHART_ITEM_BYTES, span
+
+# Attributes that grow with the size of the diagram (or, for the notes of a run, with its
+# number of failed chunks). When they do not fit comfortably in one item they are stored
+# together as compressed JSON, split over "<id>#<generation>#<n>" items if needed, so that
+# no item gets near the 400 KB DynamoDB limit.
+BULK_FIELDS = ("nodes", "edges", "manifest", "last_run", "notes")
+# Bulk fields encoded item by item by app/db/codec.py when stored inline.
+_DIAGRAM_FIELDS = ("nodes", "edges")
+BODY_FIELD = "body_z"
+PARTS_FIELD = "parts"
+GENERATION_FIELD = "generation"
+# Kept on decoded flowcharts so that the next write can clean up the parts it replaces.
+STORAGE_FIELDS = (PARTS_FIELD, GENERATION_FIELD)
+# Incremented by every write; flowcharts written before versioning read as version 0.
+VERSION_FIELD = "version"
+
+
+class VersionConflictError(Exception):
+    """
+    Raised when a flowchart was written by someone else since it was read.
+    """
+
+    def __init__(self, flowchart_id: str, expected_version: int):
+        super().__init__(f"Flowchart {flowchart_id} was modified since version {expected_version}")
+        self.flowchart_id = flowchart_id
+        self.expected_version = expected_version
+
+
+def encode_flowchart_item(item: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    Encode a plain flowchart for DynamoDB. Returns the items to write: the flowchart item
+    itself first, followed by any overflow parts.
+    """
+    body = {field: item[field] for field in BULK_FIELDS if field in item}
+    raw = json.dumps(body, separators=(",", ":")).encode("utf-8")
+    encoded = {
+        field: convert_floats_to_decimal(value) for field, value in item.items()
+        if field not in BULK_FIELDS and field not in STORAGE_FIELDS and field != VERSION_FIELD
+    }
+
+    if len(raw) <= FLOWCHART_INLINE_MAX_BYTES:
+        FLOWCHART_ITEM_BYTES.observe(len(raw), layout="inline")
+        encoded.update(
+            (field, convert_floats_to_decimal(value)) for field, value in body.items() if field not in _DIAGRAM_FIELDS
+        )
+        encoded["nodes"] = [encode_node(node, FLOWCHART_BLOB_MIN_BYTES) for node in item.get("nodes", [])]
+        encoded["edges"] = [encode_edge(edge, FLOWCHART_BLOB_MIN_BYTES) for edge in item.get("edges", [])]
+        return [encoded]
+
+    blob = zlib.compress(raw)
+    if len(blob) <= FLOWCHART_PART_BYTES:
+        FLOWCHART_ITEM_BYTES.observe(len(raw), layout="compressed")
+        encoded[BODY_FIELD] = Binary(blob)
+        return [encoded]
+
+    FLOWCHART_ITEM_BYTES.observe(len(raw), layout="parts")
+    generation = hashlib.sha256(blob).hexdigest()[:12]
+    parts = [blob[start:start + FLOWCHART_PART_BYTES] for start in range(0, len(blob), FLOWCHART_PART_BYTES)]
+    encoded[PARTS_FIELD] = len(parts)
+    encoded[GENERATION_FIELD] = generation
+    return [encoded] + [
+        {"id": f"{item['id']}#{generation}#{number}", BODY_FIELD: Binary(part)}
+        for number, part in enumerate(parts)
+    ]
+
+
+async def _read_parts(flowchart_id: str, generation: str, count: int) -> bytes:
+    keys = [{"id": f"{flowchart_id}#{generation}#{number}"} for number in range(count)]
+    found: Dict[str, bytes] = {}
+    for start in range(0, len(keys), 100):
+        request = {FLOWCHART_TABLE: {"Keys": keys[start:start + 100], "ConsistentRead": True}}
+        while request:
+            response = await dynamodb.batch_get_item(RequestItems=request)
+            for part in response["Responses"].get(FLOWCHART_TABLE, []):
+                found[part["id"]] = part[BODY_FIELD].value
+            request = response.get("UnprocessedKeys") or None
+    return b"".join(found[key["id"]] for key in keys)
+
+
+def decode_flowchart_item(item: Dict[str, Any], parts: Optional[bytes] = None) -> Dict[str, Any]:
+    """
+    Turn a flowchart item read from DynamoDB back into a plain flowchart, in place. When the
+    body was split, `parts` are its overflow parts as read by _read_parts.
+    """
+    if BODY_FIELD in item or PARTS_FIELD in item:
+        if PARTS_FIELD in item:
+            item[PARTS_FIELD] = int(item[PARTS_FIELD])
+            blob = parts
+        else:
+            blob = item.pop(BODY_FIELD).value
+        for field, value in item.items():
+            item[field] = convert_decimal_to_number(value)
+        item.update(json.loads(zlib.decompress(blob)))
+        return item
+
+    for field, value in item.items():
+        if field not in _DIAGRAM_FIELDS:
+            item[field] = convert_decimal_to_number(value)
+    if "nodes" in item:
+        item["nodes"] = [decode_node(node) for node in item["nodes"]]
+    if "edges" in item:
+        item["edges"] = [decode_edge(edge) for edge in item["edges"]]
+    return item
+
+
+def _projection(fields: Optional[List[str]]) -> Dict[str, Any]:
+    # The attributes holding `fields`, plus id and version; the compressed body, when there
+    # is one, is only read (whole) if one of the bulk fields is asked for.
+    if fields is None:
+        return {}
+    storage = [BODY_FIELD, *STORAGE_FIELDS] if any(field in BULK_FIELDS for field in fields) else []
+    projected = list(dict.fromkeys(["id", VERSION_FIELD, *fields, *storage]))
+    return {
+        "ProjectionExpression": ", ".join(f"#f{i}" for i in range(len(projected))),
+        "ExpressionAttributeNames": {f"#f{i}": field for i, field in enumerate(projected)}
+    }
+
+
+async def _decode_loaded(item: Dict[str, Any], fields: Optional[List[str]]) -> Dict[str, Any]:
+    parts = None
+    if PARTS_FIELD in item:
+        parts = await _read_parts(item["id"], item[GENERATION_FIELD], int(item[PARTS_FIELD]))
+    # Decoding a large diagram is CPU-bound; it runs in the threadpool, off the event loop.
+    with span("flowchart.decode"):
+        item = await run_in_threadpool(decode_flowchart_item, item, parts)
+    item.setdefault(VERSION_FIELD, 0)
+    if fields is not None:
+        kept = ("id", VERSION_FIELD, *STORAGE_FIELDS)
+        for field in [field for field in item if field not in fields and field not in kept]:
+            del item[field]
+    return item
+
+
+async def load_flowchart(flowchart_id: str, fields: Optional[List[str]] = None) -> Optional[Dict[str, Any]]:
+    """
+    Read and decode a flowchart, or None if it does not exist. `fields` limits the read to
+    those attributes (plus id and version); the compressed body, when there is one, is only
+    read (whole) if one of the bulk fields is asked for.
+    """
+    flowchart_table = await dynamodb.table(FLOWCHART_TABLE)
+    response = await flowchart_table.get_item(Key={"id": flowchart_id}, ConsistentRead=True, **_projection(fields))
+    item = response.get("Item")
+    if not item:
+        return None
+    return await _decode_loaded(item, fields)
+
+
+async def load_flowcharts(flowchart_ids: List[str], fields: Optional[List[str]] = None) -> Dict[str, Dict[str, Any]]:
+    """
+    Read several flowcharts with batched reads, like load_flowchart. Returns the ones that
+    exist by id.
+    """
+    found: Dict[str, Dict[str, Any]] = {}
+    keys = [{"id": flowchart_id} for flowchart_id in dict.fromkeys(flowchart_ids)]
+    for start in range(0, len(keys), 100):
+        request = {FLOWCHART_TABLE: {"Keys": keys[start:start + 100], "ConsistentRead": True,
+                                     **_projection(fields)}}
+        while request:
+            response = await dynamodb.batch_get_item(RequestItems=request)
+            for item in response["Responses"].get(FLOWCHART_TABLE, []):
+                found[item["id"]] = await _decode_loaded(item, fields)
+            request = response.get("UnprocessedKeys") or None
+    return found
+
+
+async def scan_flowcharts(fields: Optional[List[str]] = None, page_size: int = 100) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Read every flowchart, one page of a paginated scan at a time, like load_flowchart.
+    Overflow parts are skipped: unlike flowcharts they have neither a version nor nodes, and
+    their ids contain "#".
+    """
+    flowchart_table = await dynamodb.table(FLOWCHART_TABLE)
+    request: Dict[str, Any] = {
+        "Limit": page_size,
+        "FilterExpression": Attr(VERSION_FIELD).exists() | Attr("nodes").exists() | ~Attr("id").contains("#"),
+        **_projection(fields)
+    }
+    while True:
+        response = await flowchart_table.scan(**request)
+        for item in response.get("Items", []):
+            yield await _decode_loaded(item, fields)
+        if "LastEvaluatedKey" not in response:
+            return
+        request["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+
+async def store_flowchart(item: Dict[str, Any], previous: Optional[Dict[str, Any]] = None) -> int:
+    """
+    Write a plain flowchart as the next version of `previous`, the stored version being
+    replaced as returned by load_flowchart (it defaults to `item` for read-modify-write
+    callers). The write only succeeds if the stored version is still the one `previous` was
+    read at; otherwise VersionConflictError is raised and nothing is replaced.
+
+    Parts are written before the flowchart item that points at them, and the parts of the
+    replaced version are removed once they are unused. Returns the new version, which is
+    also set on `item`.
+    """
+    flowchart_table = await dynamodb.table(FLOWCHART_TABLE)
+    previous = item if previous is None else previous
+    expected_version = int(previous.get(VERSION_FIELD) or 0)
+    with span("flowchart.encode"):
+        encoded = await run_in_threadpool(encode_flowchart_item, item)
+    encoded[0][VERSION_FIELD] = expected_version + 1
+    async with flowchart_table.batch_writer() as batch:
+        for part in encoded[1:]:
+            await batch.put_item(Item=part)
+
+    if expected_version:
+        condition = Attr(VERSION_FIELD).eq(expected_version)
+    else:
+        condition = Attr(VERSION_FIELD).not_exists()
+    try:
+        await flowchart_table.put_item(Item=encoded[0], ConditionExpression=condition)
+    except ClientError as e:
+        if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+            raise
+        await _discard_unused_parts(item["id"], encoded[0])
+        raise VersionConflictError(item["id"], expected_version)
+
+    old_generation = previous.get(GENERATION_FIELD)
+    if old_generation and old_generation != encoded[0].get(GENERATION_FIELD):
+        async with flowchart_table.batch_writer() as batch:
+            for number in range(int(previous[PARTS_FIELD])):
+                await batch.delete_item(Key={"id": f"{item['id']}#{old_generation}#{number}"})
+
+    item[VERSION_FIELD] = expected_version + 1
+    return item[VERSION_FIELD]
+
+
+async def _discard_unused_parts(flowchart_id: str, rejected: Dict[str, Any]) -> None:
+    # The parts written for a rejected version are deleted unless the winning version
+    # happens to have the same body and therefore uses them too.
+    generation = rejected.get(GENERATION_FIELD)
+    if not generation:
+        return
+    flowchart_table = await dynamodb.table(FLOWCHART_TABLE)
+    response = await flowchart_table.get_item(
+        Key={"id": flowchart_id}, ProjectionExpression="#g", ExpressionAttributeNames={"#g": GENERATION_FIELD},
+        ConsistentRead=True
+    )
+    current = response.get("Item") or {}
+    if current.get(GENERATION_FIELD) == generation:
+        return
+    async with flowchart_table.batch_writer() as batch:
+        for number in range(rejected[PARTS_FIELD]):
+            await batch.delete_item(Key={"id": f"{flowchart_id}#{generation}#{number}"})
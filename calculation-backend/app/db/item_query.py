@@ -0,0 +1,85 @@
+# app/db/item_query.py
+import base64
+import binascii
+import json
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from boto3.dynamodb.conditions import Key
+
+# One step of a listing: the secondary index to query (None for the table itself), its hash
+# key and value, and an optional filter condition applied by DynamoDB before items are returned.
+QueryStep = Tuple[Optional[str], str, str, Any]
+
+
+def encode_cursor(step: int, start_key: Optional[Dict[str, Any]]) -> str:
+    raw = json.dumps({"step": step, "key": start_key}, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def decode_cursor(cursor: Optional[str]) -> Tuple[int, Optional[Dict[str, Any]]]:
+    """
+    Decode a cursor returned by query_pages. Raises ValueError when it is malformed.
+    """
+    if not cursor:
+        return 0, None
+    try:
+        state = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return int(state["step"]), state["key"]
+    except (binascii.Error, UnicodeError, json.JSONDecodeError, KeyError, TypeError) as e:
+        raise ValueError("invalid cursor") from e
+
+
+def projection_request(fields: Optional[Sequence[str]]) -> Dict[str, Any]:
+    """
+    Build ProjectionExpression/ExpressionAttributeNames for attribute paths such as
+    "position" or "data.label". Every segment gets a placeholder, so reserved words are fine.
+    """
+    if not fields:
+        return {}
+    names: Dict[str, str] = {}
+    paths = []
+    for field in fields:
+        placeholders = []
+        for segment in field.split("."):
+            placeholder = f"#p{len(names)}"
+            names[placeholder] = segment
+            placeholders.append(placeholder)
+        paths.append(".".join(placeholders))
+    return {"ProjectionExpression": ", ".join(paths), "ExpressionAttributeNames": names}
+
+
+async def query_pages(table, steps: List[QueryStep], limit: int, cursor: Optional[str],
+                      fields: Optional[Sequence[str]] = None,
+                      skip: Optional[Callable[[int, Dict[str, Any]], bool]] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    Run `steps` one after another, each a paginated query of the table or an index, and return up
+    to `limit` raw items plus a cursor to continue from (None once everything was read).
+    `skip(step, item)` can drop items that an earlier step already returned.
+    """
+    step, start_key = decode_cursor(cursor)
+    projection = projection_request(fields)
+    items: List[Dict[str, Any]] = []
+
+    while step < len(steps) and len(items) < limit:
+        index_name, key_name, key_value, condition = steps[step]
+        request = {
+            "KeyConditionExpression": Key(key_name).eq(key_value),
+            "Limit": limit - len(items),
+            **projection
+        }
+        if index_name is not None:
+            request["IndexName"] = index_name
+        if condition is not None:
+            request["FilterExpression"] = condition
+        if start_key:
+            request["ExclusiveStartKey"] = start_key
+        response = await table.query(**request)
+        items.extend(item for item in response.get("Items", []) if skip is None or not skip(step, item))
+
+        start_key = response.get("LastEvaluatedKey")
+        if not start_key:
+            step += 1
+
+    if step >= len(steps):
+        return items, None
+    return items, encode_cursor(step, start_key)
@@ -0,0 +1,197 @@
+# app/db/job_store.py
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+from typing import Deque, Dict, Any, Optional, Tuple
+
+from boto3.dynamodb.conditions import Attr
+from botocore.exceptions import ClientError
+
+from app.db.dynamodb import dynamodb
+from app.utils.decimal_converter import convert_decimal_to_number, convert_floats_to_decimal
+
+# Statuses after which a job or batch record no longer changes; such records are kept for
+# the store's retention period and then dropped.
+FINISHED_STATUSES = ("done", "failed")
+
+
+class JobStore(ABC):
+    """
+    Storage for run jobs. At most one job per flowchart can be active (queued or running);
+    `create_job` enforces that and hands back the active job instead of creating a duplicate.
+    """
+
+    @abstractmethod
+    async def create_job(self, job: Dict[str, Any]) -> Dict[str, Any]:
+        ...
+
+    @abstractmethod
+    async def put_job(self, job: Dict[str, Any]) -> None:
+        """Store a record that is not tied to one flowchart, such as a batch."""
+
+    @abstractmethod
+    async def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    async def update_job(self, job_id: str, **fields: Any) -> None:
+        ...
+
+    @abstractmethod
+    async def renew(self, flowchart_id: str, job_id: str) -> bool:
+        """
+        Keep the job the active one of its flowchart for longer. Returns False if it no
+        longer is (another job has taken over).
+        """
+
+    @abstractmethod
+    async def release(self, flowchart_id: str, job_id: str) -> None:
+        ...
+
+
+class InMemoryJobStore(JobStore):
+    """
+    Job store for single-node deployments. Jobs are lost on restart, and finished ones are
+    dropped `retention` seconds after they finish. It is only used from the event loop, and
+    none of its methods await, so it needs no lock.
+    """
+
+    def __init__(self, retention: int):
+        self.retention = retention
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._active: Dict[str, str] = {}
+        # (drop time, job id) of finished jobs, in the order they finished.
+        self._finished: Deque[Tuple[float, str]] = deque()
+
+    def _drop_expired(self, now: float) -> None:
+        while self._finished and self._finished[0][0] <= now:
+            self._jobs.pop(self._finished.popleft()[1], None)
+
+    async def create_job(self, job: Dict[str, Any]) -> Dict[str, Any]:
+        active_id = self._active.get(job["flowchart_id"])
+        if active_id is not None:
+            return dict(self._jobs[active_id])
+        self._jobs[job["job_id"]] = dict(job)
+        self._active[job["flowchart_id"]] = job["job_id"]
+        return dict(job)
+
+    async def put_job(self, job: Dict[str, Any]) -> None:
+        self._jobs[job["job_id"]] = dict(job)
+
+    async def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        job = self._jobs.get(job_id)
+        return dict(job) if job is not None else None
+
+    async def update_job(self, job_id: str, **fields: Any) -> None:
+        self._jobs[job_id].update(fields)
+        if fields.get("status") in FINISHED_STATUSES:
+            now = time.time()
+            self._finished.append((now + self.retention, job_id))
+            self._drop_expired(now)
+
+    async def renew(self, flowchart_id: str, job_id: str) -> bool:
+        return self._active.get(flowchart_id) == job_id
+
+    async def release(self, flowchart_id: str, job_id: str) -> None:
+        if self._active.get(flowchart_id) == job_id:
+            del self._active[flowchart_id]
+
+
+class DynamoDBJobStore(JobStore):
+    """
+    Job store shared by several API nodes. Jobs live in the Jobs table next to one lock item
+    per flowchart ("lock#<flowchart_id>"), taken with a conditional write. Locks expire after
+    `lock_ttl` seconds so that a crashed worker does not block a flowchart forever; a running
+    job renews its lock to keep it. Finished records get an "expires_at" `retention` seconds
+    ahead, after which DynamoDB's TTL deletes them, like expired locks.
+    """
+
+    def __init__(self, table_name: str, lock_ttl: int, retention: int):
+        self.table_name = table_name
+        self.lock_ttl = lock_ttl
+        self.retention = retention
+
+    async def create_job(self, job: Dict[str, Any]) -> Dict[str, Any]:
+        table = await dynamodb.table(self.table_name)
+        now = int(time.time())
+        lock_id = f"lock#{job['flowchart_id']}"
+        # The job is written before the lock so that whoever sees the lock can also read the job.
+        await table.put_item(Item=convert_floats_to_decimal(job))
+        try:
+            await table.put_item(
+                Item={"job_id": lock_id, "active_job_id": job["job_id"], "expires_at": now + self.lock_ttl},
+                ConditionExpression=Attr("job_id").not_exists() | Attr("expires_at").lt(now)
+            )
+            return dict(job)
+        except ClientError as e:
+            if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                raise
+
+        await table.delete_item(Key={"job_id": job["job_id"]})
+        lock = (await table.get_item(Key={"job_id": lock_id}, ConsistentRead=True)).get("Item")
+        if lock is None:
+            # The active job finished in the meantime; try again.
+            return await self.create_job(job)
+        active = await self.get_job(lock["active_job_id"])
+        if active is None:
+            # The lock names a job whose record is gone, so nobody will release it: remove it
+            # (unless it has changed hands meanwhile) and try again.
+            try:
+                await table.delete_item(
+                    Key={"job_id": lock_id},
+                    ConditionExpression=Attr("active_job_id").eq(lock["active_job_id"])
+                )
+            except ClientError as e:
+                if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                    raise
+            return await self.create_job(job)
+        return active
+
+    async def put_job(self, job: Dict[str, Any]) -> None:
+        table = await dynamodb.table(self.table_name)
+        await table.put_item(Item=convert_floats_to_decimal(job))
+
+    async def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        table = await dynamodb.table(self.table_name)
+        item = (await table.get_item(Key={"job_id": job_id}, ConsistentRead=True)).get("Item")
+        return convert_decimal_to_number(item) if item else None
+
+    async def update_job(self, job_id: str, **fields: Any) -> None:
+        if fields.get("status") in FINISHED_STATUSES:
+            fields["expires_at"] = int(time.time()) + self.retention
+        fields = convert_floats_to_decimal(fields)
+        names = {f"#f{i}": name for i, name in enumerate(fields)}
+        values = {f":v{i}": value for i, value in enumerate(fields.values())}
+        table = await dynamodb.table(self.table_name)
+        await table.update_item(
+            Key={"job_id": job_id},
+            UpdateExpression="SET " + ", ".join(f"#f{i} = :v{i}" for i in range(len(fields))),
+            ExpressionAttributeNames=names,
+            ExpressionAttributeValues=values
+        )
+
+    async def renew(self, flowchart_id: str, job_id: str) -> bool:
+        table = await dynamodb.table(self.table_name)
+        try:
+            await table.update_item(
+                Key={"job_id": f"lock#{flowchart_id}"},
+                UpdateExpression="SET expires_at = :expires_at",
+                ConditionExpression=Attr("active_job_id").eq(job_id),
+                ExpressionAttributeValues={":expires_at": int(time.time()) + self.lock_ttl}
+            )
+            return True
+        except ClientError as e:
+            if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                raise
+            return False
+
+    async def release(self, flowchart_id: str, job_id: str) -> None:
+        table = await dynamodb.table(self.table_name)
+        try:
+            await table.delete_item(
+                Key={"job_id": f"lock#{flowchart_id}"},
+                ConditionExpression=Attr("active_job_id").eq(job_id)
+            )
+        except ClientError as e:
+            if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                raise
@@ -1,11 +1,36 @@
+from contextlib import asynccontextmanager
+
+import anyio.to_thread
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from app.api.middleware import MetricsMiddleware
 from app.api.routes import router
+from app.config import THREADPOOL_SIZE
+from app.db.dynamodb import dynamodb
+from app.services.job_service import stop_jobs
+from app.services.llm_integration import close_llm_client
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # The threadpool takes the CPU-bound parts of requests (decoding, hashing, serialization).
+    anyio.to_thread.current_default_thread_limiter().total_tokens = THREADPOOL_SIZE
+    # Opening makes no network calls; the tables are checked in the background and requests
+    # wait for that only if they arrive first.
+    await dynamodb.open()
+    try:
+        yield
+    finally:
+        await stop_jobs()
+        await close_llm_client()
+        await dynamodb.close()
+
 
 app = FastAPI(
     title="Flowchart API",
     description="API for managing flowcharts",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
 # Configure CORS
@@ -22,6 +47,9 @@ app.add_middleware(
     allow_headers=["*"],  # allow all headers
 )
 
+# Request durations, Server-Timing headers and per-request profiling.
+app.add_middleware(MetricsMiddleware)
+
 app.include_router(router)
 
 if __name__ == "__main__":
@@ -53,3 +53,12 @@ class Flowchart(BaseModel):
     id: str
     nodes: List[Node]
     edges: List[Edge]
+    # Version the client last read; when set, the save fails with 409 if it is outdated.
+    version: Optional[int] = None
+
+class BatchRunRequest(BaseModel):
+    # Flowcharts to run; leave out to run every stored flowchart.
+    flowchart_ids: Optional[List[str]] = None
+    force: bool = False
+    # Model priority of the batch; interactive runs have 0 and lower values go first.
+    priority: Optional[int] = None
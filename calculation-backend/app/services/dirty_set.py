@@ -0,0 +1,72 @@
+# app/services/dirty_set.py
+from typing import Dict, Any, Optional, Set, Tuple
+
+from app.services.graph_index import GraphIndex
+from app.utils.content_hash import content_hash
+
+# Attribute on the Flowcharts item holding the snapshot taken by the last successful run.
+LAST_RUN_FIELD = "last_run"
+
+
+def _node_state_hash(node: Dict[str, Any]) -> str:
+    data = node.get("data") or {}
+    return content_hash({"label": data.get("label"), "properties": data.get("properties", {})})
+
+
+def _edge_state_hash(edge: Dict[str, Any]) -> str:
+    data = edge.get("data") or {}
+    return content_hash({
+        "source": edge.get("source"),
+        "target": edge.get("target"),
+        "properties": data.get("properties", {})
+    })
+
+
+def snapshot_run_state(index: GraphIndex) -> Dict[str, Any]:
+    """
+    Record what the model-relevant state of every node and edge looked like after a run.
+    Edges also keep their endpoints so that the neighbours of a removed edge can be found later.
+    """
+    return {
+        "nodes": {node_id: _node_state_hash(node) for node_id, node in index.nodes.items()},
+        "edges": {
+            edge_id: [_edge_state_hash(edge), str(edge.get("source")), str(edge.get("target"))]
+            for edge_id, edge in index.edges.items()
+        }
+    }
+
+
+def compute_dirty_set(index: GraphIndex, last_run: Optional[Dict[str, Any]],
+                      radius: int) -> Tuple[Set[str], Set[str]]:
+    """
+    Return the ids of the nodes and edges that need to be sent to the model again.
+
+    Nodes that were added or changed since `last_run`, and the endpoints of added, changed or
+    removed edges, are dirty. Dirtiness then spreads `radius` hops through the graph, and every
+    edge touching a dirty node is dirty too. Without a previous run everything is dirty.
+    """
+    if not last_run:
+        return set(index.nodes), set(index.edges)
+
+    previous_nodes = last_run.get("nodes", {})
+    previous_edges = last_run.get("edges", {})
+
+    seed_nodes = {
+        node_id for node_id, node in index.nodes.items()
+        if previous_nodes.get(node_id) != _node_state_hash(node)
+    }
+    seed_edges = set()
+    for edge_id, edge in index.edges.items():
+        previous = previous_edges.get(edge_id)
+        if previous is None or previous[0] != _edge_state_hash(edge):
+            seed_edges.add(edge_id)
+            seed_nodes.update({str(edge.get("source")), str(edge.get("target"))})
+    for edge_id, previous in previous_edges.items():
+        if edge_id not in index.edges:
+            seed_nodes.update(previous[1:])
+
+    dirty_nodes = index.expand(seed_nodes, radius)
+    dirty_edges = seed_edges | {
+        edge_id for node_id in dirty_nodes for edge_id in index.incident_edges[node_id]
+    }
+    return dirty_nodes, dirty_edges
@@ -0,0 +1,40 @@
+# app/services/flowchart_cache.py
+import threading
+from typing import Optional, Tuple
+
+from app.config import FLOWCHART_CACHE_MAX_ENTRIES, FLOWCHART_CACHE_TTL_SECONDS
+from app.utils.lru_cache import LRUCache
+
+
+class FlowchartResponseCache:
+    """
+    Read-through cache of serialized GET /flowchart/{id} bodies, keyed by flowchart id.
+
+    Writes made by this process record the new version without a body, so a read that raced
+    with the write cannot put the older body back. Writes made by other API nodes are only
+    picked up once an entry expires, after `ttl` seconds.
+    """
+
+    def __init__(self, max_entries: int, ttl: int):
+        self._entries = LRUCache(max_entries, ttl)
+        self._lock = threading.Lock()
+
+    def get(self, flowchart_id: str) -> Optional[Tuple[int, bytes]]:
+        entry = self._entries.get(flowchart_id)
+        if entry is None or entry[1] is None:
+            return None
+        return entry
+
+    def put(self, flowchart_id: str, version: int, body: bytes) -> None:
+        with self._lock:
+            current = self._entries.get(flowchart_id)
+            if current is not None and current[0] > version:
+                return
+            self._entries.set(flowchart_id, (version, body))
+
+    def invalidate(self, flowchart_id: str, version: int) -> None:
+        with self._lock:
+            self._entries.set(flowchart_id, (version, None))
+
+
+flowchart_cache = FlowchartResponseCache(FLOWCHART_CACHE_MAX_ENTRIES, FLOWCHART_CACHE_TTL_SECONDS)
@@ -1,62 +1,577 @@
 # app/services/flowchart_service.py
+from decimal import Decimal
+from functools import partial
+
+from boto3.dynamodb.conditions import Attr
+from fastapi.concurrency import run_in_threadpool
+
 from app.models.flowchart import Flowchart
-from app.db.dynamodb import flowchart_table, node_table, edge_table
-from fastapi import HTTPException
+from app.config import (
+    FLOWCHART_BLOB_MIN_BYTES,
+    FLOWCHART_GRID_CELL_SIZE,
+    FLOWCHART_GRID_MAX_CELLS,
+    FLOWCHART_PAGE_MAX_ITEMS
+)
+from app.db.codec import BLOB_FIELDS, decode_edge, decode_node, encode_edge, encode_node
+from app.db.dynamodb import CELL_INDEX, EDGE_TABLE, NODE_TABLE, TARGET_CELL_INDEX, dynamodb
+from app.db.flowchart_store import (
+    STORAGE_FIELDS,
+    VERSION_FIELD,
+    VersionConflictError,
+    load_flowchart,
+    load_flowcharts,
+    scan_flowcharts,
+    store_flowchart
+)
+from app.db.item_query import query_pages
+from fastapi import HTTPException, Response
 import json
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from app.services.llm_integration import (
+    apply_llm_recommendations,
+    stream_llm_recommendations
+)
+from app.services.dirty_set import LAST_RUN_FIELD
+from app.services.flowchart_cache import flowchart_cache
+from app.services.persistence import KEY_FIELDS, sync_items
+from app.services.spatial_index import (
+    CELL_FIELD,
+    SPATIAL_FIELDS,
+    TARGET_CELL_FIELD,
+    cell_key,
+    cells_in_bbox,
+    count_cells_in_bbox,
+    index_edges,
+    index_nodes,
+    parse_bbox
+)
+from app.utils.content_hash import HASH_FIELD
+from app.utils.etag import etag_matches, etag_version, make_etag, parse_etags
+from app.utils.metrics import span
+
+# Attribute on the Flowcharts item holding the id -> content hash of every node and edge
+# as last written to node_table/edge_table. It is internal and never returned to clients.
+MANIFEST_FIELD = "manifest"
+INTERNAL_FIELDS = (MANIFEST_FIELD, LAST_RUN_FIELD, *STORAGE_FIELDS)
+
+
+def _strip_internal_fields(flowchart: dict) -> dict:
+    for field in INTERNAL_FIELDS:
+        flowchart.pop(field, None)
+    return flowchart
+
+
+def _index_items(flowchart_item: dict) -> tuple:
+    # Table copies of nodes and edges carry grid cells for viewport reads, so moving a node
+    # across a cell boundary rewrites it.
+    table_nodes, node_cells = index_nodes(flowchart_item["id"], flowchart_item.get("nodes", []),
+                                          FLOWCHART_GRID_CELL_SIZE)
+    return table_nodes, index_edges(flowchart_item.get("edges", []), node_cells)
+
+
+async def _sync_tables(flowchart_item: dict, manifest: dict, batches: Optional[tuple] = None) -> tuple:
+    # `batches` are shared (node, edge) batch writers.
+    node_batch, edge_batch = batches or (None, None)
+    node_table, edge_table = await dynamodb.table(NODE_TABLE), await dynamodb.table(EDGE_TABLE)
+    table_nodes, table_edges = await run_in_threadpool(_index_items, flowchart_item)
+    node_result = await sync_items(node_table, flowchart_item["id"], table_nodes, manifest.get("nodes", {}),
+                                   encode=partial(encode_node, blob_min_bytes=FLOWCHART_BLOB_MIN_BYTES),
+                                   batch=node_batch)
+    edge_result = await sync_items(edge_table, flowchart_item["id"], table_edges, manifest.get("edges", {}),
+                                   encode=partial(encode_edge, blob_min_bytes=FLOWCHART_BLOB_MIN_BYTES),
+                                   batch=edge_batch)
+    return node_result, edge_result
+
+
+async def _restore_tables(flowchart_id: str, rejected_manifest: dict) -> None:
+    """
+    After a save lost a version conflict, bring the Nodes/Edges tables back in line with the
+    winning version: every row of it is rewritten and rows only the rejected save had are
+    removed.
+    """
+    current = await load_flowchart(flowchart_id) or {"id": flowchart_id}
+    await _sync_tables(current, {kind: dict.fromkeys(rejected_manifest[kind]) for kind in ("nodes", "edges")})
+
+
+async def _rebuild_item_tables() -> None:
+    """
+    Write the Nodes/Edges rows of every stored flowchart from its item in the Flowcharts
+    table: the migration that fills the tables replacing LEGACY_TABLES (see app/db/dynamodb.py).
+    The manifests stay valid, as the rows are built exactly like a save builds them.
+    """
+    node_table, edge_table = await dynamodb.table(NODE_TABLE), await dynamodb.table(EDGE_TABLE)
+    async with node_table.batch_writer(overwrite_by_pkeys=KEY_FIELDS) as node_batch, \
+            edge_table.batch_writer(overwrite_by_pkeys=KEY_FIELDS) as edge_batch:
+        async for flowchart in scan_flowcharts(fields=["nodes", "edges"]):
+            await _sync_tables(flowchart, {}, batches=(node_batch, edge_batch))
+
+
+dynamodb.add_migration(_rebuild_item_tables)
+
+
+def _expected_version(if_match: Optional[str], body_version: Optional[int]) -> Optional[int]:
+    """
+    The version a save is conditional on: the If-Match header if given, else the version in
+    the body. None means the save is unconditional.
+    """
+    if if_match is None:
+        return body_version
+    tags = parse_etags(if_match)
+    if "*" in tags:
+        return None
+    try:
+        return etag_version(tags[0])
+    except (IndexError, ValueError):
+        raise HTTPException(status_code=400, detail="If-Match must be the ETag of a flowchart version")
+
+
+def _validated_item(flowchart: Flowchart) -> tuple:
+    # The plain flowchart to store, with flowchart_id set on its nodes and edges, and the
+    # version given in the body, if any.
+    flowchart_item = flowchart.dict()
+    if not flowchart_item.get("id"):
+        raise HTTPException(status_code=400, detail="Flowchart 'id' is required.")
+    body_version = flowchart_item.pop(VERSION_FIELD, None)
+
+    for node in flowchart_item.get("nodes", []):
+        if not node.get("id"):
+            raise HTTPException(status_code=400, detail="Each node must have an 'id'.")
+        node["flowchart_id"] = flowchart_item["id"]
+
+    for edge in flowchart_item.get("edges", []):
+        if not edge.get("id"):
+            raise HTTPException(status_code=400, detail="Each edge must have an 'id'.")
+        edge["flowchart_id"] = flowchart_item["id"]
+    return flowchart_item, body_version
 
-from app.services.llm_integration import apply_llm_recommendations, build_flowchart_prompt, call_llm_for_flowchart
-from app.utils.decimal_converter import convert_floats_to_decimal
 
-def save_flowchart_service(flowchart: Flowchart) -> dict:
+def _check_expected_version(flowchart_item: dict, previous: dict, if_match: Optional[str],
+                            expected_version: Optional[int]) -> None:
+    if if_match is not None and "*" in parse_etags(if_match) and not previous:
+        raise HTTPException(status_code=412, detail="Flowchart not found")
+    if expected_version is not None and previous.get(VERSION_FIELD, 0) != expected_version:
+        raise VersionConflictError(flowchart_item["id"], expected_version)
+
+
+async def _store_saved(flowchart_item: dict, previous: dict, node_result: dict, edge_result: dict) -> dict:
+    """
+    Store a flowchart whose nodes and edges have been written, as the next version of
+    `previous`, and return the save result. On a version conflict the tables are restored
+    to the winning version and VersionConflictError is raised.
+    """
+    flowchart_item[MANIFEST_FIELD] = {
+        "nodes": node_result["hashes"],
+        "edges": edge_result["hashes"]
+    }
+    # Keep the last run's snapshot so the next run only revisits what this save changed.
+    # Entries for removed nodes are dropped; removed edges are kept while one of their
+    # endpoints still exists, so that it gets rerun.
+    if LAST_RUN_FIELD in previous:
+        node_ids = node_result["hashes"]
+        last_run = previous[LAST_RUN_FIELD]
+        flowchart_item[LAST_RUN_FIELD] = {
+            "nodes": {
+                node_id: state for node_id, state in last_run.get("nodes", {}).items() if node_id in node_ids
+            },
+            "edges": {
+                edge_id: state for edge_id, state in last_run.get("edges", {}).items()
+                if state[1] in node_ids or state[2] in node_ids
+            }
+        }
     try:
-        flowchart_item = flowchart.dict()
-        if not flowchart_item.get("id"):
-            raise HTTPException(status_code=400, detail="Flowchart 'id' is required.")
-        
-        for node in flowchart_item.get("nodes", []):
-            if not node.get("id"):
-                raise HTTPException(status_code=400, detail="Each node must have an 'id'.")
-            node["flowchart_id"] = flowchart_item["id"]
+        version = await store_flowchart(flowchart_item, previous=previous)
+    except VersionConflictError:
+        await _restore_tables(flowchart_item["id"], flowchart_item[MANIFEST_FIELD])
+        raise
+    flowchart_cache.invalidate(flowchart_item["id"], version)
+
+    return {
+        "message": "Flowchart saved successfully",
+        "version": version,
+        "written": node_result["written"] + edge_result["written"],
+        "skipped": node_result["skipped"] + edge_result["skipped"],
+        "deleted": node_result["deleted"] + edge_result["deleted"]
+    }
 
-        for edge in flowchart_item.get("edges", []):
-            if not edge.get("id"):
-                raise HTTPException(status_code=400, detail="Each edge must have an 'id'.")
-            edge["flowchart_id"] = flowchart_item["id"]
 
-        flowchart_item = convert_floats_to_decimal(flowchart_item)
-        flowchart_table.put_item(Item=flowchart_item)
+async def save_flowchart_service(flowchart: Flowchart, if_match: Optional[str] = None) -> dict:
+    """
+    Save the flowchart as its next version. With an If-Match header (or a version in the
+    body) the save is rejected with 409 unless that is still the stored version; concurrent
+    saves never silently overwrite each other either way.
+    """
+    try:
+        flowchart_item, body_version = await run_in_threadpool(_validated_item, flowchart)
+        expected_version = _expected_version(if_match, body_version)
 
-        for node in flowchart_item.get("nodes", []):
-            node_table.put_item(Item=node)
-        for edge in flowchart_item.get("edges", []):
-            edge_table.put_item(Item=edge)
+        previous = await load_flowchart(flowchart_item["id"], fields=list(INTERNAL_FIELDS)) or {}
+        _check_expected_version(flowchart_item, previous, if_match, expected_version)
 
-        return {"message": "Flowchart saved successfully"}
+        # Nodes and edges are written before the flowchart item so the stored manifest
+        # never claims a write that did not happen.
+        with span("flowchart.sync_tables"):
+            node_result, edge_result = await _sync_tables(flowchart_item, previous.get(MANIFEST_FIELD, {}))
+        return await _store_saved(flowchart_item, previous, node_result, edge_result)
+    except HTTPException:
+        raise
+    except VersionConflictError as e:
+        raise HTTPException(status_code=409, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
-def get_flowchart_service(flowchart_id: str) -> dict:
+def _import_error(line_number: int, flowchart_id: Optional[str], status_code: int, detail: Any) -> dict:
+    return {"line": line_number, "id": flowchart_id, "status": status_code, "detail": detail}
+
+
+def _parse_import_lines(lines: List[Tuple[int, str]]) -> List[tuple]:
+    # (line number, flowchart item, body version, None) for every valid line and
+    # (line number, None, None, error result) for the others.
+    parsed = []
+    for line_number, line in lines:
+        try:
+            flowchart = Flowchart(**json.loads(line))
+            parsed.append((line_number, *_validated_item(flowchart), None))
+        except HTTPException as e:
+            parsed.append((line_number, None, None, _import_error(line_number, None, e.status_code, e.detail)))
+        except (ValueError, TypeError) as e:
+            parsed.append((line_number, None, None, _import_error(line_number, None, 400, str(e))))
+    return parsed
+
+
+async def import_flowcharts_service(lines: List[Tuple[int, str]], check_versions: bool = False) -> List[dict]:
+    """
+    Save a group of flowcharts given as numbered NDJSON lines, one flowchart per line, and
+    return one result per line. The stored versions of the whole group are read with batched
+    reads and their nodes and edges are written through shared batch writers; each flowchart
+    item is then stored on its own. Versions in the lines are ignored unless `check_versions`
+    is set, in which case they work like the version of a single save.
+    A failing line does not stop the others.
+    """
+    results: Dict[int, dict] = {}
+    pending = []
+    for line_number, flowchart_item, body_version, error in await run_in_threadpool(_parse_import_lines, lines):
+        if error is not None:
+            results[line_number] = error
+        else:
+            pending.append((line_number, flowchart_item, body_version if check_versions else None))
+
     try:
-        response = flowchart_table.get_item(Key={"id": flowchart_id})
-        if "Item" not in response:
-            raise HTTPException(status_code=404, detail="Flowchart not found")
-        return response["Item"]
+        previous_items = await load_flowcharts([item["id"] for _, item, _ in pending], fields=list(INTERNAL_FIELDS))
+    except Exception as e:
+        for line_number, flowchart_item, _ in pending:
+            results[line_number] = _import_error(line_number, flowchart_item["id"], 500, str(e))
+        pending = []
+
+    synced = []
+    try:
+        node_table, edge_table = await dynamodb.table(NODE_TABLE), await dynamodb.table(EDGE_TABLE)
+        with span("flowchart.sync_tables"):
+            async with node_table.batch_writer(overwrite_by_pkeys=KEY_FIELDS) as node_batch, \
+                    edge_table.batch_writer(overwrite_by_pkeys=KEY_FIELDS) as edge_batch:
+                for line_number, flowchart_item, expected_version in pending:
+                    previous = previous_items.get(flowchart_item["id"], {})
+                    try:
+                        _check_expected_version(flowchart_item, previous, None, expected_version)
+                    except VersionConflictError as e:
+                        results[line_number] = _import_error(line_number, flowchart_item["id"], 409, str(e))
+                        continue
+                    node_result, edge_result = await _sync_tables(
+                        flowchart_item, previous.get(MANIFEST_FIELD, {}), batches=(node_batch, edge_batch)
+                    )
+                    synced.append((line_number, flowchart_item, previous, node_result, edge_result))
+    except Exception as e:
+        for line_number, flowchart_item, _ in pending:
+            results.setdefault(line_number, _import_error(line_number, flowchart_item["id"], 500, str(e)))
+        synced = []
+
+    for line_number, flowchart_item, previous, node_result, edge_result in synced:
+        try:
+            saved = await _store_saved(flowchart_item, previous, node_result, edge_result)
+            results[line_number] = {"line": line_number, "id": flowchart_item["id"], "status": 200,
+                                    "version": saved["version"], "written": saved["written"],
+                                    "skipped": saved["skipped"], "deleted": saved["deleted"]}
+        except VersionConflictError as e:
+            results[line_number] = _import_error(line_number, flowchart_item["id"], 409, str(e))
+        except Exception as e:
+            results[line_number] = _import_error(line_number, flowchart_item["id"], 500, str(e))
+
+    return [results[line_number] for line_number, _ in lines]
+
+
+async def _load_in_batches(flowchart_ids: List[str]) -> AsyncIterator[dict]:
+    for start in range(0, len(flowchart_ids), 100):
+        for flowchart in (await load_flowcharts(flowchart_ids[start:start + 100])).values():
+            yield flowchart
+
+
+def export_flowcharts_service(flowchart_ids: Optional[List[str]] = None) -> AsyncIterator[str]:
+    """
+    Stream flowcharts as NDJSON, one flowchart per line in the form GET /flowchart/{id}
+    returns it: every flowchart, read with a paginated scan, or only `flowchart_ids`, read
+    in batches (missing ones are left out). Lines can be imported again as they are.
+    """
+    if flowchart_ids is None:
+        flowcharts = scan_flowcharts()
+    else:
+        flowcharts = _load_in_batches(flowchart_ids)
+
+    async def lines() -> AsyncIterator[str]:
+        try:
+            async for flowchart in flowcharts:
+                yield (await run_in_threadpool(_serialize, flowchart)).decode("utf-8") + "\n"
+        except Exception as e:
+            yield json.dumps({"type": "error", "detail": str(e)}) + "\n"
+
+    return lines()
+
+
+def _serialize(flowchart: dict) -> bytes:
+    return json.dumps(_strip_internal_fields(flowchart), separators=(",", ":")).encode("utf-8")
+
+
+def _not_modified(version: int, fields: Optional[List[str]]) -> Response:
+    return Response(status_code=304, headers={"ETag": make_etag(version, fields)})
+
+
+async def get_flowchart_service(flowchart_id: str, fields: Optional[List[str]] = None,
+                                if_none_match: Optional[str] = None) -> Response:
+    """
+    Return the flowchart, or only the requested top-level `fields` of it, with an ETag of its
+    version and the representation (see make_etag). A matching If-None-Match gets 304 after
+    reading only the version. Leaving out
+    "nodes" and "edges" avoids reading the (possibly compressed and split) diagram body;
+    full reads of hot flowcharts are served from flowchart_cache.
+    """
+    try:
+        if fields is not None:
+            fields = [field for field in fields if field not in INTERNAL_FIELDS]
+        cached = flowchart_cache.get(flowchart_id) if fields is None else None
+
+        if cached is None and if_none_match is not None:
+            head = await load_flowchart(flowchart_id, fields=[])
+            if head is None:
+                raise HTTPException(status_code=404, detail="Flowchart not found")
+            if etag_matches(if_none_match, head[VERSION_FIELD], fields):
+                return _not_modified(head[VERSION_FIELD], fields)
+
+        if cached is not None:
+            version, body = cached
+        else:
+            flowchart = await load_flowchart(flowchart_id, fields=fields)
+            if flowchart is None:
+                raise HTTPException(status_code=404, detail="Flowchart not found")
+            version = flowchart[VERSION_FIELD]
+            with span("flowchart.serialize"):
+                body = await run_in_threadpool(_serialize, flowchart)
+            if fields is None:
+                flowchart_cache.put(flowchart_id, version, body)
+
+        if etag_matches(if_none_match, version, fields):
+            return _not_modified(version, fields)
+        return Response(content=body, media_type="application/json", headers={"ETag": make_etag(version, fields)})
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+def _page_request(limit: int, fields: Optional[List[str]]) -> Optional[List[str]]:
+    if not 1 <= limit <= FLOWCHART_PAGE_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"limit must be between 1 and {FLOWCHART_PAGE_MAX_ITEMS}")
+    if fields is None:
+        return None
+    # Large styles are stored compressed under "<field>_z"; the cell is needed for de-duplication.
+    blobs = [f"{field}_z" for field in BLOB_FIELDS if field in fields]
+    return list(dict.fromkeys(["id", CELL_FIELD, *fields, *blobs]))
+
+
+def _viewport(flowchart_id: str, bbox: Optional[str]) -> tuple:
+    """
+    Parse `bbox` and return it with the cell keys covering it. The cells are None when the
+    whole flowchart should be listed (no bbox, or one spanning more than
+    FLOWCHART_GRID_MAX_CELLS cells).
+    """
+    if bbox is None:
+        return None, None
+    try:
+        box = parse_bbox(bbox)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if count_cells_in_bbox(box, FLOWCHART_GRID_CELL_SIZE) > FLOWCHART_GRID_MAX_CELLS:
+        return box, None
+    return box, [cell_key(flowchart_id, cell) for cell in cells_in_bbox(box, FLOWCHART_GRID_CELL_SIZE)]
+
+
+def _clean_listed_item(item: dict) -> dict:
+    for field in (HASH_FIELD, *SPATIAL_FIELDS):
+        item.pop(field, None)
+    return item
+
+
+async def list_nodes_service(flowchart_id: str, bbox: Optional[str] = None, fields: Optional[List[str]] = None,
+                             limit: int = 500, cursor: Optional[str] = None) -> dict:
+    """
+    List a page of the flowchart's nodes from the Nodes table. With `bbox`
+    ("min_x,min_y,max_x,max_y") only nodes whose position lies inside the box are returned.
+    `fields` projects attribute paths such as "position" or "data.label".
+    """
+    try:
+        projection = _page_request(limit, fields)
+        box, cells = _viewport(flowchart_id, bbox)
+        condition = None
+        if box is not None:
+            min_x, min_y, max_x, max_y = (Decimal(str(value)) for value in box)
+            condition = Attr("position.x").between(min_x, max_x) & Attr("position.y").between(min_y, max_y)
+
+        if cells is None:
+            steps = [(None, "flowchart_id", flowchart_id, condition)]
+        else:
+            steps = [(CELL_INDEX, CELL_FIELD, cell, condition) for cell in cells]
+        try:
+            node_table = await dynamodb.table(NODE_TABLE)
+            items, next_cursor = await query_pages(node_table, steps, limit, cursor, fields=projection)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+        return {
+            "nodes": [_clean_listed_item(decode_node(item)) for item in items],
+            "cursor": next_cursor
+        }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
-def run_flowchart_service(flowchart_id: str) -> dict:
+async def list_edges_service(flowchart_id: str, bbox: Optional[str] = None, fields: Optional[List[str]] = None,
+                             limit: int = 500, cursor: Optional[str] = None) -> dict:
+    """
+    List a page of the flowchart's edges from the Edges table. With `bbox`, edges with an
+    endpoint in one of the grid cells overlapping the box are returned, so the result can
+    include edges just outside it; very large boxes list every edge.
+    """
     try:
-        response = flowchart_table.get_item(Key={"id": flowchart_id})
-        if "Item" not in response:
+        projection = _page_request(limit, fields)
+        _, cells = _viewport(flowchart_id, bbox)
+
+        skip = None
+        if cells is None:
+            steps = [(None, "flowchart_id", flowchart_id, None)]
+        else:
+            # Source cells first, then target cells, skipping edges the source pass returned.
+            steps = [(CELL_INDEX, CELL_FIELD, cell, None) for cell in cells]
+            steps += [(TARGET_CELL_INDEX, TARGET_CELL_FIELD, cell, None) for cell in cells]
+            source_cells = set(cells)
+
+            def skip(step: int, item: dict) -> bool:
+                return step >= len(cells) and item.get(CELL_FIELD) in source_cells
+        try:
+            edge_table = await dynamodb.table(EDGE_TABLE)
+            items, next_cursor = await query_pages(edge_table, steps, limit, cursor, fields=projection, skip=skip)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+        return {
+            "edges": [_clean_listed_item(decode_edge(item)) for item in items],
+            "cursor": next_cursor
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+# Fields a run sets besides the nodes and edges.
+_RUN_FIELDS = (LAST_RUN_FIELD, "notes")
+
+
+def _run_fields(flowchart: dict) -> dict:
+    # A run replaces these fields rather than changing them in place, so the values read
+    # before the run can be compared with the ones after it.
+    return {field: flowchart.get(field) for field in _RUN_FIELDS}
+
+
+async def _store_run(flowchart: dict, before: dict) -> int:
+    """
+    Store the result of a run as the next version of the flowchart it was read as. Like a
+    save, the nodes and edges the run changed are written to the Nodes/Edges tables first and
+    the flowchart is stored with the updated manifest; on a version conflict the tables are
+    restored to the winning version and VersionConflictError is raised. A run that changed
+    no node or edge and left `before` (see _run_fields) as it was stores nothing and keeps
+    the current version, so its ETag and cached copy stay valid.
+    """
+    with span("flowchart.sync_tables"):
+        node_result, edge_result = await _sync_tables(flowchart, flowchart.get(MANIFEST_FIELD, {}))
+    if not any(result["written"] or result["deleted"] for result in (node_result, edge_result)) \
+            and _run_fields(flowchart) == before:
+        return flowchart[VERSION_FIELD]
+    flowchart[MANIFEST_FIELD] = {"nodes": node_result["hashes"], "edges": edge_result["hashes"]}
+    try:
+        version = await store_flowchart(flowchart)
+    except VersionConflictError:
+        await _restore_tables(flowchart["id"], flowchart[MANIFEST_FIELD])
+        raise
+    flowchart_cache.invalidate(flowchart["id"], version)
+    return version
+
+
+async def run_flowchart_service(flowchart_id: str, force: bool = False) -> dict:
+    """
+    Run the flowchart and store the result as its next version. If the flowchart was saved
+    while the model was answering, the result is not stored and 409 is returned; the answers
+    stay cached, so running again is cheap.
+    """
+    try:
+        flowchart = await load_flowchart(flowchart_id)
+        if flowchart is None:
             raise HTTPException(status_code=404, detail="Flowchart not found")
 
-        flowchart = response["Item"]
-        flowchart = apply_llm_recommendations(flowchart)
-        updated_flowchart = convert_floats_to_decimal(flowchart)
-        flowchart_table.put_item(Item=updated_flowchart)
+        run_stats = {"cache_hits": 0, "cache_misses": 0}
+        before = _run_fields(flowchart)
+        with span("llm.run"):
+            flowchart = await apply_llm_recommendations(flowchart, force=force, stats=run_stats)
+        await _store_run(flowchart, before)
 
+        _strip_internal_fields(flowchart)
+        flowchart["run_stats"] = run_stats
         return flowchart
+    except HTTPException:
+        raise
+    except VersionConflictError as e:
+        raise HTTPException(status_code=409, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+
+async def stream_run_flowchart_service(flowchart_id: str, force: bool = False) -> AsyncIterator[str]:
+    """
+    Run the flowchart and stream the result as NDJSON: one line per node or edge whose
+    properties were updated, then a final {"type": "done"} line once the merged flowchart
+    has been persisted. A failure after streaming started is reported as {"type": "error"}.
+    """
+    try:
+        flowchart = await load_flowchart(flowchart_id)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    if flowchart is None:
+        raise HTTPException(status_code=404, detail="Flowchart not found")
+
+    async def events() -> AsyncIterator[str]:
+        run_stats = {"cache_hits": 0, "cache_misses": 0}
+        before = _run_fields(flowchart)
+        try:
+            async for update in stream_llm_recommendations(flowchart, force=force, stats=run_stats):
+                yield json.dumps(update) + "\n"
+            await _store_run(flowchart, before)
+        except Exception as e:
+            yield json.dumps({"type": "error", "detail": str(e)}) + "\n"
+            return
+
+        done = {"type": "done", "version": flowchart[VERSION_FIELD], "run_stats": run_stats}
+        if "notes" in flowchart:
+            done["notes"] = flowchart["notes"]
+        yield json.dumps(done) + "\n"
+
+    return events()
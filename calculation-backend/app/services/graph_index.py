@@ -0,0 +1,137 @@
+# app/services/graph_index.py
+from collections import deque
+from typing import List, Dict, Any, Iterable, Set
+
+
+class GraphIndex:
+    """
+    In-memory index over a flowchart's nodes and edges.
+
+    Edges point from `source` to `target`. Edges whose endpoints do not exist are kept in
+    `edges` but do not take part in adjacency.
+    """
+
+    def __init__(self, nodes: List[Dict[str, Any]], edges: List[Dict[str, Any]]):
+        self.nodes: Dict[str, Dict[str, Any]] = {str(node["id"]): node for node in nodes}
+        self.edges: Dict[str, Dict[str, Any]] = {str(edge["id"]): edge for edge in edges}
+        self.successors: Dict[str, List[str]] = {node_id: [] for node_id in self.nodes}
+        self.predecessors: Dict[str, List[str]] = {node_id: [] for node_id in self.nodes}
+        self.incident_edges: Dict[str, List[str]] = {node_id: [] for node_id in self.nodes}
+
+        for edge_id, edge in self.edges.items():
+            source, target = str(edge.get("source")), str(edge.get("target"))
+            for endpoint in {source, target}:
+                if endpoint in self.nodes:
+                    self.incident_edges[endpoint].append(edge_id)
+            if source in self.nodes and target in self.nodes:
+                self.successors[source].append(target)
+                self.predecessors[target].append(source)
+
+    def neighbours(self, node_id: str) -> List[str]:
+        return self.successors[node_id] + self.predecessors[node_id]
+
+    def expand(self, seeds: Iterable[str], radius: int) -> Set[str]:
+        """
+        Return the node ids within `radius` hops of any seed, ignoring edge direction.
+        """
+        reached = {node_id for node_id in seeds if node_id in self.nodes}
+        frontier = deque((node_id, 0) for node_id in reached)
+        while frontier:
+            node_id, distance = frontier.popleft()
+            if distance >= radius:
+                continue
+            for neighbour in self.neighbours(node_id):
+                if neighbour not in reached:
+                    reached.add(neighbour)
+                    frontier.append((neighbour, distance + 1))
+        return reached
+
+    def connected_components(self) -> List[List[str]]:
+        seen: Set[str] = set()
+        components = []
+        for start in self.nodes:
+            if start in seen:
+                continue
+            seen.add(start)
+            component = []
+            queue = deque([start])
+            while queue:
+                node_id = queue.popleft()
+                component.append(node_id)
+                for neighbour in self.neighbours(node_id):
+                    if neighbour not in seen:
+                        seen.add(neighbour)
+                        queue.append(neighbour)
+            components.append(component)
+        return components
+
+    def strongly_connected_components(self) -> List[List[str]]:
+        """
+        Tarjan's algorithm, iterative so that long chains do not hit the recursion limit.
+        Components are returned in reverse topological order of the condensed graph.
+        """
+        index_of: Dict[str, int] = {}
+        lowlink: Dict[str, int] = {}
+        on_stack: Set[str] = set()
+        stack: List[str] = []
+        components: List[List[str]] = []
+        counter = 0
+
+        for root in self.nodes:
+            if root in index_of:
+                continue
+            work = [(root, iter(self.successors[root]))]
+            index_of[root] = lowlink[root] = counter
+            counter += 1
+            stack.append(root)
+            on_stack.add(root)
+            while work:
+                node_id, successors = work[-1]
+                advanced = False
+                for successor in successors:
+                    if successor not in index_of:
+                        index_of[successor] = lowlink[successor] = counter
+                        counter += 1
+                        stack.append(successor)
+                        on_stack.add(successor)
+                        work.append((successor, iter(self.successors[successor])))
+                        advanced = True
+                        break
+                    if successor in on_stack:
+                        lowlink[node_id] = min(lowlink[node_id], index_of[successor])
+                if advanced:
+                    continue
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    lowlink[parent] = min(lowlink[parent], lowlink[node_id])
+                if lowlink[node_id] == index_of[node_id]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack.discard(member)
+                        component.append(member)
+                        if member == node_id:
+                            break
+                    components.append(component)
+        return components
+
+    def cycles(self) -> List[List[str]]:
+        """
+        Groups of nodes that lie on a cycle (recycle loops), including self-loops.
+        """
+        return [
+            component for component in self.strongly_connected_components()
+            if len(component) > 1 or component[0] in self.successors[component[0]]
+        ]
+
+    def has_cycle(self) -> bool:
+        return bool(self.cycles())
+
+    def topological_order(self) -> List[str]:
+        """
+        Node ids ordered from upstream to downstream. Nodes on a cycle are kept together
+        at the position of their loop, so the order is defined for cyclic graphs too.
+        """
+        return [node_id for component in reversed(self.strongly_connected_components())
+                for node_id in component]
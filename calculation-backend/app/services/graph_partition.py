@@ -0,0 +1,110 @@
+# app/services/graph_partition.py
+from collections import deque
+from typing import List, Dict, Any, Callable, Optional
+
+from app.services.graph_index import GraphIndex
+from app.utils.token_budget import estimate_tokens
+
+
+def _item_tokens(item: Dict[str, Any]) -> int:
+    data = item.get("data") or {}
+    return estimate_tokens(f"{item.get('id')} {data.get('label', '')} {data.get('properties', {})}")
+
+
+def partition_flowchart(nodes: List[Dict[str, Any]], edges: List[Dict[str, Any]], token_budget: int,
+                        item_tokens: Optional[Callable[[Dict[str, Any]], int]] = None
+                        ) -> List[Dict[str, List[Dict[str, Any]]]]:
+    """
+    Split a flowchart into chunks whose estimated prompt size stays within `token_budget`.
+
+    Connected components are kept whole when they fit and are packed together into shared
+    chunks; larger components are cut into breadth-first neighbourhoods. Every node and edge
+    is owned by exactly one chunk. Neighbours of a chunk that belong to another chunk are
+    attached as read-only `context_nodes`/`context_edges` (a one-hop halo).
+    `item_tokens` estimates the prompt cost of a single node or edge.
+    """
+    item_tokens = item_tokens or _item_tokens
+    index = GraphIndex(nodes, edges)
+    node_by_id = index.nodes
+    # A node's weight includes the edges it owns (its outgoing edges, or incoming ones whose
+    # source does not exist) so that a chunk's budget covers its edges as well.
+    weight = {node_id: item_tokens(node) for node_id, node in node_by_id.items()}
+    edge_owner: Dict[str, str] = {}
+    orphan_edges = []
+
+    for edge in edges:
+        source, target = str(edge.get("source")), str(edge.get("target"))
+        owner = source if source in node_by_id else target if target in node_by_id else None
+        if owner is None:
+            orphan_edges.append(edge)
+            continue
+        edge_owner[str(edge["id"])] = owner
+        weight[owner] += item_tokens(edge)
+
+    groups: List[List[str]] = []
+    packed: List[str] = []
+    packed_tokens = 0
+    for component in index.connected_components():
+        component_tokens = sum(weight[node_id] for node_id in component)
+        if component_tokens > token_budget:
+            groups.extend(_split_component(component, index, weight, token_budget))
+            continue
+        if packed and packed_tokens + component_tokens > token_budget:
+            groups.append(packed)
+            packed, packed_tokens = [], 0
+        packed.extend(component)
+        packed_tokens += component_tokens
+    if packed:
+        groups.append(packed)
+    if not groups and orphan_edges:
+        groups.append([])
+
+    chunk_of = {node_id: position for position, group in enumerate(groups) for node_id in group}
+    chunks = [
+        {"nodes": [node_by_id[node_id] for node_id in group], "edges": [],
+         "context_nodes": [], "context_edges": []}
+        for group in groups
+    ]
+    for edge in edges:
+        owner = edge_owner.get(str(edge["id"]))
+        chunks[chunk_of[owner] if owner is not None else 0]["edges"].append(edge)
+
+    for edge in edges:
+        source, target = str(edge.get("source")), str(edge.get("target"))
+        if source not in chunk_of or target not in chunk_of or chunk_of[source] == chunk_of[target]:
+            continue
+        owning_chunk = chunk_of[edge_owner[str(edge["id"])]]
+        for endpoint, other in ((source, target), (target, source)):
+            chunk = chunks[chunk_of[endpoint]]
+            chunk["context_nodes"].append(node_by_id[other])
+            if chunk_of[endpoint] != owning_chunk:
+                chunk["context_edges"].append(edge)
+
+    for chunk in chunks:
+        chunk["context_nodes"] = list({str(node["id"]): node for node in chunk["context_nodes"]}.values())
+    return chunks
+
+
+def _split_component(component: List[str], index: GraphIndex, weight: Dict[str, int],
+                     token_budget: int) -> List[List[str]]:
+    remaining = set(component)
+    groups = []
+    while remaining:
+        # Start from the least connected node so neighbourhoods grow in from the periphery.
+        start = min(remaining, key=lambda node_id: (len(index.neighbours(node_id)), node_id))
+        group, group_tokens = [], 0
+        queue = deque([start])
+        queued = {start}
+        while queue:
+            node_id = queue.popleft()
+            if group and group_tokens + weight[node_id] > token_budget:
+                break
+            group.append(node_id)
+            group_tokens += weight[node_id]
+            remaining.discard(node_id)
+            for neighbour in index.neighbours(node_id):
+                if neighbour in remaining and neighbour not in queued:
+                    queued.add(neighbour)
+                    queue.append(neighbour)
+        groups.append(group)
+    return groups
@@ -0,0 +1,286 @@
+# app/services/job_service.py
+import asyncio
+import contextvars
+import logging
+import time
+import uuid
+from typing import Coroutine, List, Optional, Set
+
+from fastapi import HTTPException
+
+from app.config import (
+    BATCH_RUN_MAX_FLOWCHARTS,
+    BATCH_RUN_PRIORITY,
+    BATCH_RUN_WORKERS,
+    JOB_LOCK_TTL_SECONDS,
+    JOB_RETENTION_SECONDS,
+    JOB_STORE,
+    RUN_QUEUE_LIMIT,
+    RUN_WORKERS
+)
+from app.db.dynamodb import JOB_TABLE
+from app.db.flowchart_store import scan_flowcharts
+from app.db.job_store import DynamoDBJobStore, InMemoryJobStore
+from app.services.flowchart_service import run_flowchart_service
+from app.services.llm_scheduler import priority_scope
+from app.utils.loop_local import LoopLocal
+
+if JOB_STORE == "dynamodb":
+    job_store = DynamoDBJobStore(JOB_TABLE, JOB_LOCK_TTL_SECONDS, JOB_RETENTION_SECONDS)
+else:
+    job_store = InMemoryJobStore(JOB_RETENTION_SECONDS)
+
+logger = logging.getLogger(__name__)
+
+# A running job renews the lock of its flowchart this often, well before it would expire.
+LOCK_RENEW_SECONDS = JOB_LOCK_TTL_SECONDS / 3
+
+# Jobs run as tasks on the event loop; these are the ones that have not finished yet.
+_tasks: Set[asyncio.Task] = set()
+# Jobs submitted by this process that have not finished yet, queued or running.
+_pending_jobs = 0
+_run_slots = LoopLocal(lambda: asyncio.Semaphore(RUN_WORKERS))
+
+# Batch runs have slots of their own, so that they never fill up the queue of single runs.
+_batch_slots = LoopLocal(lambda: asyncio.Semaphore(BATCH_RUN_WORKERS))
+BATCH_KIND = "batch"
+# Failed and skipped flowcharts listed on a batch record; the counts cover all of them.
+BATCH_MAX_REPORTED_FAILURES = 100
+
+
+def _start(job: Coroutine) -> None:
+    # The task runs in a context of its own: it outlives the request that submitted it, whose
+    # timings it must not add to.
+    task = contextvars.Context().run(asyncio.get_running_loop().create_task, job)
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+
+
+async def stop_jobs() -> None:
+    """Cancel the jobs of this process that have not finished, on shutdown."""
+    tasks = list(_tasks)
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def _keep_lock(flowchart_id: str, job_id: str) -> None:
+    # Renew the job's lock of the flowchart until cancelled. Returns once another job holds it.
+    while True:
+        await asyncio.sleep(LOCK_RENEW_SECONDS)
+        try:
+            if not await job_store.renew(flowchart_id, job_id):
+                return
+        except Exception:
+            # The lock is still held until it expires; the next renewal may get through.
+            logger.warning("Could not renew the lock of flowchart %s for job %s", flowchart_id, job_id,
+                           exc_info=True)
+
+
+async def _run_locked(job_id: str, flowchart_id: str, force: bool) -> dict:
+    # Run the flowchart while renewing the job's lock of it. A run that loses the lock is
+    # cancelled, so that it cannot store over the run of the job that took it.
+    run = asyncio.ensure_future(run_flowchart_service(flowchart_id, force=force))
+    heartbeat = asyncio.ensure_future(_keep_lock(flowchart_id, job_id))
+    try:
+        await asyncio.wait([run, heartbeat], return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        run.cancel()
+        heartbeat.cancel()
+        await asyncio.gather(run, heartbeat, return_exceptions=True)
+    if run.cancelled():
+        raise RuntimeError("The run lost the lock of its flowchart to another job")
+    return run.result()
+
+
+async def _run_job(job_id: str, flowchart_id: str, force: bool) -> dict:
+    # Run a queued job, record its outcome and release the flowchart. Returns the outcome.
+    started_at = time.time()
+    try:
+        await job_store.update_job(job_id, status="running", started_at=started_at)
+        flowchart = await _run_locked(job_id, flowchart_id, force)
+        result = {"run_stats": flowchart.get("run_stats")}
+        if "notes" in flowchart:
+            result["notes"] = flowchart["notes"]
+        fields = {"status": "done", "result": result}
+    except HTTPException as e:
+        fields = {"status": "failed", "error": e.detail}
+    except Exception as e:
+        fields = {"status": "failed", "error": str(e)}
+
+    finished_at = time.time()
+    try:
+        await job_store.update_job(job_id, finished_at=finished_at, duration=finished_at - started_at, **fields)
+    finally:
+        await job_store.release(flowchart_id, job_id)
+    return fields
+
+
+async def _execute_run_job(job_id: str, flowchart_id: str, force: bool) -> None:
+    global _pending_jobs
+    try:
+        async with _run_slots.get():
+            await _run_job(job_id, flowchart_id, force)
+    finally:
+        _pending_jobs -= 1
+
+
+async def submit_run_job_service(flowchart_id: str, force: bool = False) -> dict:
+    """
+    Queue a run of the flowchart and return its job straight away. If a run of the same
+    flowchart is already queued or running, that job is returned instead of a new one.
+    """
+    job = {
+        "job_id": uuid.uuid4().hex,
+        "flowchart_id": flowchart_id,
+        "status": "queued",
+        "force": force,
+        "created_at": time.time()
+    }
+    global _pending_jobs
+    if _pending_jobs >= RUN_QUEUE_LIMIT:
+        raise HTTPException(status_code=503, detail="Too many runs queued, try again later")
+
+    _pending_jobs += 1
+    try:
+        stored = await job_store.create_job(job)
+    except Exception as e:
+        _pending_jobs -= 1
+        raise HTTPException(status_code=500, detail=str(e))
+    if stored["job_id"] != job["job_id"]:
+        _pending_jobs -= 1
+        return stored
+
+    _start(_execute_run_job(job["job_id"], flowchart_id, force))
+    return stored
+
+
+async def get_job_service(job_id: str) -> dict:
+    try:
+        job = await job_store.get_job(job_id)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    if job is None or job_id.startswith("lock#"):
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+class _BatchProgress:
+    """
+    Counts the flowcharts of a batch as they finish and keeps the batch record up to date.
+    """
+
+    def __init__(self, batch_id: str, total: int):
+        self.batch_id = batch_id
+        self.total = total
+        self.counts = {"done": 0, "failed": 0, "skipped": 0}
+        self.failures = []
+        # Held while the record is written, so that the writes of a batch are not reordered.
+        self._lock = asyncio.Lock()
+
+    async def finish(self, flowchart_id: str, status: str, error=None) -> None:
+        async with self._lock:
+            self.counts[status] += 1
+            if status != "done" and len(self.failures) < BATCH_MAX_REPORTED_FAILURES:
+                self.failures.append({"flowchart_id": flowchart_id, "status": status, "error": error})
+            fields = {**self.counts, "failures": list(self.failures)}
+            if sum(self.counts.values()) == self.total:
+                fields.update(status="done", finished_at=time.time())
+            await job_store.update_job(self.batch_id, **fields)
+
+
+async def _run_batch_item(progress: _BatchProgress, slots: asyncio.Semaphore, job_id: str,
+                          flowchart_id: str, force: bool, priority: int) -> None:
+    try:
+        with priority_scope(priority):
+            fields = await _run_job(job_id, flowchart_id, force)
+        await progress.finish(flowchart_id, fields["status"], fields.get("error"))
+    except Exception as e:
+        await progress.finish(flowchart_id, "failed", str(e))
+    finally:
+        slots.release()
+
+
+async def _feed_batch(batch_id: str, flowchart_ids: List[str], force: bool, priority: int) -> None:
+    # Child jobs are created just before a batch slot is free to run them, so that a long
+    # batch does not hold the locks of flowcharts it will only get to hours later.
+    progress = _BatchProgress(batch_id, len(flowchart_ids))
+    slots = _batch_slots.get()
+    await job_store.update_job(batch_id, status="running", started_at=time.time())
+    for flowchart_id in flowchart_ids:
+        await slots.acquire()
+        job = {
+            "job_id": uuid.uuid4().hex,
+            "flowchart_id": flowchart_id,
+            "batch_id": batch_id,
+            "status": "queued",
+            "force": force,
+            "created_at": time.time()
+        }
+        try:
+            stored = await job_store.create_job(job)
+        except Exception as e:
+            slots.release()
+            await progress.finish(flowchart_id, "failed", str(e))
+            continue
+        if stored["job_id"] != job["job_id"]:
+            slots.release()
+            await progress.finish(flowchart_id, "skipped", f"Run {stored['job_id']} of this flowchart is already active")
+            continue
+        _start(_run_batch_item(progress, slots, job["job_id"], flowchart_id, force, priority))
+
+
+async def submit_batch_run_service(flowchart_ids: Optional[List[str]] = None, force: bool = False,
+                                   priority: int = BATCH_RUN_PRIORITY) -> dict:
+    """
+    Queue runs of many flowcharts (every stored flowchart if `flowchart_ids` is None) and
+    return the batch record straight away. Up to BATCH_RUN_WORKERS of them run at a time and
+    their model requests wait in llm_scheduler with `priority`, behind interactive runs.
+    Flowcharts that already have an active run are skipped.
+    """
+    try:
+        if flowchart_ids is None:
+            flowchart_ids = [flowchart["id"] async for flowchart in scan_flowcharts(fields=[])]
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    flowchart_ids = list(dict.fromkeys(flowchart_ids))
+    if not flowchart_ids:
+        raise HTTPException(status_code=400, detail="No flowcharts to run")
+    if len(flowchart_ids) > BATCH_RUN_MAX_FLOWCHARTS:
+        raise HTTPException(status_code=400, detail=f"A batch can run at most {BATCH_RUN_MAX_FLOWCHARTS} flowcharts")
+
+    batch = {
+        "job_id": uuid.uuid4().hex,
+        "kind": BATCH_KIND,
+        "status": "queued",
+        "total": len(flowchart_ids),
+        "done": 0,
+        "failed": 0,
+        "skipped": 0,
+        "failures": [],
+        "force": force,
+        "priority": priority,
+        "created_at": time.time()
+    }
+    try:
+        await job_store.put_job(batch)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    _start(_feed_batch(batch["job_id"], flowchart_ids, force, priority))
+    return batch
+
+
+async def get_batch_run_service(batch_id: str) -> dict:
+    """
+    Return a batch with its progress. While it runs, the finish time is extrapolated from
+    the rate at which its flowcharts have completed so far.
+    """
+    batch = await get_job_service(batch_id)
+    if batch.get("kind") != BATCH_KIND:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    completed = batch["done"] + batch["failed"] + batch["skipped"]
+    if batch["status"] == "running" and completed:
+        elapsed = time.time() - batch["started_at"]
+        batch["estimated_finish_at"] = batch["started_at"] + elapsed * batch["total"] / completed
+    return batch
@@ -0,0 +1,122 @@
+# app/services/llm_cache.py
+import json
+import logging
+import time
+from typing import List, Dict, Any, Optional
+
+from botocore.exceptions import BotoCoreError, ClientError
+
+from app.config import LLM_CACHE_MAX_ENTRIES, LLM_CACHE_TTL_SECONDS, LLM_MODEL
+from app.db.dynamodb import LLM_CACHE_TABLE, dynamodb
+from app.services.process_solver import is_fixed
+from app.utils.content_hash import content_hash
+from app.utils.lru_cache import LRUCache
+
+# Bump whenever the prompt or output schema changes so that old answers are not reused.
+CACHE_KEY_VERSION = 3
+
+logger = logging.getLogger(__name__)
+
+
+class LLMResponseCache:
+    """
+    Two-tier cache for parsed LLM responses: an in-process LRU backed by the DynamoDB table
+    `table_name`. Failures of the persistent tier (throttling, timeouts, connection errors) are
+    logged and treated as misses so they never fail a run.
+    """
+
+    def __init__(self, table_name: str, max_entries: int, ttl: int):
+        self.table_name = table_name
+        self.ttl = ttl
+        self.memory = LRUCache(max_entries, ttl)
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        value = self.memory.get(key)
+        if value is not None:
+            return value
+
+        try:
+            table = await dynamodb.table(self.table_name)
+            item = (await table.get_item(Key={"cache_key": key})).get("Item")
+        except (ClientError, BotoCoreError):
+            logger.warning("LLM cache read failed", exc_info=True)
+            return None
+        if not item or int(item["expires_at"]) < time.time():
+            return None
+
+        value = json.loads(item["response"])
+        self.memory.set(key, value, expires_at=int(item["expires_at"]))
+        return value
+
+    async def set(self, key: str, value: Dict[str, Any]) -> None:
+        expires_at = int(time.time()) + self.ttl
+        self.memory.set(key, value, expires_at=expires_at)
+        try:
+            table = await dynamodb.table(self.table_name)
+            await table.put_item(Item={
+                "cache_key": key,
+                "response": json.dumps(value),
+                "expires_at": expires_at
+            })
+        except (ClientError, BotoCoreError):
+            logger.warning("LLM cache write failed", exc_info=True)
+
+    async def remember(self, key: str, value: Dict[str, Any]) -> None:
+        """Store `value` unless the in-process tier already holds an entry for `key`."""
+        if self.memory.get(key) is None:
+            await self.set(key, value)
+
+
+llm_cache = LLMResponseCache(LLM_CACHE_TABLE, LLM_CACHE_MAX_ENTRIES, LLM_CACHE_TTL_SECONDS)
+
+
+def _normalize_properties(properties: Dict[str, Any]) -> Dict[str, Any]:
+    # Locked and computed values are constraints and part of the question; the other values
+    # are what the model is asked to (re)compute, so only their names matter.
+    return {
+        "locked": {k: v.get("value") for k, v in properties.items() if is_fixed(v)},
+        "unlocked": sorted(k for k, v in properties.items() if not is_fixed(v))
+    }
+
+
+def flowchart_cache_key(nodes: List[Dict[str, Any]], edges: List[Dict[str, Any]],
+                        context_nodes: Optional[List[Dict[str, Any]]] = None,
+                        context_edges: Optional[List[Dict[str, Any]]] = None) -> str:
+    """
+    Canonical key for the normalized locked/unlocked property state of a set of nodes and edges,
+    plus any read-only context sent along with them.
+    Positions, styling and the flowchart id do not affect the key.
+    """
+    state = {
+        "version": CACHE_KEY_VERSION,
+        "model": LLM_MODEL,
+        "nodes": _normalize_nodes(nodes),
+        "edges": _normalize_edges(edges)
+    }
+    if context_nodes or context_edges:
+        state["context_nodes"] = _normalize_nodes(context_nodes or [])
+        state["context_edges"] = _normalize_edges(context_edges or [])
+    return content_hash(state)
+
+
+def _normalize_nodes(nodes: List[Dict[str, Any]]) -> list:
+    return sorted(
+        (
+            str(node["id"]),
+            node.get("data", {}).get("label"),
+            _normalize_properties(node.get("data", {}).get("properties", {}))
+        )
+        for node in nodes
+    )
+
+
+def _normalize_edges(edges: List[Dict[str, Any]]) -> list:
+    return sorted(
+        (
+            str(edge["id"]),
+            edge.get("source"),
+            edge.get("target"),
+            _normalize_properties((edge.get("data") or {}).get("properties", {}))
+        )
+        for edge in edges
+    )
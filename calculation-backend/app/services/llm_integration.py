@@ -1,40 +1,137 @@
 # app/services/llm_integration.py
 
+import asyncio
+import copy
 import json
-from typing import List, Dict, Any
-import openai
-from dotenv import load_dotenv
+import threading
+import time
+from collections import deque
+from typing import List, Dict, Any, AsyncIterator, Callable, Optional, Tuple
 import os
 
-from app.utils.decimal_converter import convert_decimal_to_float
+from fastapi.concurrency import run_in_threadpool
 
-client = openai.OpenAI(api_key="test_key")
+from app.config import (
+    LLM_MODEL,
+    LLM_CHUNK_TOKEN_BUDGET,
+    LLM_MAX_CONCURRENCY,
+    LLM_MAX_CONNECTIONS,
+    LLM_MAX_KEEPALIVE_CONNECTIONS,
+    LLM_PROMPT_TOKEN_LIMIT,
+    PROMPT_ENCODING,
+    RUN_DIRTY_RADIUS
+)
+from app.services.dirty_set import LAST_RUN_FIELD, compute_dirty_set, snapshot_run_state
+from app.services.graph_index import GraphIndex
+from app.services.graph_partition import partition_flowchart
+from app.services.llm_cache import llm_cache, flowchart_cache_key
+from app.services.llm_scheduler import llm_scheduler
+from app.services.process_solver import LLM_SOURCE, SOURCE_FIELD, is_fixed, solve_process_balances
+from app.services.prompt_encoding import (
+    COMPACT_SECTIONS,
+    build_compact_flowchart_prompt,
+    compact_item_tokens,
+    expand_compact_block,
+    expand_compact_response
+)
+from app.utils.incremental_json import IncrementalBlockParser
+from app.utils.metrics import LLM_CACHE_LOOKUPS, LLM_ERRORS, LLM_TOKENS, record_span, span
+from app.utils.token_budget import count_tokens, estimate_tokens
 
+# The async OpenAI client, created on first use and closed by the app's lifespan, unless it
+# was given with set_llm_client.
+_client = None
+_owns_client = False
+
+
+def _create_llm_client():
+    # Imported here: the SDK takes most of a second to import, which would slow down start-up.
+    # Retries are left to llm_scheduler, which backs off for every run of the process at once.
+    import httpx
+    import openai
+
+    return openai.AsyncOpenAI(
+        api_key=os.getenv("OPENAI_API_KEY", "test_key"),
+        max_retries=0,
+        http_client=openai.DefaultAsyncHttpxClient(limits=httpx.Limits(
+            max_connections=LLM_MAX_CONNECTIONS,
+            max_keepalive_connections=LLM_MAX_KEEPALIVE_CONNECTIONS
+        ))
+    )
+
+
+def get_llm_client():
+    global _client, _owns_client
+    if _client is None:
+        _client, _owns_client = _create_llm_client(), True
+    return _client
+
+
+def set_llm_client(new_client) -> None:
+    """
+    Replace the OpenAI client, e.g. with a stand-in for benchmarks. Anything with a
+    compatible async `chat.completions.create` works.
+    """
+    global _client, _owns_client
+    _client, _owns_client = new_client, False
+
+
+async def close_llm_client() -> None:
+    """
+    Close the connections of the client created by get_llm_client; the next model request
+    creates a new one. Clients given with set_llm_client are left alone.
+    """
+    global _client, _owns_client
+    if _owns_client:
+        client, _client, _owns_client = _client, None, False
+        await client.close()
+
+
+_stats_lock = threading.Lock()
+
+
+def _split_properties(properties: Dict[str, Any]):
+    # Computed values are presented as locked: they follow from the locked ones.
+    locked_props = {k: v for k, v in properties.items() if is_fixed(v)}
+    unlocked_props = {k: v for k, v in properties.items() if not is_fixed(v)}
+    return locked_props, unlocked_props
+
+
+def _describe_node(node: Dict[str, Any]) -> str:
+    label = node.get("data", {}).get("label", "(no label)")
+    locked_props, unlocked_props = _split_properties(node.get("data", {}).get("properties", {}))
+    return (
+        f"Node {node['id']} labeled '{label}':\n"
+        f"  Locked properties: {locked_props}\n"
+        f"  Unlocked properties: {unlocked_props}"
+    )
+
+
+def _describe_edge(edge: Dict[str, Any]) -> str:
+    source = edge.get("source", "unknown")
+    target = edge.get("target", "unknown")
+    locked_props, unlocked_props = _split_properties((edge.get("data") or {}).get("properties", {}))
+    return (
+        f"Edge {edge['id']} ({source} --> {target}):\n"
+        f"  Locked properties: {locked_props}\n"
+        f"  Unlocked properties: {unlocked_props}"
+    )
 
-def build_flowchart_prompt(flowchart_id: str, nodes: List[Dict[str, Any]], edges: List[Dict[str, Any]]) -> str:
-    node_descriptions = []
-    for node in nodes:
-        label = node.get("data", {}).get("label", "(no label)")
-        properties = node.get("data", {}).get("properties", {})
-        locked_props = {k: v for k, v in properties.items() if v.get("isLocked")}
-        unlocked_props = {k: v for k, v in properties.items() if not v.get("isLocked")}
-        node_descriptions.append(
-            f"Node {node['id']} labeled '{label}':\n"
-            f"  Locked properties: {locked_props}\n"
-            f"  Unlocked properties: {unlocked_props}"
-        )
 
-    edge_descriptions = []
-    for edge in edges:
-        source = edge.get("source", "unknown")
-        target = edge.get("target", "unknown")
-        properties = edge.get("data", {}).get("properties", {})
-        locked_props = {k: v for k, v in properties.items() if v.get("isLocked")}
-        unlocked_props = {k: v for k, v in properties.items() if not v.get("isLocked")}
-        edge_descriptions.append(
-            f"Edge {edge['id']} ({source} --> {target}):\n"
-            f"  Locked properties: {locked_props}\n"
-            f"  Unlocked properties: {unlocked_props}"
+def build_flowchart_prompt(flowchart_id: str, nodes: List[Dict[str, Any]], edges: List[Dict[str, Any]],
+                           context_nodes: Optional[List[Dict[str, Any]]] = None,
+                           context_edges: Optional[List[Dict[str, Any]]] = None) -> str:
+    node_descriptions = [_describe_node(node) for node in nodes]
+    edge_descriptions = [_describe_edge(edge) for edge in edges]
+
+    context = ""
+    if context_nodes or context_edges:
+        context_descriptions = [_describe_node(node) for node in context_nodes or []]
+        context_descriptions += [_describe_edge(edge) for edge in context_edges or []]
+        context = (
+            "\nNeighbouring components and pipes, for context only "
+            "(do not suggest values for these):\n"
+            f"{chr(10).join(context_descriptions)}\n"
         )
 
     prompt = f"""
@@ -49,7 +146,7 @@ Nodes:
 
 Edges:
 {chr(10).join(edge_descriptions)}
-
+{context}
 IMPORTANT:
 - Locked properties are set and should not be modified
 - Only suggest values for unlocked properties
@@ -82,72 +179,498 @@ Required output schema:
 """
     return prompt.strip()
 
-def call_llm_for_flowchart(prompt: str) -> Dict[str, Any]:
-    try:
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": "You are a chemical process design assistant."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.0
-        )
-        llm_text = response.choices[0].message.content.strip()
+def build_prompt(flowchart_id: str, nodes: List[Dict[str, Any]], edges: List[Dict[str, Any]],
+                 context_nodes: Optional[List[Dict[str, Any]]] = None,
+                 context_edges: Optional[List[Dict[str, Any]]] = None) -> str:
+    """
+    Build the prompt in the configured PROMPT_ENCODING ("compact" or "verbose").
+    """
+    with span("llm.prompt"):
+        if PROMPT_ENCODING == "verbose":
+            return build_flowchart_prompt(flowchart_id, nodes, edges, context_nodes, context_edges)
+        return build_compact_flowchart_prompt(flowchart_id, nodes, edges, context_nodes, context_edges)
+
+def _item_tokens(item: Dict[str, Any]) -> int:
+    if PROMPT_ENCODING == "verbose":
+        return estimate_tokens(_describe_edge(item) if "source" in item else _describe_node(item))
+    return compact_item_tokens(item)
 
-        if llm_text.startswith("```json"):
-            llm_text = llm_text.removeprefix("```json").removesuffix("```").strip()
-        elif llm_text.startswith("```"):
-            llm_text = llm_text.removeprefix("```").removesuffix("```").strip()
+def _strip_code_fence(llm_text: str) -> str:
+    if llm_text.startswith("```json"):
+        llm_text = llm_text.removeprefix("```json").removesuffix("```").strip()
+    elif llm_text.startswith("```"):
+        llm_text = llm_text.removeprefix("```").removesuffix("```").strip()
+    return llm_text
 
-        return json.loads(llm_text)
+def _llm_messages(prompt: str) -> List[Dict[str, str]]:
+    return [
+        {"role": "system", "content": "You are a chemical process design assistant."},
+        {"role": "user", "content": prompt}
+    ]
+
+async def call_llm_for_flowchart(prompt: str, stats: Optional[Dict[str, int]] = None,
+                                 prompt_tokens: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Send the prompt once llm_scheduler admits it and parse the answer. Failures, including
+    retries running out, are returned as an error dict.
+    """
+    if prompt_tokens is None:
+        prompt_tokens = count_tokens(prompt, LLM_MODEL)
+    try:
+        async with llm_scheduler.request(prompt_tokens) as reservation:
+            with span("llm.request"):
+                response = await reservation.call(lambda: get_llm_client().chat.completions.create(
+                    model=LLM_MODEL,
+                    messages=_llm_messages(prompt),
+                    temperature=0.0
+                ))
+            llm_text = _strip_code_fence(response.choices[0].message.content.strip())
+            usage = getattr(response, "usage", None)
+            completion_tokens = usage.completion_tokens if usage else count_tokens(llm_text, LLM_MODEL)
+            await reservation.settle(prompt_tokens + completion_tokens)
+        _count(stats, "completion_tokens", completion_tokens)
+        with span("llm.parse"):
+            return expand_compact_response(json.loads(llm_text))
     except Exception as e:
+        _count_error(e)
         return {
             "error": "LLM call or parsing failed",
             "error_details": str(e),
             "raw_response": locals().get("llm_text", None)
         }
-    
-def apply_llm_recommendations(flowchart: dict) -> dict:
-    nodes = convert_decimal_to_float(flowchart.get("nodes", []))
-    edges = convert_decimal_to_float(flowchart.get("edges", []))
 
-    prompt = build_flowchart_prompt(flowchart["id"], nodes, edges)
-    llm_data = call_llm_for_flowchart(prompt)
+async def stream_llm_for_flowchart(prompt: str, on_block: Callable[[str, str, Dict[str, Any]], None],
+                                   stats: Optional[Dict[str, int]] = None,
+                                   prompt_tokens: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Streaming variant of call_llm_for_flowchart: calls on_block("nodes" | "edges", id, block)
+    as soon as each block of the answer is complete, then returns the full parsed answer (or
+    an error dict). Compact answers are expanded on the fly.
+    """
+    parser = IncrementalBlockParser()
+    if prompt_tokens is None:
+        prompt_tokens = count_tokens(prompt, LLM_MODEL)
+    try:
+        async with llm_scheduler.request(prompt_tokens) as reservation:
+            started = time.perf_counter()
+            stream = await reservation.call(lambda: get_llm_client().chat.completions.create(
+                model=LLM_MODEL,
+                messages=_llm_messages(prompt),
+                temperature=0.0,
+                stream=True
+            ))
+            async for event in stream:
+                if not event.choices:
+                    continue
+                delta = event.choices[0].delta.content
+                if not delta:
+                    continue
+                for section, item_id, block in parser.feed(delta):
+                    if isinstance(block, dict):
+                        on_block(COMPACT_SECTIONS.get(section, section), item_id, expand_compact_block(block))
+            record_span("llm.request", time.perf_counter() - started)
+            completion_tokens = count_tokens(parser.text, LLM_MODEL)
+            await reservation.settle(prompt_tokens + completion_tokens)
+        _count(stats, "completion_tokens", completion_tokens)
+        with span("llm.parse"):
+            return expand_compact_response(json.loads(_strip_code_fence(parser.text.strip())))
+    except Exception as e:
+        _count_error(e)
+        return {
+            "error": "LLM call or parsing failed",
+            "error_details": str(e),
+            "raw_response": parser.text or None
+        }
+
+def _count_error(error: Exception) -> None:
+    # JSON errors are answers that could not be parsed; anything else failed on the way.
+    LLM_ERRORS.inc(reason="parse" if isinstance(error, ValueError) else "request")
+
+# Run statistics that are also exported as metrics, for all runs of the process together.
+_EXPORTED_STATS = {
+    "prompt_tokens": (LLM_TOKENS, {"kind": "prompt"}),
+    "completion_tokens": (LLM_TOKENS, {"kind": "completion"}),
+    "cache_hits": (LLM_CACHE_LOOKUPS, {"result": "hit"}),
+    "cache_misses": (LLM_CACHE_LOOKUPS, {"result": "miss"})
+}
+
+def _count(stats: Optional[Dict[str, int]], key: str, amount: int = 1) -> None:
+    if key in _EXPORTED_STATS:
+        metric, labels = _EXPORTED_STATS[key]
+        metric.inc(amount, **labels)
+    if stats is None:
+        return
+    with _stats_lock:
+        stats[key] = stats.get(key, 0) + amount
+
+async def get_llm_recommendations(flowchart_id: str, nodes: List[Dict[str, Any]], edges: List[Dict[str, Any]],
+                                  context_nodes: Optional[List[Dict[str, Any]]] = None,
+                                  context_edges: Optional[List[Dict[str, Any]]] = None,
+                                  force: bool = False, stats: Optional[Dict[str, int]] = None,
+                                  prompt: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Return the LLM recommendations for the given nodes and edges, answering from the
+    recommendation cache when the same property state was seen before.
+    `force` skips the cache lookup; hits, misses and token counts are added to `stats`.
+    Prompts over LLM_PROMPT_TOKEN_LIMIT are refused instead of being sent.
+    """
+    cache_key = flowchart_cache_key(nodes, edges, context_nodes, context_edges)
 
-    if isinstance(llm_data, dict) and "error" in llm_data:
-        flowchart["notes"] = llm_data
+    llm_data = None if force else await llm_cache.get(cache_key)
+    if llm_data is not None:
+        _count(stats, "cache_hits")
+        return llm_data
+
+    _count(stats, "cache_misses")
+    if prompt is None:
+        prompt = build_prompt(flowchart_id, nodes, edges, context_nodes, context_edges)
+    prompt_tokens = count_tokens(prompt, LLM_MODEL)
+    if prompt_tokens > LLM_PROMPT_TOKEN_LIMIT:
+        return _prompt_too_large(prompt_tokens)
+    _count(stats, "prompt_tokens", prompt_tokens)
+
+    llm_data = await call_llm_for_flowchart(prompt, stats=stats, prompt_tokens=prompt_tokens)
+    if not (isinstance(llm_data, dict) and "error" in llm_data):
+        await llm_cache.set(cache_key, llm_data)
+    return llm_data
+
+def _prompt_too_large(prompt_tokens: int) -> Dict[str, Any]:
+    LLM_ERRORS.inc(reason="prompt_too_large")
+    return {
+        "error": "Prompt exceeds token limit",
+        "error_details": f"{prompt_tokens} tokens, limit is {LLM_PROMPT_TOKEN_LIMIT}"
+    }
+
+def merge_llm_updates(items: List[Dict[str, Any]], updates: Dict[str, Any]) -> None:
+    """
+    Apply recommended properties to nodes or edges in place, marked "source": "llm".
+    Locked and computed properties are never overwritten.
+    """
+    for item in items:
+        item_id = str(item["id"])
+        if item_id not in updates:
+            continue
+        if not item.get("data"):
+            item["data"] = {}
+        properties = item["data"].setdefault("properties", {})
+        for prop_name, prop_data in updates[item_id].get("properties", {}).items():
+            if prop_name not in properties or not is_fixed(properties[prop_name]):
+                properties[prop_name] = {
+                    "value": prop_data["value"],
+                    "isLocked": False,
+                    SOURCE_FIELD: LLM_SOURCE
+                }
+
+def plan_llm_run(flowchart: dict, force: bool = False, stats: Optional[Dict[str, int]] = None) -> Dict[str, Any]:
+    """
+    Work out what a run has to ask the model: the dirty part of the graph, split into chunks.
+    `flowchart` must be plain (as returned by load_flowchart); its nodes and edges are updated in place.
+    Everything the mass and energy balances determine is filled in first, and the ids of the
+    items that changed are returned under "computed".
+    """
+    nodes = flowchart.get("nodes", [])
+    edges = flowchart.get("edges", [])
+
+    index = GraphIndex(nodes, edges)
+    with span("llm.solve"):
+        solved = solve_process_balances(index)
+    _count(stats, "computed_properties", solved["computed_properties"])
+    _count(stats, "balance_conflicts", solved["balance_conflicts"])
+
+    # Only the part of the graph that changed since the last run (plus its neighbourhood)
+    # is sent to the model; everything else keeps the values from previous runs.
+    if force:
+        dirty_nodes, dirty_edges = set(index.nodes), set(index.edges)
+    else:
+        dirty_nodes, dirty_edges = compute_dirty_set(index, flowchart.get(LAST_RUN_FIELD), RUN_DIRTY_RADIUS)
+    _count(stats, "dirty_nodes", len(dirty_nodes))
+    _count(stats, "dirty_edges", len(dirty_edges))
+
+    with span("llm.partition"):
+        chunks = partition_flowchart(
+            [index.nodes[node_id] for node_id in index.topological_order() if node_id in dirty_nodes],
+            [edge for edge_id, edge in index.edges.items() if edge_id in dirty_edges],
+            LLM_CHUNK_TOKEN_BUDGET,
+            item_tokens=_item_tokens
+        )
+    chunks = _fit_chunks(flowchart["id"], chunks, index)
+    _count(stats, "chunks", len(chunks))
+
+    return {
+        "nodes": nodes,
+        "edges": edges,
+        "index": index,
+        "chunks": chunks,
+        "computed": {"nodes": solved["nodes"], "edges": solved["edges"]}
+    }
+
+def _attach_context(chunk: Dict[str, Any], index: GraphIndex) -> None:
+    # Every neighbour the chunk does not own, dirty or clean, goes along as read-only context.
+    owned_nodes = {str(node["id"]) for node in chunk["nodes"]}
+    owned_edges = {str(edge["id"]) for edge in chunk["edges"]}
+    context_nodes = {
+        neighbour for node_id in owned_nodes for neighbour in index.neighbours(node_id)
+        if neighbour not in owned_nodes
+    }
+    for edge in chunk["edges"]:
+        context_nodes.update(
+            endpoint for endpoint in (str(edge.get("source")), str(edge.get("target")))
+            if endpoint in index.nodes and endpoint not in owned_nodes
+        )
+    context_edges = {
+        edge_id for node_id in owned_nodes for edge_id in index.incident_edges[node_id]
+        if edge_id not in owned_edges
+    }
+    chunk["context_nodes"] = [index.nodes[node_id] for node_id in sorted(context_nodes)]
+    chunk["context_edges"] = [index.edges[edge_id] for edge_id in sorted(context_edges)]
+
+def _fit_chunks(flowchart_id: str, chunks: List[Dict[str, Any]], index: GraphIndex) -> List[Dict[str, Any]]:
+    """
+    Build each chunk's prompt and measure it with the tokenizer. Chunks whose prompt is over
+    LLM_PROMPT_TOKEN_LIMIT (the per-item estimates used for partitioning are only approximate)
+    are split again with half the budget until they fit or hold a single item.
+    """
+    fitted = []
+    pending = deque((chunk, LLM_CHUNK_TOKEN_BUDGET) for chunk in chunks)
+    while pending:
+        chunk, budget = pending.popleft()
+        _attach_context(chunk, index)
+        prompt = build_prompt(flowchart_id, chunk["nodes"], chunk["edges"],
+                              chunk["context_nodes"], chunk["context_edges"])
+        prompt_tokens = count_tokens(prompt, LLM_MODEL)
+        if prompt_tokens > LLM_PROMPT_TOKEN_LIMIT and len(chunk["nodes"]) + len(chunk["edges"]) > 1:
+            parts = partition_flowchart(chunk["nodes"], chunk["edges"], budget // 2, item_tokens=_item_tokens)
+            if len(parts) < 2:
+                half_nodes, half_edges = len(chunk["nodes"]) // 2, len(chunk["edges"]) // 2
+                parts = [
+                    {"nodes": chunk["nodes"][:half_nodes], "edges": chunk["edges"][:half_edges]},
+                    {"nodes": chunk["nodes"][half_nodes:], "edges": chunk["edges"][half_edges:]}
+                ]
+            pending.extend((part, max(1, budget // 2)) for part in parts)
+            continue
+        chunk["prompt"] = prompt
+        chunk["prompt_tokens"] = prompt_tokens
+        fitted.append(chunk)
+    return fitted
+
+def _owned_updates(chunk: Dict[str, Any], llm_data: Dict[str, Any]):
+    # A chunk may only update the items it owns, never its read-only context.
+    chunk_node_updates = llm_data.get("nodes") or {}
+    chunk_edge_updates = llm_data.get("edges") or {}
+    node_updates = {
+        str(node["id"]): chunk_node_updates[str(node["id"])]
+        for node in chunk["nodes"] if str(node["id"]) in chunk_node_updates
+    }
+    edge_updates = {
+        str(edge["id"]): chunk_edge_updates[str(edge["id"])]
+        for edge in chunk["edges"] if str(edge["id"]) in chunk_edge_updates
+    }
+    return node_updates, edge_updates
+
+def finish_llm_run(flowchart: dict, plan: Dict[str, Any], results: List[Dict[str, Any]]) -> dict:
+    """
+    Merge the per-chunk answers of a planned run into the flowchart and record the run snapshot.
+    """
+    nodes, edges, index, chunks = plan["nodes"], plan["edges"], plan["index"], plan["chunks"]
+    flowchart.pop("notes", None)
+
+    node_updates, edge_updates, errors = {}, {}, []
+    failed_nodes, failed_edges = set(), set()
+    for chunk, llm_data in zip(chunks, results):
+        if not isinstance(llm_data, dict) or "error" in llm_data:
+            errors.append(llm_data)
+            failed_nodes.update(str(node["id"]) for node in chunk["nodes"])
+            failed_edges.update(str(edge["id"]) for edge in chunk["edges"])
+            continue
+        chunk_node_updates, chunk_edge_updates = _owned_updates(chunk, llm_data)
+        node_updates.update(chunk_node_updates)
+        edge_updates.update(chunk_edge_updates)
+
+    if errors and len(errors) == len(chunks):
+        flowchart["notes"] = errors[0]
         return flowchart
+    if errors:
+        flowchart["notes"] = {
+            "error": f"LLM call or parsing failed for {len(errors)} of {len(chunks)} chunks",
+            "chunk_errors": errors
+        }
 
-    if "nodes" in llm_data:
-        node_updates = llm_data["nodes"]
-        for node in nodes:
-            node_id = str(node["id"])
-            if node_id in node_updates:
-                updated_node = node_updates[node_id]
-                node.setdefault("data", {}).setdefault("properties", {})
-                for prop_name, prop_data in updated_node.get("properties", {}).items():
-                    if (prop_name not in node["data"]["properties"] or
-                        not node["data"]["properties"][prop_name].get("isLocked", False)):
-                        node["data"]["properties"][prop_name] = {
-                            "value": prop_data["value"],
-                            "isLocked": False
-                        }
-        flowchart["nodes"] = nodes
-
-    if "edges" in llm_data:
-        edge_updates = llm_data["edges"]
-        for edge in edges:
-            edge_id = str(edge["id"])
-            if edge_id in edge_updates:
-                updated_edge = edge_updates[edge_id]
-                edge.setdefault("data", {}).setdefault("properties", {})
-                for prop_name, prop_data in updated_edge.get("properties", {}).items():
-                    if (prop_name not in edge["data"]["properties"] or
-                        not edge["data"]["properties"][prop_name].get("isLocked", False)):
-                        edge["data"]["properties"][prop_name] = {
-                            "value": prop_data["value"],
-                            "isLocked": False
+    merge_llm_updates(nodes, node_updates)
+    merge_llm_updates(edges, edge_updates)
+    flowchart["nodes"] = nodes
+    flowchart["edges"] = edges
+
+    # Items of failed chunks are left out of the snapshot so that the next run retries them.
+    last_run = snapshot_run_state(index)
+    for node_id in failed_nodes:
+        last_run["nodes"].pop(node_id, None)
+    for edge_id in failed_edges:
+        last_run["edges"].pop(edge_id, None)
+    flowchart[LAST_RUN_FIELD] = last_run
+    return flowchart
+
+def settled_answers(plan: Dict[str, Any], results: List[Dict[str, Any]]) -> List[Tuple[str, Dict[str, Any]]]:
+    """
+    Applying an answer adds the recommended properties, which changes the cache key. Returns
+    (key, answer) for the settled state of every answered chunk of a finished run, to be
+    remembered as well so that the next run is a hit.
+    """
+    return [
+        (flowchart_cache_key(chunk["nodes"], chunk["edges"], chunk["context_nodes"], chunk["context_edges"]),
+         llm_data)
+        for chunk, llm_data in zip(plan["chunks"], results)
+        if isinstance(llm_data, dict) and "error" not in llm_data
+    ]
+
+async def _finish_run(flowchart: dict, plan: Dict[str, Any], results: List[Dict[str, Any]]) -> dict:
+    with span("llm.merge"):
+        flowchart = await run_in_threadpool(finish_llm_run, flowchart, plan, results)
+        settled = await run_in_threadpool(settled_answers, plan, results)
+    await asyncio.gather(*(llm_cache.remember(key, llm_data) for key, llm_data in settled))
+    return flowchart
+
+async def apply_llm_recommendations(flowchart: dict, force: bool = False,
+                                    stats: Optional[Dict[str, int]] = None) -> dict:
+    """
+    Run the flowchart: plan the run, ask the model for up to LLM_MAX_CONCURRENCY chunks at a
+    time and merge the answers. Planning and merging are CPU-bound and run in the threadpool;
+    the model requests are awaited on the event loop.
+    """
+    plan = await run_in_threadpool(plan_llm_run, flowchart, force=force, stats=stats)
+    slots = asyncio.Semaphore(max(1, LLM_MAX_CONCURRENCY))
+
+    async def run_chunk(chunk):
+        async with slots:
+            return await get_llm_recommendations(
+                flowchart["id"], chunk["nodes"], chunk["edges"],
+                chunk["context_nodes"], chunk["context_edges"],
+                force=force, stats=stats, prompt=chunk["prompt"]
+            )
+
+    results = await asyncio.gather(*(run_chunk(chunk) for chunk in plan["chunks"]))
+    return await _finish_run(flowchart, plan, list(results))
+
+async def stream_llm_recommendations(flowchart: dict, force: bool = False,
+                                     stats: Optional[Dict[str, int]] = None) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Streaming variant of apply_llm_recommendations. Items filled in by the balance solver are
+    yielded first. Chunks are streamed from the model concurrently, and every node/edge block
+    is merged with the locked-property rule as soon as it is complete and yielded as
+    {"type": "node" | "edge", "id": ..., "properties": ...}. If the answer of a chunk fails
+    in the end (e.g. it cannot be parsed as a whole), the items it updated are restored and
+    yielded again with their previous properties and "reverted": True.
+    Once all chunks are in, the flowchart is finished exactly like a non-streaming run.
+    """
+    plan = await run_in_threadpool(plan_llm_run, flowchart, force=force, stats=stats)
+    chunks = plan["chunks"]
+    node_by_id = {str(node["id"]): node for node in plan["nodes"]}
+    edge_by_id = {str(edge["id"]): edge for edge in plan["edges"]}
+    events: "asyncio.Queue" = asyncio.Queue()
+    slots = asyncio.Semaphore(max(1, LLM_MAX_CONCURRENCY))
+
+    async def stream_chunk(position: int, cache_key: str, prompt: str, prompt_tokens: int) -> None:
+        cached = False
+        try:
+            llm_data = None if force else await llm_cache.get(cache_key)
+            if llm_data is not None:
+                cached = True
+                _count(stats, "cache_hits")
+            elif prompt_tokens > LLM_PROMPT_TOKEN_LIMIT:
+                _count(stats, "cache_misses")
+                llm_data = _prompt_too_large(prompt_tokens)
+            else:
+                _count(stats, "cache_misses")
+                _count(stats, "prompt_tokens", prompt_tokens)
+                async with slots:
+                    llm_data = await stream_llm_for_flowchart(
+                        prompt,
+                        lambda *block: events.put_nowait(("block", position, block, False)),
+                        stats=stats, prompt_tokens=prompt_tokens
+                    )
+                if not (isinstance(llm_data, dict) and "error" in llm_data):
+                    await llm_cache.set(cache_key, llm_data)
+        except Exception as e:
+            llm_data = {"error": "LLM call or parsing failed", "error_details": str(e)}
+        events.put_nowait(("done", position, llm_data, cached))
+
+    # Keys are computed up front (prompts already are), in the threadpool: blocks are merged
+    # into the shared node and edge dicts while other chunks are still streaming.
+    chunk_requests = await run_in_threadpool(lambda: [
+        (
+            flowchart_cache_key(chunk["nodes"], chunk["edges"], chunk["context_nodes"], chunk["context_edges"]),
+            chunk["prompt"],
+            chunk["prompt_tokens"]
+        )
+        for chunk in chunks
+    ])
+    owned_ids = [
+        {
+            "nodes": {str(node["id"]) for node in chunk["nodes"]},
+            "edges": {str(edge["id"]) for edge in chunk["edges"]}
+        }
+        for chunk in chunks
+    ]
+
+    results: List[Optional[Dict[str, Any]]] = [None] * len(chunks)
+    # Properties of the items each chunk has updated so far, as they were before, so that the
+    # blocks of a chunk whose answer fails can be rolled back.
+    originals: List[Dict[Tuple[str, str], Dict[str, Any]]] = [{} for _ in chunks]
+    pending = len(chunks)
+    tasks = [
+        asyncio.ensure_future(stream_chunk(position, cache_key, prompt, prompt_tokens))
+        for position, (cache_key, prompt, prompt_tokens) in enumerate(chunk_requests)
+    ]
+    # Chunks still streaming when the consumer goes away (e.g. the client disconnected)
+    # are cancelled.
+    try:
+        # Locally computed values are known before the model answers anything.
+        for section, by_id in (("nodes", node_by_id), ("edges", edge_by_id)):
+            for item_id in sorted(plan["computed"][section]):
+                yield {"type": section[:-1], "id": item_id, "properties": by_id[item_id]["data"]["properties"]}
+
+        while pending:
+            kind, position, payload, cached = await events.get()
+            blocks = []
+            if kind == "block":
+                blocks = [payload]
+            else:
+                pending -= 1
+                results[position] = payload
+                if not isinstance(payload, dict) or "error" in payload:
+                    for (section, item_id), properties in originals[position].items():
+                        item = node_by_id[item_id] if section == "nodes" else edge_by_id[item_id]
+                        item["data"]["properties"].clear()
+                        item["data"]["properties"].update(properties)
+                        yield {
+                            "type": section[:-1],
+                            "id": item_id,
+                            "properties": item["data"]["properties"],
+                            "reverted": True
                         }
-        flowchart["edges"] = edges
+                # Cached answers arrive whole; their blocks are emitted here.
+                elif cached:
+                    node_updates, edge_updates = _owned_updates(chunks[position], payload)
+                    blocks = [("nodes", item_id, block) for item_id, block in node_updates.items()]
+                    blocks += [("edges", item_id, block) for item_id, block in edge_updates.items()]
+
+            for section, item_id, block in blocks:
+                item_id = str(item_id)
+                if section not in ("nodes", "edges") or item_id not in owned_ids[position][section]:
+                    continue
+                if not isinstance(block, dict):
+                    continue
+                item = node_by_id[item_id] if section == "nodes" else edge_by_id[item_id]
+                if kind == "block" and (section, item_id) not in originals[position]:
+                    properties = (item.get("data") or {}).get("properties", {})
+                    originals[position][(section, item_id)] = copy.deepcopy(properties)
+                merge_llm_updates([item], {item_id: block})
+                yield {
+                    "type": section[:-1],
+                    "id": item_id,
+                    "properties": item["data"]["properties"]
+                }
+    finally:
+        for task in tasks:
+            task.cancel()
 
-    return flowchart
\ No newline at end of file
+    await _finish_run(flowchart, plan, results)
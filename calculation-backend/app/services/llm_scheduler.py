@@ -0,0 +1,224 @@
+# app/services/llm_scheduler.py
+import asyncio
+import contextvars
+import heapq
+import itertools
+import random
+import time
+from contextlib import asynccontextmanager, contextmanager
+from typing import AsyncIterator, Awaitable, Callable, Iterator, Optional, TypeVar
+
+from app.config import (
+    LLM_EXPECTED_COMPLETION_TOKENS,
+    LLM_MAX_IN_FLIGHT,
+    LLM_MAX_RETRIES,
+    LLM_REQUESTS_PER_MINUTE,
+    LLM_RETRY_BASE_SECONDS,
+    LLM_RETRY_MAX_SECONDS,
+    LLM_TOKENS_PER_MINUTE
+)
+from app.utils.loop_local import LoopLocal
+from app.utils.metrics import LLM_RETRIES, span
+
+T = TypeVar("T")
+
+# Priority of model requests made by interactive runs. Lower values are served first.
+INTERACTIVE_PRIORITY = 0
+
+_priority: contextvars.ContextVar[int] = contextvars.ContextVar("llm_priority", default=INTERACTIVE_PRIORITY)
+
+
+@contextmanager
+def priority_scope(priority: int) -> Iterator[None]:
+    """
+    Model requests made inside the block (and in tasks started from it) wait in the
+    scheduler queue with this priority.
+    """
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class TokenBucket:
+    """
+    Token bucket holding up to one minute's worth of `per_minute`, refilled continuously.
+    Settling a reservation that was too small can take the level below zero; later
+    requests then wait until it has refilled. A limit of 0 never makes anyone wait.
+    """
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.capacity / 60)
+        self.updated = now
+
+    def delay(self, amount: float, now: float) -> float:
+        """Seconds until `amount` (at most the capacity) is available."""
+        if self.capacity <= 0:
+            return 0.0
+        self._refill(now)
+        missing = min(amount, self.capacity) - self.level
+        return max(0.0, missing * 60 / self.capacity)
+
+    def take(self, amount: float, now: float) -> None:
+        if self.capacity <= 0:
+            return
+        self._refill(now)
+        self.level -= amount
+
+
+def _retry_delay(error: Exception, attempt: int) -> float:
+    # A Retry-After header wins; otherwise exponential backoff with jitter.
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    for name, scale in (("retry-after-ms", 0.001), ("retry-after", 1.0)):
+        try:
+            return min(LLM_RETRY_MAX_SECONDS, float(headers[name]) * scale)
+        except (KeyError, TypeError, ValueError):
+            continue
+    backoff = min(LLM_RETRY_MAX_SECONDS, LLM_RETRY_BASE_SECONDS * 2 ** attempt)
+    return backoff / 2 + random.uniform(0, backoff / 2)
+
+
+class LLMScheduler:
+    """
+    Admission control for model requests across every run of the process. Requests wait in
+    one priority queue (FIFO within a priority) and the head of the queue is admitted as soon
+    as the request and token buckets allow it and fewer than `max_in_flight` requests are
+    running, so the model is kept busy up to the configured limits and never beyond them.
+    A 429 pauses admission for everyone until the backoff has passed. Requests are awaited
+    on the event loop; waiting for a turn holds no thread.
+    """
+
+    def __init__(self, requests_per_minute: int, tokens_per_minute: int, max_in_flight: int,
+                 max_retries: int, expected_completion_tokens: int):
+        self.max_in_flight = max_in_flight
+        self.max_retries = max_retries
+        self.expected_completion_tokens = expected_completion_tokens
+        self._requests = TokenBucket(requests_per_minute)
+        self._tokens = TokenBucket(tokens_per_minute)
+        self._condition = LoopLocal(asyncio.Condition)
+        self._waiting: list = []
+        self._sequence = itertools.count()
+        self._in_flight = 0
+        self._paused_until = 0.0
+
+    async def _acquire(self, tokens: int) -> None:
+        ticket = (_priority.get(), next(self._sequence))
+        condition = self._condition.get()
+        async with condition:
+            heapq.heappush(self._waiting, ticket)
+            try:
+                while True:
+                    timeout: Optional[float] = None
+                    if self._waiting[0] == ticket and self._in_flight < self.max_in_flight:
+                        now = time.monotonic()
+                        timeout = max(self._paused_until - now, self._requests.delay(1, now),
+                                      self._tokens.delay(tokens, now))
+                        if timeout <= 0:
+                            self._requests.take(1, now)
+                            self._tokens.take(tokens, now)
+                            self._in_flight += 1
+                            return
+                    try:
+                        await asyncio.wait_for(condition.wait(), timeout)
+                    except asyncio.TimeoutError:
+                        pass
+            finally:
+                self._waiting.remove(ticket)
+                heapq.heapify(self._waiting)
+                condition.notify_all()
+
+    async def _release(self) -> None:
+        condition = self._condition.get()
+        async with condition:
+            self._in_flight -= 1
+            condition.notify_all()
+
+    async def _settle(self, reserved: int, used: int) -> None:
+        condition = self._condition.get()
+        async with condition:
+            self._tokens.take(used - reserved, time.monotonic())
+            condition.notify_all()
+
+    def _pause(self, seconds: float) -> None:
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    @asynccontextmanager
+    async def request(self, prompt_tokens: int) -> AsyncIterator["Reservation"]:
+        """
+        Wait for a turn to send a prompt of `prompt_tokens` tokens, then hold an in-flight
+        slot for the duration of the block (including a streamed answer).
+        """
+        reservation = Reservation(self, prompt_tokens + self.expected_completion_tokens)
+        await reservation._admit()
+        try:
+            yield reservation
+        finally:
+            await reservation._leave()
+
+
+class Reservation:
+    """
+    An admitted model request: `call` sends it, `settle` reports the tokens it really used.
+    """
+
+    def __init__(self, scheduler: LLMScheduler, reserved: int):
+        self.scheduler = scheduler
+        self.reserved = reserved
+        self.admitted = False
+
+    async def _admit(self) -> None:
+        with span("llm.queue"):
+            await self.scheduler._acquire(self.reserved)
+        self.admitted = True
+
+    async def _leave(self) -> None:
+        if self.admitted:
+            self.admitted = False
+            await self.scheduler._release()
+
+    async def call(self, send: Callable[[], Awaitable[T]]) -> T:
+        """
+        Await `send()`, retrying rate limits, timeouts, connection errors and server errors
+        with backoff. Other errors, and the last failure, are raised. The in-flight slot is
+        given up during the backoff, and every retry queues again and is charged to the
+        request and token buckets like a new request.
+        """
+        # Imported on first use: the SDK takes most of a second to import.
+        import openai
+
+        for attempt in itertools.count():
+            try:
+                return await send()
+            except openai.RateLimitError as e:
+                delay = _retry_delay(e, attempt)
+                if attempt < self.scheduler.max_retries:
+                    self.scheduler._pause(delay)
+                error = e
+            except (openai.APIConnectionError, openai.InternalServerError) as e:
+                delay = _retry_delay(e, attempt)
+                error = e
+            if attempt >= self.scheduler.max_retries:
+                raise error
+            LLM_RETRIES.inc()
+            await self._leave()
+            await asyncio.sleep(delay)
+            await self._admit()
+
+    async def settle(self, used_tokens: int) -> None:
+        await self.scheduler._settle(self.reserved, used_tokens)
+
+
+llm_scheduler = LLMScheduler(
+    LLM_REQUESTS_PER_MINUTE,
+    LLM_TOKENS_PER_MINUTE,
+    LLM_MAX_IN_FLIGHT,
+    LLM_MAX_RETRIES,
+    LLM_EXPECTED_COMPLETION_TOKENS
+)
@@ -0,0 +1,60 @@
+# app/services/persistence.py
+from typing import List, Dict, Any, Callable
+
+from fastapi.concurrency import run_in_threadpool
+
+from app.utils.content_hash import HASH_FIELD, content_hash
+
+
+# Nodes and edges are keyed by their flowchart and their id, which is only unique within it.
+KEY_FIELDS = ["flowchart_id", "id"]
+
+
+def _diff_items(flowchart_id: str, items: List[Dict[str, Any]], previous_hashes: Dict[str, str],
+                encode: Callable[[Dict[str, Any]], Dict[str, Any]]) -> Dict[str, Any]:
+    # Hash every item and encode the changed ones: the CPU-bound part of sync_items.
+    hashes = {}
+    puts = []
+    skipped = 0
+
+    for item in items:
+        item_hash = content_hash(item)
+        hashes[item["id"]] = item_hash
+        if previous_hashes.get(item["id"]) == item_hash:
+            skipped += 1
+            continue
+        puts.append({**encode(item), "flowchart_id": flowchart_id, HASH_FIELD: item_hash})
+
+    removed_ids = [item_id for item_id in previous_hashes if item_id not in hashes]
+    return {"hashes": hashes, "puts": puts, "deletes": removed_ids, "skipped": skipped}
+
+
+async def sync_items(table, flowchart_id: str, items: List[Dict[str, Any]], previous_hashes: Dict[str, str],
+                     encode: Callable[[Dict[str, Any]], Dict[str, Any]], batch=None) -> Dict[str, Any]:
+    """
+    Bring the rows of flowchart `flowchart_id` in a node/edge table in line with the plain
+    `items` using batched writes.
+
+    Only items whose content hash differs from `previous_hashes` are encoded and written, and
+    items that were present in `previous_hashes` but are no longer in `items` are deleted.
+    Hashing and encoding run in the threadpool. Writes go to `batch` when given (a batch
+    writer of `table` shared by several calls, which is flushed by its owner); otherwise they
+    are flushed before returning.
+    Returns the new id -> hash manifest together with written/skipped/deleted counts.
+    """
+    if batch is None:
+        async with table.batch_writer(overwrite_by_pkeys=KEY_FIELDS) as batch:
+            return await sync_items(table, flowchart_id, items, previous_hashes, encode, batch)
+
+    diff = await run_in_threadpool(_diff_items, flowchart_id, items, previous_hashes, encode)
+    for item in diff["puts"]:
+        await batch.put_item(Item=item)
+    for item_id in diff["deletes"]:
+        await batch.delete_item(Key={"flowchart_id": flowchart_id, "id": item_id})
+
+    return {
+        "hashes": diff["hashes"],
+        "written": len(diff["puts"]),
+        "skipped": diff["skipped"],
+        "deleted": len(diff["deletes"]),
+    }
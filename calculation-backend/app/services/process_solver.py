@@ -0,0 +1,373 @@
+# app/services/process_solver.py
+from collections import Counter
+from typing import Dict, Any, List, Set, Tuple
+
+import numpy as np
+from scipy import sparse
+from scipy.sparse import csgraph
+from scipy.sparse.linalg import spsolve
+
+from app.services.graph_index import GraphIndex
+from app.utils.units import format_quantity, parse_quantity, to_base, unit_of
+
+# Every property value records where it came from: "computed" by this solver or inferred by
+# the model ("llm"). Computed values follow from locked ones, so until they are recomputed
+# they are treated like locked values: shown to the model as given and never overwritten.
+SOURCE_FIELD = "source"
+COMPUTED_SOURCE = "computed"
+LLM_SOURCE = "llm"
+
+# Properties the solver knows how to derive, using the names the editor gives them.
+FLOW_PROPERTY = "flowRate"
+TEMPERATURE_PROPERTY = "temperature"
+NODE_TEMPERATURE_PROPERTY = "operatingTemperature"
+DUTY_PROPERTY = "duty"
+DEFAULT_UNITS = {"mass_flow": "kg/h", "temperature": "°C"}
+
+# Components that neither add nor remove heat, so their outlets leave at the flow-weighted
+# mean temperature of their inlets. Anything else (heat exchangers, reactors, columns) is
+# left to the model.
+ADIABATIC_NODE_TYPES = {"default", "input", "output", "pump", "tank", "mixer", "splitter", "valve"}
+
+# Relative tolerance for balance checks and for treating tiny negative flows as zero.
+_TOLERANCE = 1e-9
+
+
+def is_fixed(prop: Any) -> bool:
+    """
+    True for property values the model must take as given: locked or computed.
+    """
+    return isinstance(prop, dict) and (bool(prop.get("isLocked")) or prop.get(SOURCE_FIELD) == COMPUTED_SOURCE)
+
+
+def _properties(item: Dict[str, Any]) -> Dict[str, Any]:
+    return (item.get("data") or {}).get("properties") or {}
+
+
+def _locked_values(items: List[Dict[str, Any]], name: str, kind: str) -> Tuple[np.ndarray, str]:
+    """
+    Locked values of property `name` in kg/s or kelvin (NaN marks an unknown), and the unit
+    new values are written in: the one the locked values use most.
+    """
+    values = np.full(len(items), np.nan)
+    units: Counter = Counter()
+    for position, item in enumerate(items):
+        prop = _properties(item).get(name)
+        if not isinstance(prop, dict) or not prop.get("isLocked"):
+            continue
+        value = to_base(prop.get("value"), kind)
+        if value is not None:
+            values[position] = value
+            units[unit_of(prop.get("value"), kind)] += 1
+    return values, units.most_common(1)[0][0] if units else DEFAULT_UNITS[kind]
+
+
+class _Incidence:
+    """
+    Positions of the nodes and edges of a flowchart and its sparse inlet/outlet matrices
+    (nodes x edges). Self-loops and edges to missing nodes take no part in any balance.
+    """
+
+    def __init__(self, index: GraphIndex):
+        self.node_ids = list(index.nodes)
+        self.edge_ids = list(index.edges)
+        position = {node_id: i for i, node_id in enumerate(self.node_ids)}
+        edges = [index.edges[edge_id] for edge_id in self.edge_ids]
+        self.source = np.array([position.get(str(edge.get("source")), -1) for edge in edges], dtype=np.int64)
+        self.target = np.array([position.get(str(edge.get("target")), -1) for edge in edges], dtype=np.int64)
+        self.loop = (self.source == self.target) & (self.source >= 0)
+
+        shape = (len(self.node_ids), len(self.edge_ids))
+        columns = np.arange(len(self.edge_ids))
+        has_target = (self.target >= 0) & ~self.loop
+        has_source = (self.source >= 0) & ~self.loop
+        self.inlets = sparse.csr_matrix(
+            (np.ones(has_target.sum()), (self.target[has_target], columns[has_target])), shape=shape
+        )
+        self.outlets = sparse.csr_matrix(
+            (np.ones(has_source.sum()), (self.source[has_source], columns[has_source])), shape=shape
+        )
+        self.in_degree = np.asarray(self.inlets.sum(axis=1)).ravel()
+        self.out_degree = np.asarray(self.outlets.sum(axis=1)).ravel()
+
+
+def _bridges(vertex_count: int, ends: List[Tuple[int, int, int]],
+             roots: List[int]) -> Tuple[Set[int], Dict[int, int], np.ndarray]:
+    """
+    Iterative Tarjan bridge search over a multigraph given as (edge, u, v) triples.
+    Returns the bridge edges, the tree edge leading to every non-root vertex, and the
+    component (numbered by root) of every vertex.
+    """
+    adjacency: List[List[Tuple[int, int]]] = [[] for _ in range(vertex_count)]
+    for edge, u, v in ends:
+        adjacency[u].append((v, edge))
+        adjacency[v].append((u, edge))
+
+    discovery = np.full(vertex_count, -1, dtype=np.int64)
+    low = np.zeros(vertex_count, dtype=np.int64)
+    component = np.full(vertex_count, -1, dtype=np.int64)
+    parent_edge: Dict[int, int] = {}
+    bridges: Set[int] = set()
+    counter = 0
+
+    for root in roots + list(range(vertex_count)):
+        if discovery[root] >= 0:
+            continue
+        discovery[root] = low[root] = counter
+        component[root] = root
+        counter += 1
+        stack = [(root, -1, iter(adjacency[root]))]
+        while stack:
+            vertex, via, neighbours = stack[-1]
+            advanced = False
+            for neighbour, edge in neighbours:
+                if edge == via:
+                    continue
+                if discovery[neighbour] < 0:
+                    discovery[neighbour] = low[neighbour] = counter
+                    component[neighbour] = root
+                    counter += 1
+                    parent_edge[neighbour] = edge
+                    stack.append((neighbour, edge, iter(adjacency[neighbour])))
+                    advanced = True
+                    break
+                low[vertex] = min(low[vertex], discovery[neighbour])
+            if advanced:
+                continue
+            stack.pop()
+            if stack:
+                parent = stack[-1][0]
+                low[parent] = min(low[parent], low[vertex])
+                if low[vertex] > discovery[parent]:
+                    bridges.add(via)
+    return bridges, parent_edge, component
+
+
+def _solve_mass_flows(incidence: _Incidence, known: np.ndarray,
+                      values: np.ndarray) -> Tuple[Dict[int, float], int]:
+    """
+    Steady-state mass balance over every node with both inlets and outlets (sources and sinks
+    are the boundary). Returns the unknown edge flows (kg/s) that the balances determine
+    uniquely, and the number of components whose locked flows contradict each other.
+
+    With the boundary merged into one vertex, an unknown flow is determined exactly when its
+    edge is a bridge of the graph of unknown edges. The balances are solved on a spanning
+    forest of that graph, whose incidence matrix is square and non-singular, with the other
+    unknown flows set to zero; bridge flows do not depend on that choice.
+    """
+    internal = (incidence.in_degree > 0) & (incidence.out_degree > 0)
+    row_of = np.full(len(incidence.node_ids), -1, dtype=np.int64)
+    row_of[internal] = np.arange(internal.sum())
+    rows = int(internal.sum())
+    boundary = rows
+
+    # Net known inflow per balance, moved to the right-hand side.
+    balance = incidence.inlets[internal] - incidence.outlets[internal]
+    demand = -(balance @ np.where(known, values, 0.0))
+
+    # Balance row of each edge end; edges from sources or into sinks end at the boundary.
+    source_vertex = np.where(incidence.source >= 0, row_of[incidence.source], -1)
+    target_vertex = np.where(incidence.target >= 0, row_of[incidence.target], -1)
+    source_vertex[source_vertex < 0] = boundary
+    target_vertex[target_vertex < 0] = boundary
+    unknown = np.flatnonzero(~known & (source_vertex != target_vertex))
+    ends = list(zip(unknown.tolist(), source_vertex[unknown].tolist(), target_vertex[unknown].tolist()))
+
+    bridges, parent_edge, component = _bridges(rows + 1, ends, [boundary])
+
+    # Components that do not touch the boundary must balance on their own.
+    scale = max(1.0, float(np.abs(values[known]).max())) if known.any() else 1.0
+    closed = component[:rows] != boundary
+    totals = np.bincount(component[:rows][closed], weights=demand[closed], minlength=rows + 1)
+    conflicting = set(np.flatnonzero(np.abs(totals) > _TOLERANCE * scale * max(1, rows)).tolist())
+
+    tree_rows = [vertex_ for vertex_ in parent_edge if vertex_ != boundary]
+    if not tree_rows:
+        return {}, len(conflicting)
+    tree_edges = [parent_edge[vertex_] for vertex_ in tree_rows]
+    edge_column = {edge: column for column, edge in enumerate(tree_edges)}
+
+    system = balance[tree_rows][:, tree_edges].tocsc()
+    flows = np.atleast_1d(spsolve(system, demand[tree_rows]))
+
+    determined = {}
+    for edge in bridges:
+        if component[source_vertex[edge]] in conflicting or component[target_vertex[edge]] in conflicting:
+            continue
+        flow = float(flows[edge_column[edge]])
+        if flow < -_TOLERANCE * scale or not np.isfinite(flow):
+            continue
+        determined[edge] = max(flow, 0.0)
+    return determined, len(conflicting)
+
+
+def _reachable(arcs, seeds: np.ndarray) -> np.ndarray:
+    """
+    Mask of the vertices reachable from any of `seeds` (seeds included) in the directed
+    graph with adjacency matrix `arcs`, found in one search from an extra vertex.
+    """
+    size = arcs.shape[0]
+    reached = np.zeros(size, dtype=bool)
+    if not len(seeds):
+        return reached
+    start = sparse.csr_matrix((np.ones(len(seeds)), (np.zeros(len(seeds), dtype=np.int64), seeds)), shape=(1, size))
+    graph = sparse.bmat([[arcs, sparse.csr_matrix((size, 1))], [start, sparse.csr_matrix((1, 1))]], format="csr")
+    order = csgraph.breadth_first_order(graph, size, directed=True, return_predecessors=False)
+    reached[order[order < size]] = True
+    return reached
+
+
+def _solve_temperatures(incidence: _Incidence, adiabatic: np.ndarray, flows: np.ndarray,
+                        flow_known: np.ndarray, temperatures: np.ndarray,
+                        temperature_known: np.ndarray) -> Tuple[Dict[int, float], Dict[int, float]]:
+    """
+    Outlets of adiabatic nodes leave at the flow-weighted mean inlet temperature (a single
+    inlet needs no flow). This gives one linear equation per outlet edge, T_out = W T_in,
+    solved as one sparse system including recycles. Unknown temperatures that depend on an
+    unknown without an equation are left out. Returns edge and node temperatures (K).
+    """
+    edge_count = len(incidence.edge_ids)
+    inlet_flows = incidence.inlets.multiply(np.where(flow_known, flows, 0.0)).tocsr()
+    inlet_totals = np.asarray(inlet_flows.sum(axis=1)).ravel()
+    missing_flows = np.asarray(incidence.inlets @ (~flow_known).astype(float)).ravel()
+
+    single = incidence.in_degree == 1
+    weighted = (incidence.in_degree > 1) & (missing_flows == 0) & (inlet_totals > 0)
+    mixing = adiabatic & (single | weighted)
+    # Node x edge mixing weights: each row sums to 1 over the node's inlets.
+    weight_values = np.where(single, 1.0, 0.0)
+    safe_totals = np.where(inlet_totals > 0, inlet_totals, 1.0)
+    weights = (
+        sparse.diags(weight_values) @ incidence.inlets
+        + sparse.diags(np.where(weighted & ~single, 1.0 / safe_totals, 0.0)) @ inlet_flows
+    )
+    weights = sparse.diags(mixing.astype(float)) @ weights
+
+    # Row e of `upstream` holds the mixing weights of the node edge e leaves from.
+    has_equation = np.zeros(edge_count, dtype=bool)
+    valid_source = (incidence.source >= 0) & ~incidence.loop
+    has_equation[valid_source] = mixing[incidence.source[valid_source]]
+    selector = sparse.csr_matrix(
+        (np.ones(has_equation.sum()), (np.flatnonzero(has_equation), incidence.source[has_equation])),
+        shape=(edge_count, len(incidence.node_ids))
+    )
+    upstream = (selector @ weights).tocsr()
+
+    # Unknown T_out = W T_in equations are solvable when every unknown traces back, through
+    # other solvable unknowns only, to a known inlet temperature. Unknowns without an
+    # equation, and closed recycles that never see a known temperature, make everything
+    # downstream of them undetermined.
+    unknown = ~temperature_known
+    dependencies = upstream.multiply(unknown[np.newaxis, :]).T.tocsr()
+    leaky = unknown & has_equation & (np.asarray(upstream[:, temperature_known].sum(axis=1)).ravel() > 0)
+    grounded = _reachable(dependencies, np.flatnonzero(leaky))
+    undetermined = _reachable(dependencies, np.flatnonzero(unknown & (~has_equation | ~grounded)))
+
+    solve = unknown & ~undetermined
+    solved: Dict[int, float] = {}
+    if solve.any():
+        columns = np.flatnonzero(solve)
+        known_part = upstream[:, temperature_known] @ temperatures[temperature_known]
+        system = sparse.identity(len(columns), format="csc") - upstream[columns][:, columns].tocsc()
+        values = np.atleast_1d(spsolve(system, known_part[columns]))
+        solved = {int(edge): float(value) for edge, value in zip(columns, values) if np.isfinite(value)}
+
+    full = np.where(temperature_known, temperatures, 0.0)
+    determined = temperature_known.copy()
+    for edge, value in solved.items():
+        full[edge] = value
+        determined[edge] = True
+    node_ready = mixing & (np.asarray(incidence.inlets @ (~determined).astype(float)).ravel() == 0)
+    node_values = weights @ full
+    node_temperatures = {int(node): float(node_values[node]) for node in np.flatnonzero(node_ready)}
+    return solved, node_temperatures
+
+
+def _fill(item: Dict[str, Any], name: str, value: str) -> bool:
+    # Only properties the item already has are filled, and never locked ones.
+    prop = _properties(item).get(name)
+    if not isinstance(prop, dict) or prop.get("isLocked"):
+        return False
+    changed = prop.get("value") != value or prop.get(SOURCE_FIELD) != COMPUTED_SOURCE
+    prop["value"] = value
+    prop[SOURCE_FIELD] = COMPUTED_SOURCE
+    return changed
+
+
+def solve_process_balances(index: GraphIndex) -> Dict[str, Any]:
+    """
+    Fill every unlocked property that follows from the locked ones by mass and energy
+    balances, in place, before anything is sent to the model:
+
+    - edge flowRate from steady-state mass balances over all components;
+    - edge temperature and node operatingTemperature downstream of adiabatic components.
+
+    Values are converted from their units, solved in kg/s and kelvin, and written back in the
+    unit the flowchart uses most. Filled properties are marked "source": "computed";
+    properties computed by an earlier run that no longer follow are released to the model.
+    Returns the ids of the nodes and edges that changed and counts for the run stats.
+    """
+    incidence = _Incidence(index)
+    nodes = [index.nodes[node_id] for node_id in incidence.node_ids]
+    edges = [index.edges[edge_id] for edge_id in incidence.edge_ids]
+    changed_nodes: Set[str] = set()
+    changed_edges: Set[str] = set()
+    refreshed: Set[Tuple[str, str]] = set()
+
+    flows, flow_unit = _locked_values(edges, FLOW_PROPERTY, "mass_flow")
+    flow_known = ~np.isnan(flows)
+    solved_flows, conflicts = _solve_mass_flows(incidence, flow_known, np.nan_to_num(flows))
+
+    for position, flow in solved_flows.items():
+        flows[position] = flow
+        flow_known[position] = True
+        edge_id = incidence.edge_ids[position]
+        if _fill(edges[position], FLOW_PROPERTY, format_quantity(flow, flow_unit, "mass_flow")):
+            changed_edges.add(edge_id)
+        refreshed.add((edge_id, FLOW_PROPERTY))
+
+    temperatures, temperature_unit = _locked_values(edges, TEMPERATURE_PROPERTY, "temperature")
+    temperature_known = ~np.isnan(temperatures)
+    adiabatic = np.array([
+        (node.get("type") or "default") in ADIABATIC_NODE_TYPES and not _has_locked_duty(node)
+        for node in nodes
+    ], dtype=bool)
+    edge_temperatures, node_temperatures = _solve_temperatures(
+        incidence, adiabatic, np.nan_to_num(flows), flow_known, np.nan_to_num(temperatures), temperature_known
+    )
+
+    for position, temperature in edge_temperatures.items():
+        edge_id = incidence.edge_ids[position]
+        if _fill(edges[position], TEMPERATURE_PROPERTY, format_quantity(temperature, temperature_unit, "temperature")):
+            changed_edges.add(edge_id)
+        refreshed.add((edge_id, TEMPERATURE_PROPERTY))
+    for position, temperature in node_temperatures.items():
+        node_id = incidence.node_ids[position]
+        value = format_quantity(temperature, temperature_unit, "temperature")
+        if _fill(nodes[position], NODE_TEMPERATURE_PROPERTY, value):
+            changed_nodes.add(node_id)
+        refreshed.add((node_id, NODE_TEMPERATURE_PROPERTY))
+
+    # Earlier computed values that no longer follow from the locked ones go back to the model.
+    for ids, items, changed in ((incidence.node_ids, nodes, changed_nodes), (incidence.edge_ids, edges, changed_edges)):
+        for item_id, item in zip(ids, items):
+            for name, prop in _properties(item).items():
+                if isinstance(prop, dict) and prop.get(SOURCE_FIELD) == COMPUTED_SOURCE and (item_id, name) not in refreshed:
+                    del prop[SOURCE_FIELD]
+                    changed.add(item_id)
+
+    return {
+        "nodes": changed_nodes,
+        "edges": changed_edges,
+        "computed_properties": len(refreshed),
+        "balance_conflicts": conflicts
+    }
+
+
+def _has_locked_duty(node: Dict[str, Any]) -> bool:
+    # A locked, non-zero duty means the component adds or removes heat.
+    prop = _properties(node).get(DUTY_PROPERTY)
+    if not isinstance(prop, dict) or not prop.get("isLocked"):
+        return False
+    quantity = parse_quantity(prop.get("value"))
+    return quantity is None or quantity[0] != 0.0
@@ -0,0 +1,135 @@
+# app/services/prompt_encoding.py
+import json
+from typing import List, Dict, Any, Optional
+
+from app.services.process_solver import is_fixed
+from app.utils.token_budget import estimate_tokens
+
+# Characters that would break a compact row; values containing them are JSON-quoted.
+_SEPARATORS = set("|;=,\n")
+
+
+def _format(value: Any) -> str:
+    text = value if isinstance(value, str) else json.dumps(value)
+    if any(char in _SEPARATORS for char in text) or text != text.strip():
+        return json.dumps(text)
+    return text
+
+
+def _properties(item: Dict[str, Any]) -> Dict[str, Any]:
+    return (item.get("data") or {}).get("properties", {})
+
+
+class _PropertyNames:
+    """
+    Assigns every property name a short number, in order of first use.
+    """
+
+    def __init__(self):
+        self.numbers: Dict[str, int] = {}
+
+    def ref(self, name: str) -> str:
+        if name not in self.numbers:
+            self.numbers[name] = len(self.numbers)
+        return str(self.numbers[name])
+
+    def header(self) -> str:
+        return " | ".join(f"{number} {_format(name)}" for name, number in self.numbers.items())
+
+
+def _row(item: Dict[str, Any], names: _PropertyNames, is_edge: bool) -> str:
+    properties = _properties(item)
+    locked = ";".join(
+        f"{names.ref(name)}={_format(prop.get('value', ''))}"
+        for name, prop in properties.items() if is_fixed(prop)
+    )
+    open_props = ",".join(names.ref(name) for name, prop in properties.items() if not is_fixed(prop))
+    if is_edge:
+        where = f"{_format(str(item.get('source', 'unknown')))}>{_format(str(item.get('target', 'unknown')))}"
+    else:
+        where = _format(str((item.get("data") or {}).get("label", "(no label)")))
+    return f"{_format(str(item['id']))}|{where}|{locked}|{open_props}"
+
+
+def compact_item_tokens(item: Dict[str, Any]) -> int:
+    """
+    Estimated prompt cost of one node or edge in the compact encoding, for partitioning.
+    """
+    return estimate_tokens(_row(item, _PropertyNames(), "source" in item))
+
+
+def build_compact_flowchart_prompt(flowchart_id: str, nodes: List[Dict[str, Any]], edges: List[Dict[str, Any]],
+                                   context_nodes: Optional[List[Dict[str, Any]]] = None,
+                                   context_edges: Optional[List[Dict[str, Any]]] = None) -> str:
+    """
+    Token-lean equivalent of build_flowchart_prompt. Property names are declared once in a
+    numbered header and every node and edge is a single `|`-separated row; unlocked values are
+    left out because the model is asked to recompute them. The answer uses the compact
+    {"n": {...}, "e": {...}} schema, see expand_compact_response.
+    """
+    names = _PropertyNames()
+    node_rows = [_row(node, names, False) for node in nodes]
+    edge_rows = [_row(edge, names, True) for edge in edges]
+    context_rows = [_row(node, names, False) for node in context_nodes or []]
+    context_rows += [_row(edge, names, True) for edge in context_edges or []]
+
+    context = ""
+    if context_rows:
+        context = "\nContext only, do not answer for these:\n" + "\n".join(context_rows) + "\n"
+
+    prompt = f"""
+You are an expert chemical process engineer. Flowchart {flowchart_id}: nodes are components \
+(tanks, pumps, heat exchangers, etc.), edges are pipes between them.
+Fill in the properties needed for the components and pipes.
+
+Property numbers: {names.header()}
+Rows are id|label (nodes) or id|source>target (edges)|locked number=value;...|open numbers.
+
+Nodes:
+{chr(10).join(node_rows)}
+
+Edges:
+{chr(10).join(edge_rows)}
+{context}
+Rules:
+- Locked values are fixed; never answer them
+- Only give values for the open properties of each row
+- Values are strings with units; use the property names, not their numbers
+- Leave out nodes and edges with nothing to add
+- Output only minified JSON: {{"n":{{"<node_id>":{{"<property_name>":"<value>"}}}},"e":{{"<edge_id>":{{"<property_name>":"<value>"}}}}}}
+"""
+    return prompt.strip()
+
+
+COMPACT_SECTIONS = {"n": "nodes", "e": "edges"}
+
+
+def expand_compact_block(block: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Turn a compact {"<property_name>": "<value>"} block into the standard
+    {"properties": {"<property_name>": {"value": ..., "isLocked": false}}} form.
+    """
+    if "properties" in block and isinstance(block["properties"], dict):
+        return block
+    return {
+        "properties": {
+            name: value if isinstance(value, dict) and "value" in value else {"value": value, "isLocked": False}
+            for name, value in block.items()
+        }
+    }
+
+
+def expand_compact_response(llm_data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Normalize an answer in either schema to the standard {"nodes": ..., "edges": ...} form.
+    """
+    if not isinstance(llm_data, dict) or not any(key in llm_data for key in COMPACT_SECTIONS):
+        return llm_data
+    expanded = {}
+    for short, section in COMPACT_SECTIONS.items():
+        blocks = llm_data.get(short) or llm_data.get(section) or {}
+        expanded[section] = {
+            str(item_id): expand_compact_block(block)
+            for item_id, block in blocks.items() if isinstance(block, dict)
+        }
+    return expanded
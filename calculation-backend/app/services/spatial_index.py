@@ -0,0 +1,87 @@
+# app/services/spatial_index.py
+import math
+from typing import Dict, Any, List, Optional, Tuple
+
+# Attributes on Nodes/Edges items naming the grid cell of the node (for edges: of the source
+# node) and, on edges, of the target node. Both are "<flowchart_id>#<column>#<row>".
+CELL_FIELD = "fc_cell"
+TARGET_CELL_FIELD = "fc_target_cell"
+SPATIAL_FIELDS = (CELL_FIELD, TARGET_CELL_FIELD)
+
+Cell = Tuple[int, int]
+BBox = Tuple[float, float, float, float]
+
+
+def parse_bbox(text: str) -> BBox:
+    """
+    Parse "min_x,min_y,max_x,max_y". Raises ValueError when it is not four numbers
+    describing a box.
+    """
+    values = [float(part) for part in text.split(",")]
+    if len(values) != 4 or not all(math.isfinite(value) for value in values):
+        raise ValueError("bbox must be four numbers: min_x,min_y,max_x,max_y")
+    min_x, min_y, max_x, max_y = values
+    if min_x > max_x or min_y > max_y:
+        raise ValueError("bbox minimum must not exceed its maximum")
+    return min_x, min_y, max_x, max_y
+
+
+def cell_of(position: Optional[Dict[str, Any]], cell_size: float) -> Optional[Cell]:
+    if not isinstance(position, dict):
+        return None
+    try:
+        return math.floor(float(position["x"]) / cell_size), math.floor(float(position["y"]) / cell_size)
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def cell_key(flowchart_id: str, cell: Cell) -> str:
+    return f"{flowchart_id}#{cell[0]}#{cell[1]}"
+
+
+def cells_in_bbox(bbox: BBox, cell_size: float) -> List[Cell]:
+    min_x, min_y, max_x, max_y = bbox
+    columns = range(math.floor(min_x / cell_size), math.floor(max_x / cell_size) + 1)
+    rows = range(math.floor(min_y / cell_size), math.floor(max_y / cell_size) + 1)
+    return [(column, row) for row in rows for column in columns]
+
+
+def count_cells_in_bbox(bbox: BBox, cell_size: float) -> int:
+    min_x, min_y, max_x, max_y = bbox
+    columns = math.floor(max_x / cell_size) - math.floor(min_x / cell_size) + 1
+    rows = math.floor(max_y / cell_size) - math.floor(min_y / cell_size) + 1
+    return columns * rows
+
+
+def index_nodes(flowchart_id: str, nodes: List[Dict[str, Any]],
+                cell_size: float) -> Tuple[List[Dict[str, Any]], Dict[str, str]]:
+    """
+    Return shallow copies of `nodes` carrying their grid cell, for the Nodes table, together
+    with the node id -> cell key map needed by index_edges. Nodes without a usable position
+    get no cell and are only listed with the whole flowchart.
+    """
+    cells = {}
+    indexed = []
+    for node in nodes:
+        cell = cell_of(node.get("position"), cell_size)
+        if cell is None:
+            indexed.append(node)
+            continue
+        cells[node["id"]] = cell_key(flowchart_id, cell)
+        indexed.append({**node, CELL_FIELD: cells[node["id"]]})
+    return indexed, cells
+
+
+def index_edges(edges: List[Dict[str, Any]], node_cells: Dict[str, str]) -> List[Dict[str, Any]]:
+    """
+    Return shallow copies of `edges` carrying the grid cells of their source and target nodes.
+    """
+    indexed = []
+    for edge in edges:
+        cells = {
+            field: node_cells[node_id]
+            for field, node_id in ((CELL_FIELD, edge.get("source")), (TARGET_CELL_FIELD, edge.get("target")))
+            if node_id in node_cells
+        }
+        indexed.append({**edge, **cells} if cells else edge)
+    return indexed
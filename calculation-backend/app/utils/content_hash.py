@@ -0,0 +1,17 @@
+# app/utils/content_hash.py
+import hashlib
+import json
+from typing import Any
+
+HASH_FIELD = "content_hash"
+
+
+def content_hash(item: Any) -> str:
+    """
+    Stable hash of a JSON-like item, used to detect changed nodes and edges between saves.
+    Keys are sorted so that dict ordering does not affect the result.
+    """
+    if isinstance(item, dict):
+        item = {k: v for k, v in item.items() if k != HASH_FIELD}
+    payload = json.dumps(item, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:32]
@@ -29,3 +29,14 @@ def convert_decimal_to_float(item: Any) -> Any:
     return item
 
 
+def convert_decimal_to_number(item: Any) -> Any:
+    """
+    Recursively convert Decimal objects to int when they are integral and to float otherwise.
+    """
+    if isinstance(item, Decimal):
+        return int(item) if item == item.to_integral_value() else float(item)
+    elif isinstance(item, list):
+        return [convert_decimal_to_number(i) for i in item]
+    elif isinstance(item, dict):
+        return {k: convert_decimal_to_number(v) for k, v in item.items()}
+    return item
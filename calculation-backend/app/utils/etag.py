@@ -0,0 +1,45 @@
+# app/utils/etag.py
+import hashlib
+from typing import List, Optional, Sequence
+
+
+def make_etag(version: int, fields: Optional[Sequence[str]] = None) -> str:
+    """
+    ETag of a flowchart version: `"<version>"` for the full document and
+    `"<version>-<hash of the sorted fields>"` for a `?fields=` projection of it, so that a
+    cached projection never revalidates the full document or another projection.
+    """
+    if fields is None:
+        return f'"{version}"'
+    digest = hashlib.sha256(",".join(sorted(set(fields))).encode("utf-8")).hexdigest()[:12]
+    return f'"{version}-{digest}"'
+
+
+def parse_etags(header: Optional[str]) -> List[str]:
+    """
+    Split an If-Match / If-None-Match header into its entity tags, without quotes or the
+    weak "W/" prefix. "*" is kept as is.
+    """
+    if not header:
+        return []
+    tags = []
+    for tag in header.split(","):
+        tag = tag.strip()
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        if tag:
+            tags.append(tag.strip('"'))
+    return tags
+
+
+def etag_version(tag: str) -> int:
+    """
+    The flowchart version an entity tag (as returned by parse_etags) was made for, whichever
+    representation it belongs to. Raises ValueError for tags this app did not make.
+    """
+    return int(tag.split("-", 1)[0])
+
+
+def etag_matches(header: Optional[str], version: int, fields: Optional[Sequence[str]] = None) -> bool:
+    tags = parse_etags(header)
+    return "*" in tags or make_etag(version, fields).strip('"') in tags
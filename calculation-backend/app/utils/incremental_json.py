@@ -0,0 +1,87 @@
+# app/utils/incremental_json.py
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+
+class IncrementalBlockParser:
+    """
+    Incrementally parse a streamed LLM answer of the form {"<section>": {"<id>": {...}, ...}, ...}.
+
+    Text is fed in arbitrary pieces; `feed` returns every (section, id, block) whose block
+    object has been closed since the previous call. Anything before the first "{" (such as a
+    ```json fence) is ignored, and `text` keeps everything received for a final full parse.
+    Only the part of the answer that has not been parsed yet (the open block or string) is
+    scanned and kept in the working buffer, so parsing takes linear time in the answer.
+    """
+
+    def __init__(self):
+        self._chunks: List[str] = []
+        # The unparsed tail of the answer; positions below are indexes into it.
+        self._buffer = ""
+        self._pos = 0
+        self._started = False
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._string_start = 0
+        self._last_string: Optional[str] = None
+        self._keys: Dict[int, Optional[str]] = {}
+        self._block_start: Optional[int] = None
+
+    @property
+    def text(self) -> str:
+        """Everything fed so far."""
+        if len(self._chunks) > 1:
+            self._chunks = ["".join(self._chunks)]
+        return self._chunks[0] if self._chunks else ""
+
+    def feed(self, chunk: str) -> List[Tuple[str, str, Dict[str, Any]]]:
+        self._chunks.append(chunk)
+        blocks = []
+        text = self._buffer + chunk
+        for pos in range(self._pos, len(text)):
+            char = text[pos]
+            if not self._started:
+                if char != "{":
+                    continue
+                self._started = True
+
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+                    self._last_string = json.loads(text[self._string_start:pos + 1])
+                continue
+
+            if char == '"':
+                self._in_string = True
+                self._string_start = pos
+            elif char == ":":
+                self._keys[self._depth] = self._last_string
+            elif char in "{[":
+                self._depth += 1
+                if self._depth == 3 and char == "{":
+                    self._block_start = pos
+            elif char in "}]":
+                if self._depth == 3 and self._block_start is not None:
+                    block = json.loads(text[self._block_start:pos + 1])
+                    blocks.append((self._keys.get(1), self._keys.get(2), block))
+                    self._block_start = None
+                self._depth -= 1
+
+        # Drop what has been parsed; an open block or string is kept whole.
+        keep = len(text)
+        if self._block_start is not None:
+            keep = self._block_start
+        elif self._in_string:
+            keep = self._string_start
+        self._buffer = text[keep:]
+        self._pos = len(self._buffer)
+        if self._block_start is not None:
+            self._block_start -= keep
+        if self._in_string:
+            self._string_start -= keep
+        return blocks
@@ -0,0 +1,25 @@
+# app/utils/loop_local.py
+import asyncio
+import weakref
+from typing import Callable, Generic, TypeVar
+
+T = TypeVar("T")
+
+
+class LoopLocal(Generic[T]):
+    """
+    A value made by `factory` for each event loop it is used on. asyncio primitives belong to
+    the loop they are first used on, and a process can run the app on more than one loop (one
+    per lifespan, e.g. under TestClient), so module-level ones are kept per loop.
+    """
+
+    def __init__(self, factory: Callable[[], T]):
+        self.factory = factory
+        self._values: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, T]" = weakref.WeakKeyDictionary()
+
+    def get(self) -> T:
+        loop = asyncio.get_running_loop()
+        value = self._values.get(loop)
+        if value is None:
+            value = self._values[loop] = self.factory()
+        return value
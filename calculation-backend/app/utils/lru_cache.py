@@ -0,0 +1,44 @@
+# app/utils/lru_cache.py
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+
+
+class LRUCache:
+    """
+    Thread-safe in-process LRU cache whose entries expire after `ttl` seconds.
+    """
+
+    def __init__(self, max_entries: int, ttl: int):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any, expires_at: Optional[float] = None) -> None:
+        with self._lock:
+            self._entries[key] = (expires_at or time.time() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def discard(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
@@ -0,0 +1,212 @@
+# app/utils/metrics.py
+import contextvars
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional, Sequence, Tuple
+
+# Histogram buckets: request and stage durations in seconds, payload sizes in bytes.
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 409600, 1048576, 4194304, 16777216)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_number(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Counter:
+    """
+    Monotonic counter with a fixed set of label names, exported as `<name>_total`.
+    """
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = tuple(str(labels[name]) for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name}_total {self.documentation}"
+        yield f"# TYPE {self.name}_total counter"
+        with self._lock:
+            values = sorted(self._values.items())
+        for key, value in values:
+            yield f"{self.name}_total{_format_labels(self.labels, key)} {_format_number(value)}"
+
+
+class Histogram:
+    """
+    Cumulative histogram with a fixed set of label names and upper bucket bounds.
+    """
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = (),
+                 buckets: Sequence[float] = DURATION_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        # label values -> (count per bucket, sum)
+        self._values: Dict[Tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = tuple(str(labels[name]) for name in self.labels)
+        with self._lock:
+            counts = self._values.setdefault(key, [[0] * len(self.buckets), 0.0])
+            for position, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[0][position] += 1
+                    break
+            counts[1] += value
+
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} histogram"
+        with self._lock:
+            values = sorted((key, (list(counts), total)) for key, (counts, total) in self._values.items())
+        for key, (counts, total) in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                le = f'le="{_format_number(bound)}"'
+                yield f"{self.name}_bucket{_format_labels(self.labels, key, le)} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(self.labels, key)} {_format_number(total)}"
+            yield f"{self.name}_count{_format_labels(self.labels, key)} {cumulative}"
+
+
+class MetricsRegistry:
+    """
+    The metrics of this process, rendered in the Prometheus text exposition format.
+    """
+
+    def __init__(self):
+        self._metrics = []
+
+    def counter(self, name: str, documentation: str, labels: Sequence[str] = ()) -> Counter:
+        metric = Counter(name, documentation, labels)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, documentation: str, labels: Sequence[str] = (),
+                  buckets: Sequence[float] = DURATION_BUCKETS) -> Histogram:
+        metric = Histogram(name, documentation, labels, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        return "\n".join(line for metric in self._metrics for line in metric.render()) + "\n"
+
+
+registry = MetricsRegistry()
+
+REQUEST_SECONDS = registry.histogram(
+    "http_request_duration_seconds", "Time to the start of the response, per route.",
+    ("method", "route", "status")
+)
+STAGE_SECONDS = registry.histogram(
+    "stage_duration_seconds", "Time spent in each instrumented stage of request handling.", ("stage",)
+)
+DYNAMODB_CAPACITY = registry.counter(
+    "dynamodb_consumed_capacity_units", "Capacity units consumed, as reported by DynamoDB.",
+    ("table", "operation")
+)
+DYNAMODB_BYTES = registry.histogram(
+    "dynamodb_payload_bytes", "Size of DynamoDB request and response bodies.",
+    ("operation", "direction"), SIZE_BUCKETS
+)
+FLOWCHART_ITEM_BYTES = registry.histogram(
+    "flowchart_item_bytes", "Uncompressed size of flowchart bodies as written, by storage layout.",
+    ("layout",), SIZE_BUCKETS
+)
+LLM_TOKENS = registry.counter("llm_tokens", "Tokens sent to and received from the model.", ("kind",))
+LLM_CACHE_LOOKUPS = registry.counter("llm_cache_lookups", "Recommendation cache lookups.", ("result",))
+LLM_RETRIES = registry.counter("llm_retries", "Model requests retried after a rate limit or failure.")
+LLM_ERRORS = registry.counter("llm_errors", "Model calls that failed or returned an unusable answer.", ("reason",))
+
+
+class RequestMetrics:
+    """
+    Timings collected while one request is handled, reported in its Server-Timing header.
+    Spans may be recorded from several threads.
+    """
+
+    def __init__(self, profile: bool = False):
+        self.profile = profile
+        self.profile_path: Optional[str] = None
+        self._timings: Dict[str, list] = {}
+        self._lock = threading.Lock()
+
+    def add(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            timing = self._timings.setdefault(stage, [0.0, 0])
+            timing[0] += seconds
+            timing[1] += 1
+
+    def server_timing(self) -> str:
+        # Stages that ran more than once (e.g. one model request per chunk) are summed.
+        with self._lock:
+            timings = list(self._timings.items())
+        entries = []
+        for stage, (seconds, count) in timings:
+            entry = f"{stage};dur={seconds * 1000:.1f}"
+            if count > 1:
+                entry += f';desc="{count}x"'
+            entries.append(entry)
+        return ", ".join(entries)
+
+
+_current_request: contextvars.ContextVar[Optional[RequestMetrics]] = contextvars.ContextVar(
+    "current_request_metrics", default=None
+)
+
+
+def current_request() -> Optional[RequestMetrics]:
+    return _current_request.get()
+
+
+def start_request(request_metrics: RequestMetrics) -> contextvars.Token:
+    return _current_request.set(request_metrics)
+
+
+def end_request(token: contextvars.Token) -> None:
+    _current_request.reset(token)
+
+
+def record_span(stage: str, seconds: float) -> None:
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    request_metrics = _current_request.get()
+    if request_metrics is not None:
+        request_metrics.add(stage, seconds)
+
+
+@contextmanager
+def span(stage: str) -> Iterator[None]:
+    """
+    Time the enclosed block as `stage`, for /metrics and the current request's Server-Timing.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_span(stage, time.perf_counter() - started)
+
@@ -0,0 +1,41 @@
+# app/utils/ndjson.py
+from typing import AsyncIterator, List, Tuple
+
+from starlette.responses import StreamingResponse
+from starlette.types import Receive, Scope, Send
+
+
+async def ndjson_groups(chunks: AsyncIterator[bytes], group_size: int) -> AsyncIterator[List[Tuple[int, str]]]:
+    """
+    Split a streamed NDJSON body into groups of up to `group_size` numbered, non-blank lines
+    (numbered from 1), without holding more than one group and one partial line in memory.
+    """
+    group: List[Tuple[int, str]] = []
+    pending = b""
+    line_number = 0
+    async for chunk in chunks:
+        pending += chunk
+        *lines, pending = pending.split(b"\n")
+        for line in lines:
+            line_number += 1
+            if line.strip():
+                group.append((line_number, line.decode("utf-8")))
+            if len(group) >= group_size:
+                yield group
+                group = []
+    if pending.strip():
+        group.append((line_number + 1, pending.decode("utf-8")))
+    if group:
+        yield group
+
+
+class RequestStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse for a body that is produced while the request body is still being read.
+    StreamingResponse would listen for the client disconnecting with a second reader of the
+    request messages, which takes body chunks away from request.stream(); a disconnect is
+    seen by request.stream() (as ClientDisconnect) instead.
+    """
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await self.stream_response(send)
@@ -0,0 +1,76 @@
+# app/utils/profiling.py
+import cProfile
+import functools
+import inspect
+import os
+import re
+import time
+from typing import Callable
+
+from app.config import PROFILE_DIR, PROFILE_REQUESTS, PROFILE_SLOW_MS
+from app.utils.metrics import current_request
+
+
+def _dump_path(name: str) -> str:
+    safe_name = re.sub(r"[^A-Za-z0-9_.-]+", "_", name).strip("_")
+    return os.path.join(PROFILE_DIR, f"{time.strftime('%Y%m%dT%H%M%S')}-{time.time_ns() % 10**6:06d}-{safe_name}.prof")
+
+
+# cProfile profiles cannot overlap, and on the event loop they would; one at a time is taken.
+_active_profile = False
+
+
+def _dump(profile: cProfile.Profile, request_metrics, name: str, started: float) -> None:
+    if PROFILE_REQUESTS != "slow" or (time.perf_counter() - started) * 1000 >= PROFILE_SLOW_MS:
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        request_metrics.profile_path = _dump_path(name)
+        profile.dump_stats(request_metrics.profile_path)
+
+
+def profiled(endpoint: Callable) -> Callable:
+    """
+    Wrap an endpoint so that requests selected for profiling (see PROFILE_REQUESTS) run
+    under cProfile. The dump path is reported back in the X-Profile response header; open it
+    with `python -m pstats` or snakeviz. Async endpoints are profiled on the event loop, so
+    their profile also holds whatever other requests ran while they awaited, and work they
+    hand to the threadpool (decoding, hashing) shows up as waiting. Only one request is
+    profiled at a time; requests selected while another is being profiled run unprofiled.
+    """
+    # include_router copies routes with their (already wrapped) endpoints.
+    if PROFILE_REQUESTS == "off" or getattr(endpoint, "profiled", False):
+        return endpoint
+
+    if inspect.iscoroutinefunction(endpoint):
+        @functools.wraps(endpoint)
+        async def wrapper(*args, **kwargs):
+            global _active_profile
+            request_metrics = current_request()
+            if request_metrics is None or not request_metrics.profile or _active_profile:
+                return await endpoint(*args, **kwargs)
+
+            _active_profile = True
+            profile = cProfile.Profile()
+            started = time.perf_counter()
+            profile.enable()
+            try:
+                return await endpoint(*args, **kwargs)
+            finally:
+                profile.disable()
+                _active_profile = False
+                _dump(profile, request_metrics, endpoint.__name__, started)
+    else:
+        @functools.wraps(endpoint)
+        def wrapper(*args, **kwargs):
+            request_metrics = current_request()
+            if request_metrics is None or not request_metrics.profile:
+                return endpoint(*args, **kwargs)
+
+            profile = cProfile.Profile()
+            started = time.perf_counter()
+            try:
+                return profile.runcall(endpoint, *args, **kwargs)
+            finally:
+                _dump(profile, request_metrics, endpoint.__name__, started)
+
+    wrapper.profiled = True
+    return wrapper
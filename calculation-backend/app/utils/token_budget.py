@@ -0,0 +1,39 @@
+# app/utils/token_budget.py
+from functools import lru_cache
+
+try:
+    import tiktoken
+except ImportError:  # pragma: no cover - tiktoken is optional
+    tiktoken = None
+
+
+@lru_cache(maxsize=8)
+def _encoding_for(model: str):
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model)
+    except Exception:
+        try:
+            return tiktoken.get_encoding("cl100k_base")
+        except Exception:
+            return None
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Rough token count for `text` (about four characters per token for English and JSON).
+    Cheap enough to call per node and edge while partitioning.
+    """
+    return len(text) // 4 + 1
+
+
+def count_tokens(text: str, model: str) -> int:
+    """
+    Token count of `text` with the model's tokenizer, falling back to `estimate_tokens`
+    when tiktoken or the model's encoding is not available.
+    """
+    encoding = _encoding_for(model)
+    if encoding is None:
+        return estimate_tokens(text)
+    return len(encoding.encode(text, disallowed_special=()))
@@ -0,0 +1,98 @@
+# app/utils/units.py
+import re
+from typing import Any, Optional, Tuple
+
+# Mass flow units, as factors to kg/s. Keys are normalized with _normalize_unit.
+MASS_FLOW_UNITS = {
+    "kg/s": 1.0,
+    "kg/min": 1.0 / 60,
+    "kg/h": 1.0 / 3600,
+    "kg/d": 1.0 / 86400,
+    "g/s": 1e-3,
+    "g/min": 1e-3 / 60,
+    "g/h": 1e-3 / 3600,
+    "t/h": 1000.0 / 3600,
+    "t/d": 1000.0 / 86400,
+    "tph": 1000.0 / 3600,
+    "tpd": 1000.0 / 86400,
+    "lb/s": 0.45359237,
+    "lb/min": 0.45359237 / 60,
+    "lb/h": 0.45359237 / 3600,
+}
+
+# Temperature units, as (scale, offset) so that kelvin = value * scale + offset.
+TEMPERATURE_UNITS = {
+    "k": (1.0, 0.0),
+    "c": (1.0, 273.15),
+    "f": (5.0 / 9.0, 273.15 - 32.0 * 5.0 / 9.0),
+    "r": (5.0 / 9.0, 0.0),
+}
+
+_QUANTITY = re.compile(r"^\s*([-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)\s*(.*?)\s*$")
+
+
+def _normalize_unit(unit: str) -> str:
+    unit = unit.lower().replace(" ", "").replace("°", "").replace("deg", "")
+    unit = unit.replace("/hr", "/h").replace("/hour", "/h").replace("/sec", "/s").replace("/day", "/d")
+    unit = unit.replace("tonnes/", "t/").replace("tonne/", "t/").replace("ton/", "t/")
+    unit = unit.replace("lbs/", "lb/").replace("kelvin", "k").replace("celsius", "c").replace("fahrenheit", "f")
+    return unit
+
+
+def parse_quantity(value: Any) -> Optional[Tuple[float, str]]:
+    """
+    Split a property value such as "12.5 kg/h" or "80 °C" into (12.5, "kg/h"). Plain numbers
+    give an empty unit. Returns None for anything that is not a number with an optional unit.
+    """
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value), ""
+    if not isinstance(value, str):
+        return None
+    match = _QUANTITY.match(value)
+    if not match:
+        return None
+    return float(match.group(1)), match.group(2)
+
+
+def to_base(value: Any, kind: str) -> Optional[float]:
+    """
+    Convert a property value to kg/s ("mass_flow") or kelvin ("temperature"). Returns None
+    when the value has no recognised unit of that kind.
+    """
+    quantity = parse_quantity(value)
+    if quantity is None:
+        return None
+    number, unit = quantity
+    unit = _normalize_unit(unit)
+    if kind == "mass_flow" and unit in MASS_FLOW_UNITS:
+        return number * MASS_FLOW_UNITS[unit]
+    if kind == "temperature" and unit in TEMPERATURE_UNITS:
+        scale, offset = TEMPERATURE_UNITS[unit]
+        return number * scale + offset
+    return None
+
+
+def unit_of(value: Any, kind: str) -> Optional[str]:
+    """
+    The unit of a value as it was written (e.g. "kg/h", "°C"), if it is one of `kind`.
+    """
+    quantity = parse_quantity(value)
+    if quantity is None or to_base(value, kind) is None:
+        return None
+    return quantity[1]
+
+
+def format_quantity(base_value: float, unit: str, kind: str) -> str:
+    """
+    Format a kg/s or kelvin value in `unit`, with six significant digits.
+    """
+    normalized = _normalize_unit(unit)
+    if kind == "mass_flow":
+        number = base_value / MASS_FLOW_UNITS[normalized]
+    else:
+        scale, offset = TEMPERATURE_UNITS[normalized]
+        number = (base_value - offset) / scale
+    number = 0.0 if abs(number) < 1e-12 else number
+    return f"{number:.6g} {unit}"
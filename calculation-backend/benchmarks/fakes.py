@@ -0,0 +1,114 @@
+# benchmarks/fakes.py
+import asyncio
+import json
+import logging
+import os
+import re
+import socket
+from types import SimpleNamespace
+from typing import AsyncIterator, Callable, Dict, Any, List, Tuple
+
+_NUMBERED = re.compile(r"(\d+) (\"(?:[^\"\\]|\\.)*\"|[^|]+?)(?: \||$)")
+
+
+class FakeLLMClient:
+    """
+    Stand-in for openai.AsyncOpenAI that answers flowchart prompts (compact or verbose) with a
+    value for every open property. Each call waits `latency` seconds before the first token
+    and then produces `tokens_per_second` completion tokens per second, streamed or not.
+    """
+
+    def __init__(self, latency: float = 0.5, tokens_per_second: float = 200.0):
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.calls = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    async def _create(self, model: str, messages: List[Dict[str, str]], stream: bool = False, **kwargs):
+        self.calls += 1
+        text = json.dumps(answer_prompt(messages[-1]["content"]), separators=(",", ":"))
+        completion_tokens = max(1, len(text) // 4)
+        duration = completion_tokens / self.tokens_per_second if self.tokens_per_second > 0 else 0.0
+        if stream:
+            return self._stream(text, duration)
+        await asyncio.sleep(self.latency + duration)
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=text))],
+            usage=SimpleNamespace(completion_tokens=completion_tokens)
+        )
+
+    async def _stream(self, text: str, duration: float) -> AsyncIterator[SimpleNamespace]:
+        await asyncio.sleep(self.latency)
+        pieces = [text[start:start + 16] for start in range(0, len(text), 16)]
+        for piece in pieces:
+            await asyncio.sleep(duration / len(pieces))
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=piece))])
+
+
+def _rows(prompt: str, section: str) -> List[List[str]]:
+    if f"\n{section}:\n" not in prompt:
+        return []
+    block = prompt.split(f"\n{section}:\n", 1)[1].split("\n\n", 1)[0]
+    return [line.split("|") for line in block.splitlines() if line.count("|") >= 3]
+
+
+def answer_prompt(prompt: str) -> Dict[str, Any]:
+    """
+    A plausible answer to a prompt built by app.services.llm_integration.build_prompt.
+    """
+    if "Property numbers:" in prompt:
+        header = prompt.split("Property numbers:", 1)[1].split("\n", 1)[0]
+        names = {number: json.loads(name) if name.startswith('"') else name
+                 for number, name in _NUMBERED.findall(header.strip())}
+        answer = {}
+        for short, section in (("n", "Nodes"), ("e", "Edges")):
+            answer[short] = {
+                json.loads(row[0]) if row[0].startswith('"') else row[0]: {
+                    names.get(number, number): "1.0" for number in row[-1].split(",") if number
+                }
+                for row in _rows(prompt, section) if row[-1]
+            }
+        return answer
+
+    asked = prompt.split("Neighbouring components", 1)[0]
+    answer = {"nodes": {}, "edges": {}}
+    for section, pattern in (("nodes", r"^Node (\S+) labeled"), ("edges", r"^Edge (\S+) \(")):
+        for item_id in re.findall(pattern, asked, re.M):
+            answer[section][item_id] = {"properties": {"size": {"value": "1.0", "isLocked": False}}}
+    return answer
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_dynamodb(mode: str) -> Tuple[str, Callable[[], None]]:
+    """
+    Start a DynamoDB stand-in and point the app at it through DYNAMODB_ENDPOINT_URL, before
+    anything from `app` is imported. Modes:
+
+    - "moto-server": moto's HTTP server on a local port, so requests go over the wire;
+    - an URL, such as http://localhost:8000 for DynamoDB Local.
+
+    moto's in-process mock cannot be used: it answers with botocore responses, which the
+    async client (aiobotocore) cannot read.
+
+    Returns a description and a function that stops the stand-in.
+    """
+    os.environ.setdefault("AWS_ACCESS_KEY_ID", "dummy")
+    os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "dummy")
+    if mode == "moto-server":
+        from moto.server import ThreadedMotoServer
+
+        logging.getLogger("werkzeug").setLevel(logging.ERROR)
+        port = _free_port()
+        server = ThreadedMotoServer(ip_address="127.0.0.1", port=port, verbose=False)
+        server.start()
+        os.environ["DYNAMODB_ENDPOINT_URL"] = f"http://127.0.0.1:{port}"
+        return os.environ["DYNAMODB_ENDPOINT_URL"], server.stop
+    if "://" not in mode:
+        raise ValueError(f'Unknown DynamoDB stand-in {mode!r}: use "moto-server" or an endpoint URL')
+    os.environ["DYNAMODB_ENDPOINT_URL"] = mode
+    return mode, lambda: None
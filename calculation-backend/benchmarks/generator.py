@@ -0,0 +1,145 @@
+# benchmarks/generator.py
+import random
+from typing import Dict, Any, List, Optional
+
+# Editor defaults per component type (see flowchart-frontend/src/utils/flowchartUtils.ts).
+_DEFAULT_PROPERTIES = {
+    "tank": ["orientation", "moc", "capacity", "ldRatio", "length", "diameter",
+             "operatingTemperature", "operatingPressure"],
+    "reactor": ["orientation", "moc", "capacity", "ldRatio", "length", "diameter",
+                "operatingTemperature", "operatingPressure"],
+    "pump": ["moc", "capacity", "operatingTemperature", "operatingPressure"],
+    "heat_exchanger": ["hotSideMoc", "coldSideMoc", "area", "duty", "operatingTemperature", "operatingPressure"],
+    "distillation_column": ["moc", "diameter", "height", "operatingTemperature", "operatingPressure"],
+}
+_UNIT_TYPES = ["pump", "tank", "heat_exchanger", "reactor", "pump", "distillation_column"]
+TOPOLOGIES = ("chain", "recycle", "manifold", "mixed")
+
+# Layout spacing, so that viewport queries see a realistic number of nodes per grid cell.
+_DX, _DY = 180.0, 120.0
+_ROW_LENGTH = 50
+
+
+class _Builder:
+    def __init__(self, flowchart_id: str, rng: random.Random):
+        self.flowchart_id = flowchart_id
+        self.rng = rng
+        self.nodes: List[Dict[str, Any]] = []
+        self.edges: List[Dict[str, Any]] = []
+
+    def node(self, node_type: str, column: int, row: int) -> str:
+        node_id = f"{self.flowchart_id}-n{len(self.nodes)}"
+        properties = {name: {"value": "", "isLocked": False}
+                      for name in _DEFAULT_PROPERTIES.get(node_type, [])}
+        properties["chemical"] = {"value": "", "isLocked": False}
+        self.nodes.append({
+            "id": node_id,
+            "type": "default",
+            "position": {"x": column * _DX, "y": row * _DY},
+            "data": {"label": node_type, "type": node_type, "properties": properties},
+        })
+        return node_id
+
+    def edge(self, source: str, target: str, feed: bool = False) -> str:
+        edge_id = f"{self.flowchart_id}-e{len(self.edges)}"
+        properties = {"flowRate": {"value": "", "isLocked": False},
+                      "temperature": {"value": "", "isLocked": False}}
+        if feed:
+            properties["flowRate"] = {"value": f"{self.rng.randint(100, 5000)} kg/h", "isLocked": True}
+            properties["temperature"] = {"value": f"{self.rng.randint(15, 90)} °C", "isLocked": True}
+        self.edges.append({"id": edge_id, "source": source, "target": target,
+                           "data": {"properties": properties}})
+        return edge_id
+
+    def units(self, previous: str, count: int, column: int, row: int) -> str:
+        for offset in range(count):
+            node_id = self.node(self.rng.choice(_UNIT_TYPES), column + offset, row)
+            self.edge(previous, node_id)
+            previous = node_id
+        return previous
+
+
+def _chain(builder: _Builder, size: int, row: int) -> int:
+    # Feed, units and a product, wrapped over rows of _ROW_LENGTH.
+    previous = builder.node("input", 0, row)
+    builder.edge(builder.node("input", -1, row), previous, feed=True)
+    placed = 2
+    while placed < size - 1:
+        count = min(_ROW_LENGTH, size - 1 - placed)
+        previous = builder.units(previous, count, 1, row)
+        placed += count
+        row += 1
+    builder.edge(previous, builder.node("output", _ROW_LENGTH + 1, row))
+    return row + 2
+
+
+def _recycle(builder: _Builder, size: int, row: int) -> int:
+    # Repeated mixer -> units -> splitter blocks; each splitter sends part of the stream back
+    # to its block's mixer and the rest on to the next block.
+    previous = builder.node("input", 0, row)
+    builder.edge(builder.node("input", -1, row), previous, feed=True)
+    placed, column = 2, 1
+    while placed < size - 1:
+        mixer = builder.node("mixer", column, row)
+        builder.edge(previous, mixer)
+        units = min(builder.rng.randint(3, 8), max(0, size - 4 - placed))
+        last = builder.units(mixer, units, column + 1, row)
+        splitter = builder.node("splitter", column + units + 1, row)
+        builder.edge(last, splitter)
+        builder.edge(splitter, mixer)
+        previous = splitter
+        placed += units + 2
+        column += units + 2
+        if column > _ROW_LENGTH:
+            column, row = 1, row + 1
+    builder.edge(previous, builder.node("output", column, row))
+    return row + 2
+
+
+def _manifold(builder: _Builder, size: int, row: int) -> int:
+    # A header splitter feeding parallel branches that a mixer joins again, repeated.
+    previous = builder.node("input", 0, row)
+    builder.edge(builder.node("input", -1, row), previous, feed=True)
+    placed, column = 2, 1
+    while placed < size - 1:
+        branches = builder.rng.randint(2, 6)
+        length = builder.rng.randint(1, 4)
+        if placed + branches * length + 2 > size - 1:
+            branches, length = 1, max(0, size - 3 - placed)
+        header = builder.node("splitter", column, row)
+        builder.edge(previous, header)
+        joined = builder.node("mixer", column + length + 1, row)
+        for branch in range(branches):
+            last = builder.units(header, length, column + 1, row + branch)
+            builder.edge(last, joined)
+        previous = joined
+        placed += branches * length + 2
+        column += length + 2
+        if column > _ROW_LENGTH:
+            column, row = 1, row + 7
+    builder.edge(previous, builder.node("output", column, row))
+    return row + 7
+
+
+_SECTIONS = {"chain": _chain, "recycle": _recycle, "manifold": _manifold}
+
+
+def generate_flowchart(flowchart_id: str, size: int, topology: str = "mixed",
+                       seed: Optional[int] = 0) -> Dict[str, Any]:
+    """
+    A synthetic flowchart of about `size` nodes, laid out on a grid, with editor-default
+    properties and locked flow rates and temperatures on its feeds. "mixed" combines
+    sections of every other topology, each up to 2,000 nodes.
+    """
+    if topology not in TOPOLOGIES:
+        raise ValueError(f"Unknown topology {topology!r}; expected one of {', '.join(TOPOLOGIES)}")
+    builder = _Builder(flowchart_id, random.Random(seed))
+    row = 0
+    if topology != "mixed":
+        _SECTIONS[topology](builder, max(size, 4), row)
+    else:
+        kinds = list(_SECTIONS)
+        while len(builder.nodes) < size:
+            section = min(size - len(builder.nodes), 2000)
+            row = _SECTIONS[kinds[builder.rng.randrange(len(kinds))]](builder, max(section, 4), row)
+    return {"id": flowchart_id, "nodes": builder.nodes, "edges": builder.edges}
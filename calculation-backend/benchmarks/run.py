@@ -0,0 +1,95 @@
+# benchmarks/run.py
+"""
+Benchmark the API against local stand-ins for DynamoDB and the LLM, e.g.
+
+    python -m benchmarks.run --sizes 10,1000,10000 --topology mixed --output results.json
+
+Results are written as JSON: one entry per scenario and flowchart size with p50/p95/p99
+latency, throughput and peak Python heap.
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import sys
+import time
+
+from benchmarks.fakes import FakeLLMClient, start_dynamodb
+from benchmarks.generator import TOPOLOGIES
+from benchmarks.scenarios import SCENARIOS
+
+
+def _parse_args(argv):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10,1000,10000",
+                        help="comma-separated flowchart sizes in nodes (default: 10,1000,10000)")
+    parser.add_argument("--topology", choices=TOPOLOGIES, default="mixed")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS),
+                        help=f"comma-separated subset of: {', '.join(SCENARIOS)}")
+    parser.add_argument("--iterations", type=int, default=5, help="timed calls per scenario")
+    parser.add_argument("--clients", type=int, default=8, help="threads in the concurrent scenario")
+    parser.add_argument("--dynamodb", default="moto-server",
+                        help='"moto-server" or an endpoint URL')
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="seconds before the first token")
+    parser.add_argument("--llm-tokens-per-second", type=float, default=200.0)
+    parser.add_argument("--output", help="file to write the JSON results to (default: stdout)")
+    args = parser.parse_args(argv)
+
+    args.sizes = [int(size) for size in args.sizes.split(",") if size.strip()]
+    args.scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+    return args
+
+
+def main(argv=None) -> int:
+    args = _parse_args(argv)
+    dynamodb, stop_dynamodb = start_dynamodb(args.dynamodb)
+    try:
+        # The app reads its DynamoDB endpoint at import time, so it is imported only now.
+        from app.services.llm_integration import set_llm_client
+        from benchmarks.scenarios import run_scenarios
+
+        llm = FakeLLMClient(args.llm_latency, args.llm_tokens_per_second)
+        set_llm_client(llm)
+
+        started = time.time()
+        results = []
+        for size in args.sizes:
+            print(f"{args.topology}, {size} nodes ...", file=sys.stderr)
+            results.extend(run_scenarios(size, args.topology, args.iterations, args.clients, args.scenarios))
+    finally:
+        stop_dynamodb()
+
+    report = {
+        "meta": {
+            "started_at": started,
+            "duration_s": round(time.time() - started, 3),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "dynamodb": dynamodb,
+            "llm": {"latency_s": args.llm_latency, "tokens_per_second": args.llm_tokens_per_second,
+                    "calls": llm.calls},
+            "iterations": args.iterations,
+            "clients": args.clients,
+            # ru_maxrss is in KiB on Linux and in bytes on macOS.
+            "max_rss_bytes": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+                             * (1 if sys.platform == "darwin" else 1024),
+            "config": {name: value for name, value in os.environ.items()
+                       if name.startswith(("FLOWCHART_", "LLM_", "RUN_", "PROMPT_"))}
+        },
+        "scenarios": results
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
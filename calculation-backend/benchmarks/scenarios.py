@@ -0,0 +1,197 @@
+# benchmarks/scenarios.py
+import math
+import statistics
+import threading
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Optional
+
+from fastapi.testclient import TestClient
+
+from benchmarks.generator import generate_flowchart
+
+# Requests run through the whole FastAPI stack in process (routing, validation,
+# serialization), against whatever DynamoDB endpoint and LLM client the app was given.
+SCENARIOS = (
+    "save_cold", "save_unchanged", "save_edit", "get", "get_uncached", "get_not_modified",
+    "get_viewport", "run_cold", "run_repeat", "concurrent"
+)
+
+
+def _percentile(ordered: List[float], fraction: float) -> float:
+    # Nearest-rank percentile of an ascending list.
+    rank = max(0, min(len(ordered) - 1, math.ceil(fraction * len(ordered)) - 1))
+    return ordered[rank]
+
+
+def summarize(latencies: List[float], elapsed: float) -> Dict[str, Any]:
+    """
+    Latency percentiles in milliseconds and throughput for a list of latencies in seconds,
+    measured over `elapsed` seconds of wall time.
+    """
+    if not latencies:
+        return {"latency_ms": None, "throughput_ops_s": 0.0}
+    ordered = sorted(latencies)
+    return {
+        "latency_ms": {
+            "p50": round(_percentile(ordered, 0.50) * 1000, 3),
+            "p95": round(_percentile(ordered, 0.95) * 1000, 3),
+            "p99": round(_percentile(ordered, 0.99) * 1000, 3),
+            "mean": round(statistics.fmean(ordered) * 1000, 3),
+            "max": round(ordered[-1] * 1000, 3)
+        },
+        "throughput_ops_s": round(len(latencies) / elapsed, 3) if elapsed > 0 else None
+    }
+
+
+def _ok(response) -> bool:
+    return response.status_code < 400
+
+
+def measure(operation: Callable[[Any], Any], iterations: int, prepare: Optional[Callable[[int], Any]] = None,
+            warmup: int = 1) -> Dict[str, Any]:
+    """
+    Call `operation(prepare(i))` `iterations` times and report latencies, throughput and the
+    number of failed calls; `prepare` runs outside the timed part. The peak Python heap of
+    one extra traced call is reported separately, so tracing does not skew the latencies.
+    """
+    prepare = prepare or (lambda _: None)
+    for number in range(warmup):
+        operation(prepare(-1 - number))
+
+    latencies, errors, elapsed = [], 0, 0.0
+    for number in range(iterations):
+        argument = prepare(number)
+        started = time.perf_counter()
+        response = operation(argument)
+        latency = time.perf_counter() - started
+        latencies.append(latency)
+        elapsed += latency
+        errors += not _ok(response)
+
+    argument = prepare(iterations)
+    tracemalloc.start()
+    try:
+        operation(argument)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {**summarize(latencies, elapsed), "iterations": iterations, "errors": errors, "peak_memory_bytes": peak}
+
+
+def _edit(flowchart: Dict[str, Any], number: int) -> Dict[str, Any]:
+    # A one-property change, the common case for an interactive save.
+    node = flowchart["nodes"][number % len(flowchart["nodes"])]
+    node["data"]["properties"]["chemical"] = {"value": f"edit {number}", "isLocked": True}
+    return flowchart
+
+
+def _concurrent(http: TestClient, flowchart_id: str, size: int, topology: str, clients: int,
+                operations: int) -> Dict[str, Any]:
+    # Every client reads the shared flowchart (full, conditional and viewport reads) and
+    # saves edits to a flowchart of its own, so that writes do not conflict. The client
+    # threads share `http`, so their requests are served concurrently on one event loop.
+    shared_etag = http.get(f"/flowchart/{flowchart_id}").headers.get("etag", "")
+    owned = [generate_flowchart(f"{flowchart_id}-c{client}", min(size, 1000), topology, seed=client)
+             for client in range(clients)]
+    latencies: List[List[float]] = [[] for _ in range(clients)]
+    errors = [0] * clients
+
+    def client_loop(client: int) -> None:
+        own = owned[client]
+        requests = [
+            lambda _: http.get(f"/flowchart/{flowchart_id}"),
+            lambda _: http.get(f"/flowchart/{flowchart_id}", headers={"If-None-Match": shared_etag}),
+            lambda _: http.get(f"/flowchart/{flowchart_id}/nodes", params={"bbox": "0,0,2000,1500"}),
+            lambda number: http.post(f"/flowchart/{own['id']}", json=_edit(own, number)),
+        ]
+        for number in range(operations):
+            started = time.perf_counter()
+            response = requests[number % len(requests)](number)
+            latencies[client].append(time.perf_counter() - started)
+            errors[client] += not _ok(response)
+
+    threads = [threading.Thread(target=client_loop, args=(client,)) for client in range(clients)]
+    tracemalloc.start()
+    started = time.perf_counter()
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    merged = [latency for client_latencies in latencies for latency in client_latencies]
+    return {**summarize(merged, elapsed), "iterations": len(merged), "errors": sum(errors),
+            "peak_memory_bytes": peak, "clients": clients}
+
+
+def run_scenarios(size: int, topology: str, iterations: int, clients: int,
+                  selected: Optional[List[str]] = None, label: str = "bench") -> List[Dict[str, Any]]:
+    """
+    Run the selected scenarios (all of SCENARIOS by default) against one synthetic flowchart
+    of `size` nodes and return one result per scenario.
+    """
+    from app.main import app
+    from app.services.flowchart_cache import flowchart_cache
+
+    selected = list(selected or SCENARIOS)
+    # Entering the client runs the app's lifespan, which opens DynamoDB; every request of the
+    # benchmark goes through this one client and its event loop.
+    with TestClient(app) as http:
+        flowchart_id = f"{label}-{topology}-{size}"
+        flowchart = generate_flowchart(flowchart_id, size, topology)
+        edges = len(flowchart["edges"])
+        saved = http.post(f"/flowchart/{flowchart_id}", json=flowchart)
+        saved.raise_for_status()
+        state = {"version": saved.json()["version"], "edits": 0}
+
+        def post(document):
+            response = http.post(f"/flowchart/{document['id']}", json=document)
+            if _ok(response) and document["id"] == flowchart_id:
+                state["version"] = response.json()["version"]
+            return response
+
+        def edited(_):
+            state["edits"] += 1
+            return _edit(flowchart, state["edits"])
+
+        def cold(number):
+            # A flowchart nobody has saved before; ids differ from run to run of this scenario.
+            return generate_flowchart(f"{flowchart_id}-cold-{time.time_ns()}-{number}", size, topology)
+
+        def uncached(_):
+            flowchart_cache.invalidate(flowchart_id, state["version"])
+
+        def etag(_):
+            # The ETag of the representation that is revalidated: the full document.
+            return http.get(f"/flowchart/{flowchart_id}").headers["etag"]
+
+        operations = {
+            "save_cold": (post, cold),
+            "save_unchanged": (lambda _: post(flowchart), None),
+            "save_edit": (post, edited),
+            "get": (lambda _: http.get(f"/flowchart/{flowchart_id}"), None),
+            "get_uncached": (lambda _: http.get(f"/flowchart/{flowchart_id}"), uncached),
+            "get_not_modified": (
+                lambda tag: http.get(f"/flowchart/{flowchart_id}", headers={"If-None-Match": tag}), etag
+            ),
+            "get_viewport": (
+                lambda _: http.get(f"/flowchart/{flowchart_id}/nodes", params={"bbox": "0,0,2000,1500"}), None
+            ),
+            "run_cold": (lambda _: http.post(f"/flowchart/{flowchart_id}/run", params={"force": True}), None),
+            "run_repeat": (lambda _: http.post(f"/flowchart/{flowchart_id}/run"), None),
+        }
+
+        results = []
+        for name in selected:
+            if name == "concurrent":
+                result = _concurrent(http, flowchart_id, size, topology, clients, iterations)
+            else:
+                operation, prepare = operations[name]
+                result = measure(operation, iterations, prepare)
+            results.append({"name": name, "topology": topology, "nodes": size, "edges": edges, **result})
+        return results
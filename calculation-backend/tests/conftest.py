@@ -0,0 +1,59 @@
+# tests/conftest.py
+"""
+Fixtures for the tests that go through the API. They use the stand-ins of the benchmarks
+(benchmarks/fakes.py): moto's DynamoDB server, started here before anything from `app` is
+imported, or the endpoint in TEST_DYNAMODB_ENDPOINT_URL (e.g. DynamoDB Local), and
+FakeLLMClient instead of OpenAI. moto comes with benchmarks/requirements.txt; without it,
+those tests are skipped.
+"""
+import os
+import uuid
+from functools import partial
+
+import pytest
+
+from benchmarks.fakes import FakeLLMClient, start_dynamodb
+
+try:
+    _endpoint, _stop_dynamodb = start_dynamodb(os.getenv("TEST_DYNAMODB_ENDPOINT_URL") or "moto-server")
+except ImportError:
+    _endpoint, _stop_dynamodb = None, lambda: None
+
+
+def pytest_unconfigure(config):
+    _stop_dynamodb()
+
+
+@pytest.fixture(scope="session")
+def http():
+    """A client of the app, whose lifespan (and DynamoDB connection) lasts the whole session."""
+    if _endpoint is None:
+        pytest.skip("moto[server] is not installed (see benchmarks/requirements.txt)")
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    with TestClient(app) as client:
+        yield client
+
+
+@pytest.fixture
+def run(http):
+    """Run a coroutine function on the app's event loop, e.g. to use a store directly."""
+    return lambda function, *args, **kwargs: http.portal.call(partial(function, *args, **kwargs))
+
+
+@pytest.fixture
+def llm():
+    """A fresh FakeLLMClient answering every model request, counting its calls."""
+    from app.services.llm_integration import set_llm_client
+
+    client = FakeLLMClient(latency=0, tokens_per_second=0)
+    set_llm_client(client)
+    return client
+
+
+@pytest.fixture
+def flowchart_id():
+    # Node and edge ids are derived from it (see benchmarks/generator.py), so recommendation
+    # cache entries are not shared between tests either.
+    return f"test-{uuid.uuid4().hex[:12]}"
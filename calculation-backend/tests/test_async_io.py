@@ -0,0 +1,79 @@
+# tests/test_async_io.py
+import asyncio
+
+import pytest
+
+import app.db.dynamodb as dynamodb_module
+from app.db.dynamodb import FLOWCHART_TABLE, DynamoDB, dynamodb
+from app.models.flowchart import Flowchart
+from app.services.flowchart_service import save_flowchart_service
+from app.services.llm_integration import close_llm_client, get_llm_client, set_llm_client
+from app.utils.loop_local import LoopLocal
+from benchmarks.fakes import FakeLLMClient
+from benchmarks.generator import generate_flowchart
+
+
+def test_tables_need_an_open_connection():
+    with pytest.raises(RuntimeError):
+        asyncio.run(DynamoDB().table(FLOWCHART_TABLE))
+
+
+def test_failed_set_up_is_started_again(http, run, monkeypatch):
+    # The tables exist already, so the two set-ups below never race to create one.
+    run(dynamodb.table, FLOWCHART_TABLE)
+    set_up = dynamodb_module.create_table_if_not_exists
+    failures = []
+
+    async def flaky(client, table_name, spec, create=True):
+        await set_up(client, table_name, spec, create)
+        if not failures:
+            failures.append(table_name)
+            raise ConnectionError("DynamoDB went away")
+
+    monkeypatch.setattr(dynamodb_module, "create_table_if_not_exists", flaky)
+
+    async def scenario():
+        database = DynamoDB()
+        await database.open()
+        try:
+            with pytest.raises(ConnectionError):
+                await database.table(FLOWCHART_TABLE)
+            table = await database.table(FLOWCHART_TABLE)
+            return table.name
+        finally:
+            await database.close()
+
+    assert asyncio.run(scenario()) == FLOWCHART_TABLE
+    assert len(failures) == 1
+
+
+def test_loop_local_values():
+    local = LoopLocal(asyncio.Event)
+
+    async def twice():
+        return local.get(), local.get()
+
+    first, again = asyncio.run(twice())
+    assert first is again
+    assert asyncio.run(twice())[0] is not first
+
+
+def test_given_llm_client_is_not_closed():
+    client = FakeLLMClient(latency=0, tokens_per_second=0)
+    set_llm_client(client)
+    asyncio.run(close_llm_client())
+    assert get_llm_client() is client
+
+
+def test_concurrent_saves_share_the_loop(http, run, flowchart_id):
+    flowcharts = [generate_flowchart(f"{flowchart_id}-{number}", 20, "mixed") for number in range(10)]
+
+    async def save_all():
+        return await asyncio.gather(*(save_flowchart_service(Flowchart(**flowchart)) for flowchart in flowcharts))
+
+    results = run(save_all)
+
+    assert [result["version"] for result in results] == [1] * len(flowcharts)
+    for flowchart, result in zip(flowcharts, results):
+        assert result["written"] == len(flowchart["nodes"]) + len(flowchart["edges"])
+        assert len(http.get(f"/flowchart/{flowchart['id']}").json()["nodes"]) == len(flowchart["nodes"])
@@ -0,0 +1,66 @@
+# tests/test_benchmarks.py
+import asyncio
+
+import pytest
+
+from app.services.llm_integration import build_flowchart_prompt
+from benchmarks.fakes import FakeLLMClient, answer_prompt, start_dynamodb
+from benchmarks.generator import TOPOLOGIES, generate_flowchart
+from benchmarks.scenarios import summarize
+
+
+@pytest.mark.parametrize("topology", TOPOLOGIES)
+def test_generated_flowcharts_are_reproducible_and_well_formed(topology):
+    flowchart = generate_flowchart("bench", 300, topology)
+
+    assert flowchart == generate_flowchart("bench", 300, topology)
+    assert generate_flowchart("bench", 300, topology, seed=1) != flowchart
+    node_ids = [node["id"] for node in flowchart["nodes"]]
+    assert len(set(node_ids)) == len(node_ids)
+    assert 0.9 * 300 <= len(node_ids) <= 1.1 * 300
+    assert all(edge["source"] in node_ids and edge["target"] in node_ids for edge in flowchart["edges"])
+    assert any(edge["data"]["properties"]["flowRate"]["isLocked"] for edge in flowchart["edges"])
+
+
+def test_unknown_topology():
+    with pytest.raises(ValueError):
+        generate_flowchart("bench", 10, "star")
+    with pytest.raises(ValueError):
+        start_dynamodb("dynamodb-local")
+
+
+def test_fake_answers_verbose_prompts():
+    flowchart = generate_flowchart("fake", 8, "chain")
+    prompt = build_flowchart_prompt("fake", flowchart["nodes"][:3], flowchart["edges"][:1],
+                                    context_nodes=flowchart["nodes"][3:4])
+
+    answer = answer_prompt(prompt)
+
+    assert set(answer["nodes"]) == {node["id"] for node in flowchart["nodes"][:3]}
+    assert set(answer["edges"]) == {flowchart["edges"][0]["id"]}
+
+
+def test_fake_client_streams_the_same_answer():
+    async def ask(client, stream):
+        response = await client.chat.completions.create(
+            model="fake", messages=[{"role": "user", "content": prompt}], stream=stream
+        )
+        if not stream:
+            return response.choices[0].message.content
+        return "".join([event.choices[0].delta.content async for event in response])
+
+    flowchart = generate_flowchart("fake", 8, "chain")
+    prompt = build_flowchart_prompt("fake", flowchart["nodes"], flowchart["edges"])
+    client = FakeLLMClient(latency=0, tokens_per_second=0)
+
+    assert asyncio.run(ask(client, False)) == asyncio.run(ask(client, True))
+    assert client.calls == 2
+
+
+def test_summary_percentiles():
+    summary = summarize([number / 1000 for number in range(1, 101)], elapsed=2.0)
+    assert summary["latency_ms"]["p50"] == 50
+    assert summary["latency_ms"]["p99"] == 99
+    assert summary["latency_ms"]["max"] == 100
+    assert summary["throughput_ops_s"] == 50
+    assert summarize([], 1.0) == {"latency_ms": None, "throughput_ops_s": 0.0}
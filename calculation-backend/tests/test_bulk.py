@@ -0,0 +1,73 @@
+# tests/test_bulk.py
+import json
+import time
+
+from benchmarks.generator import generate_flowchart
+
+
+def _ndjson(flowcharts) -> str:
+    return "".join(json.dumps(flowchart) + "\n" for flowchart in flowcharts)
+
+
+def _lines(response):
+    return [json.loads(line) for line in response.text.splitlines()]
+
+
+def _wait_for_batch(http, batch_id: str, timeout: float = 20.0) -> dict:
+    deadline = time.monotonic() + timeout
+    while True:
+        batch = http.get(f"/batch-runs/{batch_id}").json()
+        if batch["status"] == "done" or time.monotonic() > deadline:
+            return batch
+        time.sleep(0.05)
+
+
+def test_import_and_export_round_trip(http, flowchart_id):
+    flowcharts = [generate_flowchart(f"{flowchart_id}-{number}", 6 + number, "chain") for number in range(3)]
+    body = _ndjson(flowcharts[:2]) + "not json\n" + _ndjson(flowcharts[2:]) + "\n" + '{"nodes": []}\n'
+
+    results = _lines(http.post("/flowcharts/import", content=body))
+
+    assert [(result.get("line"), result.get("status")) for result in results[:-1]] == \
+        [(1, 200), (2, 200), (3, 400), (4, 200), (6, 400)]
+    assert results[-1] == {"type": "summary", "imported": 3, "failed": 2}
+    assert results[0]["written"] == len(flowcharts[0]["nodes"]) + len(flowcharts[0]["edges"])
+
+    ids = [flowchart["id"] for flowchart in flowcharts]
+    exported = _lines(http.get("/flowcharts/export", params={"ids": ",".join(ids[::-1] + ["missing"])}))
+    assert sorted(flowchart["id"] for flowchart in exported) == sorted(ids)
+    for flowchart in exported:
+        assert flowchart == http.get(f"/flowchart/{flowchart['id']}").json()
+
+    # Exported lines import again as they are, and nothing changes.
+    again = _lines(http.post("/flowcharts/import", content=_ndjson(exported)))
+    assert all(result["status"] == 200 and result["written"] == 0 for result in again[:-1])
+
+
+def test_import_checks_versions_when_asked(http, flowchart_id):
+    flowchart = generate_flowchart(flowchart_id, 6, "chain")
+    http.post(f"/flowchart/{flowchart_id}", json=flowchart)
+    http.post(f"/flowchart/{flowchart_id}", json=flowchart)
+    stale = _ndjson([{**flowchart, "version": 1}])
+
+    assert _lines(http.post("/flowcharts/import", content=stale))[0]["status"] == 200
+    checked = _lines(http.post("/flowcharts/import", params={"check_versions": True}, content=stale))
+    assert checked[0]["status"] == 409
+    assert checked[-1] == {"type": "summary", "imported": 0, "failed": 1}
+
+
+def test_batch_run(http, llm, flowchart_id):
+    ids = [f"{flowchart_id}-{number}" for number in range(4)]
+    http.post("/flowcharts/import", content=_ndjson(generate_flowchart(fid, 8, "chain") for fid in ids))
+
+    submitted = http.post("/batch-runs", json={"flowchart_ids": ids + [ids[0], "missing"]})
+    assert submitted.status_code == 202
+    assert submitted.json()["total"] == 5
+
+    batch = _wait_for_batch(http, submitted.json()["job_id"])
+    assert (batch["done"], batch["failed"], batch["skipped"]) == (4, 1, 0)
+    assert batch["failures"] == [{"flowchart_id": "missing", "status": "failed", "error": "Flowchart not found"}]
+    assert all(http.get(f"/flowchart/{fid}").json()["version"] == 2 for fid in ids)
+
+    assert http.post("/batch-runs", json={"flowchart_ids": []}).status_code == 400
+    assert http.get("/batch-runs/nope").status_code == 404
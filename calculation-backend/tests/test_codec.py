@@ -0,0 +1,103 @@
+# tests/test_codec.py
+import copy
+
+import pytest
+from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
+
+import app.db.flowchart_store as flowchart_store
+from app.db.codec import decode_edge, decode_node, encode_edge, encode_node
+from app.db.flowchart_store import (
+    BODY_FIELD,
+    PARTS_FIELD,
+    decode_flowchart_item,
+    encode_flowchart_item,
+    load_flowchart
+)
+from benchmarks.generator import generate_flowchart
+
+_serializer, _deserializer = TypeSerializer(), TypeDeserializer()
+
+
+def _through_dynamodb(item):
+    # What a write followed by a read gives back: every number becomes a Decimal.
+    return {key: _deserializer.deserialize(_serializer.serialize(value)) for key, value in item.items()}
+
+
+def _flowchart(flowchart_id: str, size: int) -> dict:
+    flowchart = generate_flowchart(flowchart_id, size, "mixed")
+    node = flowchart["nodes"][1]
+    node.update(width=120.5, height=40.0, style={"border": "1px solid #333", "padding": 4.5})
+    node["data"]["properties"].update({
+        "stages": {"value": 12, "isLocked": True},
+        "efficiency": {"value": 0.82, "isLocked": False},
+        "curve": {"value": [[0, 1.5], [10, 2]], "isLocked": True}
+    })
+    node["data"]["meta"] = {"revision": 3, "scale": 1.25}
+    flowchart["edges"][0]["markerEnd"] = {"type": "arrow", "width": 20}
+    flowchart["edges"][1]["style"] = {"dasharray": " ".join(str(number * 7919 % 1009) for number in range(200))}
+    flowchart["notes"] = {"summary": "ok", "count": 2}
+    return flowchart
+
+
+def test_node_and_edge_round_trip():
+    flowchart = _flowchart("codec", 8)
+    original = copy.deepcopy(flowchart)
+
+    nodes = [decode_node(_through_dynamodb(encode_node(node, 256))) for node in flowchart["nodes"]]
+    edges = [decode_edge(_through_dynamodb(encode_edge(edge, 256))) for edge in flowchart["edges"]]
+
+    assert nodes == original["nodes"]
+    assert edges == original["edges"]
+    # Integral values come back as int, with their type.
+    assert type(nodes[1]["data"]["properties"]["stages"]["value"]) is int
+    assert type(nodes[1]["data"]["properties"]["efficiency"]["value"]) is float
+    # Encoding leaves the input alone.
+    assert flowchart == original
+
+
+def test_large_style_is_compressed():
+    flowchart = _flowchart("blob", 8)
+    encoded = encode_edge(flowchart["edges"][1], 256)
+    assert "style" not in encoded and "style_z" in encoded
+    assert "markerEnd" in encode_edge(flowchart["edges"][0], 256)
+
+
+@pytest.mark.parametrize("inline_max, part_bytes, layout", [
+    (10 ** 7, 10 ** 7, "inline"),
+    (100, 10 ** 7, "compressed"),
+    (100, 200, "parts"),
+])
+def test_flowchart_item_round_trip(monkeypatch, inline_max, part_bytes, layout):
+    monkeypatch.setattr(flowchart_store, "FLOWCHART_INLINE_MAX_BYTES", inline_max)
+    monkeypatch.setattr(flowchart_store, "FLOWCHART_PART_BYTES", part_bytes)
+    flowchart = _flowchart("item", 40)
+    flowchart["version"] = 7
+
+    item, *parts = [_through_dynamodb(encoded) for encoded in encode_flowchart_item(flowchart)]
+
+    assert (BODY_FIELD in item, PARTS_FIELD in item) == {
+        "inline": (False, False), "compressed": (True, False), "parts": (False, True)
+    }[layout]
+    assert all(len(part[BODY_FIELD].value) <= part_bytes for part in parts)
+    assert len(parts) == (item[PARTS_FIELD] if layout == "parts" else 0)
+
+    decoded = decode_flowchart_item(item, b"".join(part[BODY_FIELD].value for part in parts))
+    decoded.pop(flowchart_store.GENERATION_FIELD, None)
+    decoded.pop(PARTS_FIELD, None)
+    # The version is kept by the store, not encoded with the body.
+    assert decoded == {key: value for key, value in flowchart.items() if key != "version"}
+
+
+def test_split_flowchart_is_saved_and_read_back(http, run, monkeypatch, flowchart_id):
+    monkeypatch.setattr(flowchart_store, "FLOWCHART_INLINE_MAX_BYTES", 100)
+    monkeypatch.setattr(flowchart_store, "FLOWCHART_PART_BYTES", 500)
+    flowchart = _flowchart(flowchart_id, 40)
+
+    http.post(f"/flowchart/{flowchart_id}", json=flowchart)
+    stored = run(load_flowchart, flowchart_id)
+
+    assert stored[PARTS_FIELD] > 1
+    read = http.get(f"/flowchart/{flowchart_id}").json()
+    assert read["nodes"] == stored["nodes"]
+    assert [node["data"] for node in read["nodes"]] == [node["data"] for node in flowchart["nodes"]]
+    assert [edge["style"] for edge in read["edges"]] == [edge.get("style") for edge in flowchart["edges"]]
@@ -0,0 +1,74 @@
+# tests/test_dirty_set.py
+import copy
+from typing import Any, Dict, List
+
+from app.services.dirty_set import compute_dirty_set, snapshot_run_state
+from app.services.graph_index import GraphIndex
+from benchmarks.generator import generate_flowchart
+
+
+def _chain(length: int) -> Dict[str, List[Dict[str, Any]]]:
+    ids = [f"n{number}" for number in range(length)]
+    return {
+        "nodes": [{"id": node_id, "data": {"label": node_id, "properties": {}}} for node_id in ids],
+        "edges": [{"id": f"{source}>{target}", "source": source, "target": target, "data": {"properties": {}}}
+                  for source, target in zip(ids, ids[1:])]
+    }
+
+
+def _dirty(flowchart, last_run, radius=1):
+    return compute_dirty_set(GraphIndex(flowchart["nodes"], flowchart["edges"]), last_run, radius)
+
+
+def test_everything_is_dirty_without_a_previous_run():
+    flowchart = _chain(4)
+    assert _dirty(flowchart, None) == ({"n0", "n1", "n2", "n3"}, {"n0>n1", "n1>n2", "n2>n3"})
+
+
+def test_nothing_is_dirty_after_an_unchanged_run():
+    flowchart = _chain(4)
+    last_run = snapshot_run_state(GraphIndex(flowchart["nodes"], flowchart["edges"]))
+    assert _dirty(flowchart, last_run) == (set(), set())
+
+
+def test_a_changed_node_dirties_its_neighbourhood():
+    flowchart = _chain(7)
+    last_run = snapshot_run_state(GraphIndex(flowchart["nodes"], flowchart["edges"]))
+    flowchart["nodes"][3]["data"]["properties"]["duty"] = {"value": "5 kW", "isLocked": True}
+
+    assert _dirty(flowchart, last_run) == ({"n2", "n3", "n4"}, {"n1>n2", "n2>n3", "n3>n4", "n4>n5"})
+    assert _dirty(flowchart, last_run, radius=0)[0] == {"n3"}
+    assert _dirty(flowchart, last_run, radius=2)[0] == {"n1", "n2", "n3", "n4", "n5"}
+
+
+def test_a_removed_edge_dirties_its_endpoints():
+    flowchart = _chain(7)
+    last_run = snapshot_run_state(GraphIndex(flowchart["nodes"], flowchart["edges"]))
+    flowchart["edges"] = [edge for edge in flowchart["edges"] if edge["id"] != "n3>n4"]
+
+    assert _dirty(flowchart, last_run, radius=0) == ({"n3", "n4"}, {"n2>n3", "n4>n5"})
+
+
+def test_repeat_run_sends_nothing_and_an_edit_only_its_neighbourhood(http, llm, flowchart_id):
+    flowchart = generate_flowchart(flowchart_id, 12, "chain")
+    http.post(f"/flowchart/{flowchart_id}", json=flowchart)
+    first = http.post(f"/flowchart/{flowchart_id}/run").json()
+    calls = llm.calls
+    assert first["run_stats"]["chunks"] >= 1
+
+    repeat = http.post(f"/flowchart/{flowchart_id}/run").json()
+    assert repeat["run_stats"]["chunks"] == 0
+    assert repeat["run_stats"]["dirty_nodes"] == 0
+    assert llm.calls == calls
+
+    edited = copy.deepcopy(http.get(f"/flowchart/{flowchart_id}").json())
+    node = edited["nodes"][5]
+    node["data"]["label"] = "renamed"
+    neighbours = {edge["target"] for edge in edited["edges"] if edge["source"] == node["id"]} | \
+                 {edge["source"] for edge in edited["edges"] if edge["target"] == node["id"]}
+    http.post(f"/flowchart/{flowchart_id}", json=edited)
+
+    rerun = http.post(f"/flowchart/{flowchart_id}/run").json()
+    assert rerun["run_stats"]["dirty_nodes"] == 1 + len(neighbours)
+    assert rerun["run_stats"]["chunks"] == 1
+    assert llm.calls == calls + 1
@@ -0,0 +1,120 @@
+# tests/test_flowchart_save.py
+from typing import Set
+
+from boto3.dynamodb.conditions import Key
+
+from app.db.dynamodb import EDGE_TABLE, NODE_TABLE, dynamodb
+from app.services.flowchart_service import _rebuild_item_tables
+from benchmarks.generator import generate_flowchart
+
+
+async def _row_ids(table_name: str, flowchart_id: str) -> Set[str]:
+    table = await dynamodb.table(table_name)
+    response = await table.query(KeyConditionExpression=Key("flowchart_id").eq(flowchart_id))
+    return {item["id"] for item in response["Items"]}
+
+
+async def _delete_rows(table_name: str, flowchart_id: str) -> None:
+    table = await dynamodb.table(table_name)
+    for item_id in await _row_ids(table_name, flowchart_id):
+        await table.delete_item(Key={"flowchart_id": flowchart_id, "id": item_id})
+
+
+def test_save_writes_only_changed_rows(http, run, flowchart_id):
+    flowchart = generate_flowchart(flowchart_id, 12, "chain")
+    items = len(flowchart["nodes"]) + len(flowchart["edges"])
+
+    first = http.post(f"/flowchart/{flowchart_id}", json=flowchart).json()
+    assert (first["written"], first["skipped"], first["deleted"]) == (items, 0, 0)
+
+    again = http.post(f"/flowchart/{flowchart_id}", json=flowchart).json()
+    assert (again["written"], again["skipped"], again["deleted"]) == (0, items, 0)
+    assert again["version"] == first["version"] + 1
+
+    # One node changed, one edge removed.
+    flowchart["nodes"][3]["data"]["label"] = "renamed"
+    removed = flowchart["edges"].pop()
+    changed = http.post(f"/flowchart/{flowchart_id}", json=flowchart).json()
+    assert (changed["written"], changed["skipped"], changed["deleted"]) == (1, items - 2, 1)
+
+    assert run(_row_ids, NODE_TABLE, flowchart_id) == {node["id"] for node in flowchart["nodes"]}
+    assert run(_row_ids, EDGE_TABLE, flowchart_id) == {edge["id"] for edge in flowchart["edges"]}
+    assert removed["id"] not in run(_row_ids, EDGE_TABLE, flowchart_id)
+
+
+def test_removed_nodes_are_deleted_from_the_table(http, run, flowchart_id):
+    flowchart = generate_flowchart(flowchart_id, 12, "chain")
+    http.post(f"/flowchart/{flowchart_id}", json=flowchart)
+
+    kept = flowchart["nodes"][:6]
+    kept_ids = {node["id"] for node in kept}
+    flowchart["nodes"] = kept
+    flowchart["edges"] = [edge for edge in flowchart["edges"]
+                          if edge["source"] in kept_ids and edge["target"] in kept_ids]
+    result = http.post(f"/flowchart/{flowchart_id}", json=flowchart).json()
+
+    assert result["deleted"] > 0
+    assert result["written"] == 0
+    assert run(_row_ids, NODE_TABLE, flowchart_id) == kept_ids
+    assert run(_row_ids, EDGE_TABLE, flowchart_id) == {edge["id"] for edge in flowchart["edges"]}
+
+
+def test_node_ids_are_only_unique_within_a_flowchart(http, run, flowchart_id):
+    # Two flowcharts with the same node and edge ids keep separate rows.
+    def flowchart(fid, label):
+        return {
+            "id": fid,
+            "nodes": [{"id": node_id, "position": {"x": 0, "y": 0}, "data": {"label": label}}
+                      for node_id in ("a", "b")],
+            "edges": [{"id": "e", "source": "a", "target": "b"}]
+        }
+
+    other_id = f"{flowchart_id}-other"
+    http.post(f"/flowchart/{flowchart_id}", json=flowchart(flowchart_id, "first"))
+    http.post(f"/flowchart/{other_id}", json=flowchart(other_id, "second"))
+
+    emptied = flowchart(flowchart_id, "first")
+    emptied["nodes"], emptied["edges"] = emptied["nodes"][:1], []
+    assert http.post(f"/flowchart/{flowchart_id}", json=emptied).json()["deleted"] == 2
+
+    assert run(_row_ids, NODE_TABLE, other_id) == {"a", "b"}
+    assert run(_row_ids, EDGE_TABLE, other_id) == {"e"}
+    labels = {node["data"]["label"] for node in http.get(f"/flowchart/{other_id}/nodes").json()["nodes"]}
+    assert labels == {"second"}
+
+
+def test_rebuild_restores_the_rows_of_stored_flowcharts(http, run, flowchart_id):
+    # The migration from the legacy Nodes/Edges tables.
+    flowchart = generate_flowchart(flowchart_id, 8, "chain")
+    http.post(f"/flowchart/{flowchart_id}", json=flowchart)
+    run(_delete_rows, NODE_TABLE, flowchart_id)
+    run(_delete_rows, EDGE_TABLE, flowchart_id)
+
+    run(_rebuild_item_tables)
+
+    assert run(_row_ids, NODE_TABLE, flowchart_id) == {node["id"] for node in flowchart["nodes"]}
+    assert run(_row_ids, EDGE_TABLE, flowchart_id) == {edge["id"] for edge in flowchart["edges"]}
+    # The rows match the manifest, so saving the same flowchart writes nothing.
+    assert http.post(f"/flowchart/{flowchart_id}", json=flowchart).json()["written"] == 0
+
+
+def test_set_up_migrates_and_drops_legacy_tables(http, run, flowchart_id):
+    flowchart = generate_flowchart(flowchart_id, 8, "chain")
+    http.post(f"/flowchart/{flowchart_id}", json=flowchart)
+    run(_delete_rows, NODE_TABLE, flowchart_id)
+
+    async def set_up_with_legacy_table():
+        client = dynamodb.resource.meta.client
+        await client.create_table(
+            TableName="Nodes",
+            KeySchema=[{"AttributeName": "id", "KeyType": "HASH"}],
+            AttributeDefinitions=[{"AttributeName": "id", "AttributeType": "S"}],
+            BillingMode="PAY_PER_REQUEST"
+        )
+        await dynamodb._set_up_tables()
+        return (await client.list_tables())["TableNames"]
+
+    tables = run(set_up_with_legacy_table)
+
+    assert "Nodes" not in tables
+    assert run(_row_ids, NODE_TABLE, flowchart_id) == {node["id"] for node in flowchart["nodes"]}
@@ -0,0 +1,72 @@
+# tests/test_graph_partition.py
+from collections import Counter
+
+import app.services.llm_integration as llm_integration
+from app.services.graph_partition import partition_flowchart
+from benchmarks.generator import generate_flowchart
+
+
+def _tokens(item):
+    return 10
+
+
+def _owned(chunks, kind):
+    return Counter(str(item["id"]) for chunk in chunks for item in chunk[kind])
+
+
+def test_every_item_is_owned_by_one_chunk_within_budget():
+    flowchart = generate_flowchart("part", 120, "mixed")
+    nodes, edges = flowchart["nodes"], flowchart["edges"]
+
+    chunks = partition_flowchart(nodes, edges, 200, item_tokens=_tokens)
+
+    assert len(chunks) > 1
+    assert _owned(chunks, "nodes") == Counter(node["id"] for node in nodes)
+    assert _owned(chunks, "edges") == Counter(edge["id"] for edge in edges)
+    for chunk in chunks:
+        assert 10 * (len(chunk["nodes"]) + len(chunk["edges"])) <= 200
+
+
+def test_context_is_the_halo_of_other_chunks():
+    flowchart = generate_flowchart("halo", 60, "chain")
+    chunks = partition_flowchart(flowchart["nodes"], flowchart["edges"], 150, item_tokens=_tokens)
+    chunk_of = {node["id"]: position for position, chunk in enumerate(chunks) for node in chunk["nodes"]}
+
+    for position, chunk in enumerate(chunks):
+        owned = {node["id"] for node in chunk["nodes"]}
+        expected = {
+            other for edge in flowchart["edges"]
+            for endpoint, other in ((edge["source"], edge["target"]), (edge["target"], edge["source"]))
+            if endpoint in owned and chunk_of[other] != position
+        }
+        assert {node["id"] for node in chunk["context_nodes"]} == expected
+
+
+def test_small_components_are_packed_whole():
+    # Three separate chains of 4 nodes, 7 items each, with room for two per chunk.
+    nodes, edges = [], []
+    for chain in range(3):
+        ids = [f"c{chain}n{number}" for number in range(4)]
+        nodes += [{"id": node_id, "data": {}} for node_id in ids]
+        edges += [{"id": f"{source}>{target}", "source": source, "target": target}
+                  for source, target in zip(ids, ids[1:])]
+
+    chunks = partition_flowchart(nodes, edges, 140, item_tokens=_tokens)
+
+    assert [len(chunk["nodes"]) for chunk in chunks] == [8, 4]
+    assert all(not chunk["context_nodes"] and not chunk["context_edges"] for chunk in chunks)
+
+
+def test_large_flowchart_runs_in_several_chunks(http, llm, monkeypatch, flowchart_id):
+    monkeypatch.setattr(llm_integration, "LLM_CHUNK_TOKEN_BUDGET", 400)
+    flowchart = generate_flowchart(flowchart_id, 60, "mixed")
+    http.post(f"/flowchart/{flowchart_id}", json=flowchart)
+
+    result = http.post(f"/flowchart/{flowchart_id}/run").json()
+
+    assert result["run_stats"]["chunks"] > 1
+    assert llm.calls == result["run_stats"]["chunks"]
+    # Each chunk fills in the open properties of the items it owns.
+    empty = [(item["id"], name) for item in result["nodes"] + result["edges"]
+             for name, prop in item["data"]["properties"].items() if prop["value"] in ("", None)]
+    assert empty == []
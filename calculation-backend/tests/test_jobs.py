@@ -0,0 +1,126 @@
+# tests/test_jobs.py
+import asyncio
+import time
+
+import app.services.job_service as job_service
+from app.db.dynamodb import JOB_TABLE, dynamodb
+from app.db.job_store import DynamoDBJobStore, InMemoryJobStore
+from benchmarks.generator import generate_flowchart
+
+
+def _job(job_id: str, flowchart_id: str) -> dict:
+    return {"job_id": job_id, "flowchart_id": flowchart_id, "status": "queued"}
+
+
+def _wait_for_job(http, job_id: str, timeout: float = 10.0) -> dict:
+    deadline = time.monotonic() + timeout
+    while True:
+        job = http.get(f"/jobs/{job_id}").json()
+        if job["status"] in ("done", "failed") or time.monotonic() > deadline:
+            return job
+        time.sleep(0.05)
+
+
+async def _take_lock(flowchart_id: str, job_id: str) -> None:
+    # What another API node does when it takes over the lock of the flowchart.
+    table = await dynamodb.table(JOB_TABLE)
+    await table.put_item(Item={"job_id": f"lock#{flowchart_id}", "active_job_id": job_id,
+                               "expires_at": int(time.time()) + 60})
+
+
+def test_a_running_flowchart_is_not_queued_twice(http, llm, flowchart_id):
+    llm.latency = 0.3
+    http.post(f"/flowchart/{flowchart_id}", json=generate_flowchart(flowchart_id, 8, "chain"))
+
+    first = http.post(f"/flowchart/{flowchart_id}/jobs")
+    second = http.post(f"/flowchart/{flowchart_id}/jobs")
+    assert first.status_code == 202
+    assert second.json()["job_id"] == first.json()["job_id"]
+
+    job = _wait_for_job(http, first.json()["job_id"])
+    assert job["status"] == "done"
+    assert job["result"]["run_stats"]["chunks"] >= 1
+    assert llm.calls == job["result"]["run_stats"]["chunks"]
+
+    # Once finished, the next submission is a new job.
+    assert http.post(f"/flowchart/{flowchart_id}/jobs").json()["job_id"] != first.json()["job_id"]
+
+
+def test_job_of_a_missing_flowchart_fails(http, flowchart_id):
+    job = _wait_for_job(http, http.post(f"/flowchart/{flowchart_id}/jobs").json()["job_id"])
+    assert (job["status"], job["error"]) == ("failed", "Flowchart not found")
+    assert http.get("/jobs/nope").status_code == 404
+    assert http.get(f"/jobs/lock%23{flowchart_id}").status_code == 404
+
+
+def test_lock_expires(http, run, flowchart_id):
+    store = DynamoDBJobStore(JOB_TABLE, lock_ttl=1, retention=60)
+
+    assert run(store.create_job, _job("a", flowchart_id))["job_id"] == "a"
+    assert run(store.create_job, _job("b", flowchart_id))["job_id"] == "a"
+    assert run(store.get_job, "b") is None
+
+    # The holder crashed without releasing; its lock lapses after lock_ttl.
+    time.sleep(2.1)
+    assert run(store.create_job, _job("c", flowchart_id))["job_id"] == "c"
+    assert run(store.renew, flowchart_id, "a") is False
+    assert run(store.renew, flowchart_id, "c") is True
+
+
+def test_lock_of_a_missing_job_is_taken_over(http, run, flowchart_id):
+    store = DynamoDBJobStore(JOB_TABLE, lock_ttl=900, retention=60)
+    run(_take_lock, flowchart_id, "gone")
+
+    assert run(store.create_job, _job("a", flowchart_id))["job_id"] == "a"
+
+
+def test_released_lock_and_finished_job(http, run, flowchart_id):
+    store = DynamoDBJobStore(JOB_TABLE, lock_ttl=900, retention=60)
+    run(store.create_job, _job("a", flowchart_id))
+    run(store.update_job, "a", status="done")
+    run(store.release, flowchart_id, "a")
+
+    assert 50 < run(store.get_job, "a")["expires_at"] - time.time() <= 60
+    assert run(store.create_job, _job("b", flowchart_id))["job_id"] == "b"
+
+
+def test_run_that_loses_its_lock_fails(http, run, monkeypatch, flowchart_id):
+    async def slow_run(flowchart_id, force=False):
+        await asyncio.sleep(5)
+        return {"run_stats": {}}
+
+    store = DynamoDBJobStore(JOB_TABLE, lock_ttl=60, retention=60)
+    monkeypatch.setattr(job_service, "job_store", store)
+    monkeypatch.setattr(job_service, "LOCK_RENEW_SECONDS", 0.1)
+    monkeypatch.setattr(job_service, "run_flowchart_service", slow_run)
+    run(store.create_job, _job("a", flowchart_id))
+
+    async def run_and_lose_lock():
+        job = asyncio.ensure_future(job_service._run_job("a", flowchart_id, False))
+        await asyncio.sleep(0.2)
+        await _take_lock(flowchart_id, "other")
+        return await asyncio.wait_for(job, 2)
+
+    fields = run(run_and_lose_lock)
+
+    assert fields["status"] == "failed"
+    assert "lost the lock" in fields["error"]
+    assert run(store.get_job, "a")["status"] == "failed"
+    # The lock stays with the job that took it.
+    assert run(store.renew, flowchart_id, "other") is True
+
+
+def test_memory_store_drops_finished_jobs_after_retention():
+    async def scenario():
+        store = InMemoryJobStore(retention=0)
+        for number in range(3):
+            await store.create_job(_job(f"done{number}", f"f{number}"))
+            await store.update_job(f"done{number}", status="done")
+            await store.release(f"f{number}", f"done{number}")
+        await store.create_job(_job("live", "f"))
+        await store.update_job("live", status="running")
+        return store
+
+    store = asyncio.run(scenario())
+    assert list(store._jobs) == ["live"]
+    assert asyncio.run(store.get_job("live"))["status"] == "running"
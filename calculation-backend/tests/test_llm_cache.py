@@ -0,0 +1,68 @@
+# tests/test_llm_cache.py
+import copy
+
+from botocore.exceptions import EndpointConnectionError
+
+from app.db.dynamodb import dynamodb
+from app.services.llm_cache import flowchart_cache_key, llm_cache
+from app.services.llm_integration import get_llm_recommendations
+from benchmarks.generator import generate_flowchart
+
+
+def test_key_depends_on_the_question_only(flowchart_id):
+    flowchart = generate_flowchart(flowchart_id, 8, "chain")
+    key = flowchart_cache_key(flowchart["nodes"], flowchart["edges"])
+
+    # Positions and values the model is asked to recompute do not matter.
+    moved = copy.deepcopy(flowchart)
+    moved["nodes"][0]["position"] = {"x": 999.0, "y": -5.0}
+    moved["nodes"][1]["data"]["properties"]["chemical"]["value"] = "water"
+    assert flowchart_cache_key(moved["nodes"], moved["edges"]) == key
+    assert flowchart_cache_key(list(reversed(moved["nodes"])), moved["edges"]) == key
+
+    # Locked values, labels and the graph do.
+    locked = copy.deepcopy(flowchart)
+    locked["nodes"][1]["data"]["properties"]["chemical"] = {"value": "water", "isLocked": True}
+    relabeled = copy.deepcopy(flowchart)
+    relabeled["nodes"][1]["data"]["label"] = "other"
+    assert flowchart_cache_key(locked["nodes"], locked["edges"]) != key
+    assert flowchart_cache_key(relabeled["nodes"], relabeled["edges"]) != key
+    assert flowchart_cache_key(flowchart["nodes"], flowchart["edges"][1:]) != key
+    assert flowchart_cache_key(flowchart["nodes"], flowchart["edges"], context_nodes=flowchart["nodes"][:1]) != key
+
+
+def test_repeated_question_is_answered_from_the_cache(http, run, llm, flowchart_id):
+    flowchart = generate_flowchart(flowchart_id, 8, "chain")
+    stats = {}
+
+    first = run(get_llm_recommendations, flowchart_id, flowchart["nodes"], flowchart["edges"], stats=stats)
+    second = run(get_llm_recommendations, flowchart_id, flowchart["nodes"], flowchart["edges"], stats=stats)
+    # Without the in-process tier, the answer comes from the table.
+    llm_cache.memory.clear()
+    third = run(get_llm_recommendations, flowchart_id, flowchart["nodes"], flowchart["edges"], stats=stats)
+
+    assert "error" not in first
+    assert first == second == third
+    assert llm.calls == 1
+    assert (stats["cache_misses"], stats["cache_hits"]) == (1, 2)
+
+    # `force` asks the model again.
+    run(get_llm_recommendations, flowchart_id, flowchart["nodes"], flowchart["edges"], force=True)
+    assert llm.calls == 2
+
+
+def test_table_failures_are_misses(http, run, llm, monkeypatch, flowchart_id):
+    async def unreachable(name):
+        raise EndpointConnectionError(endpoint_url="http://dynamodb.invalid")
+
+    monkeypatch.setattr(dynamodb, "table", unreachable)
+    flowchart = generate_flowchart(flowchart_id, 8, "chain")
+    stats = {}
+
+    first = run(get_llm_recommendations, flowchart_id, flowchart["nodes"], flowchart["edges"], stats=stats)
+    llm_cache.memory.clear()
+    second = run(get_llm_recommendations, flowchart_id, flowchart["nodes"], flowchart["edges"], stats=stats)
+
+    assert "error" not in first and first == second
+    assert llm.calls == 2
+    assert stats["cache_misses"] == 2
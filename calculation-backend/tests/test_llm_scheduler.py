@@ -0,0 +1,150 @@
+# tests/test_llm_scheduler.py
+import asyncio
+
+import httpx
+import openai
+import pytest
+
+import app.services.llm_scheduler as llm_scheduler
+from app.services.llm_scheduler import LLMScheduler, TokenBucket, priority_scope
+
+
+def _connection_error() -> openai.APIConnectionError:
+    return openai.APIConnectionError(request=httpx.Request("POST", "http://model.invalid"))
+
+
+def _rate_limit_error(retry_after: str) -> openai.RateLimitError:
+    response = httpx.Response(429, headers={"retry-after": retry_after},
+                              request=httpx.Request("POST", "http://model.invalid"))
+    return openai.RateLimitError("rate limited", response=response, body=None)
+
+
+def test_token_bucket():
+    bucket = TokenBucket(600)
+    bucket.take(600, bucket.updated)
+    # 10 per second come back.
+    assert bucket.delay(100, bucket.updated) == pytest.approx(10)
+    assert bucket.delay(100, bucket.updated + 4) == pytest.approx(6)
+    # A request larger than the bucket waits for a full bucket, not forever.
+    assert bucket.delay(5000, bucket.updated + 60) == 0
+    assert TokenBucket(0).delay(10 ** 9, 0) == 0
+
+
+def test_reservation_is_settled_with_actual_usage():
+    async def scenario():
+        scheduler = LLMScheduler(600, 60000, 4, 0, 500)
+        async with scheduler.request(1000) as reservation:
+            assert reservation.reserved == 1500
+            reserved_level = scheduler._tokens.level
+            await reservation.settle(1200)
+        return scheduler, reserved_level
+
+    scheduler, reserved_level = asyncio.run(scenario())
+    assert reserved_level == pytest.approx(60000 - 1500, abs=5)
+    assert scheduler._tokens.level == pytest.approx(60000 - 1200, abs=5)
+    assert scheduler._requests.level == pytest.approx(599, abs=0.1)
+    assert scheduler._in_flight == 0
+
+
+def test_every_retry_is_charged(monkeypatch):
+    monkeypatch.setattr(llm_scheduler, "LLM_RETRY_BASE_SECONDS", 0.01)
+    attempts = []
+
+    async def scenario():
+        scheduler = LLMScheduler(60, 6000, 1, 3, 0)
+
+        async def send():
+            attempts.append(scheduler._in_flight)
+            if len(attempts) < 3:
+                raise _connection_error()
+            return "answer"
+
+        async with scheduler.request(100) as reservation:
+            answer = await reservation.call(send)
+        return scheduler, answer
+
+    scheduler, answer = asyncio.run(scenario())
+    assert answer == "answer"
+    # Each attempt held the only slot, and was charged a request and its tokens.
+    assert attempts == [1, 1, 1]
+    assert scheduler._requests.level == pytest.approx(57, abs=0.2)
+    assert scheduler._tokens.level == pytest.approx(6000 - 300, abs=20)
+    assert scheduler._in_flight == 0
+
+
+def test_last_failure_is_raised(monkeypatch):
+    monkeypatch.setattr(llm_scheduler, "LLM_RETRY_BASE_SECONDS", 0.01)
+
+    async def scenario():
+        scheduler = LLMScheduler(0, 0, 1, 2, 0)
+        calls = []
+
+        async def send():
+            calls.append(1)
+            raise _connection_error()
+
+        with pytest.raises(openai.APIConnectionError):
+            async with scheduler.request(10) as reservation:
+                await reservation.call(send)
+        return scheduler, len(calls)
+
+    scheduler, calls = asyncio.run(scenario())
+    assert calls == 3
+    assert scheduler._in_flight == 0
+
+
+def test_rate_limit_pauses_everyone():
+    async def scenario():
+        scheduler = LLMScheduler(0, 0, 4, 1, 0)
+        failed = []
+
+        async def send():
+            if not failed:
+                failed.append(1)
+                raise _rate_limit_error("0.3")
+            return "answer"
+
+        async def other():
+            await asyncio.sleep(0.05)
+            started = loop.time()
+            async with scheduler.request(10):
+                return loop.time() - started
+
+        loop = asyncio.get_running_loop()
+        async with scheduler.request(10) as reservation:
+            waited, answer = await asyncio.gather(other(), reservation.call(send))
+        return waited, answer
+
+    waited, answer = asyncio.run(scenario())
+    assert answer == "answer"
+    assert waited >= 0.2
+
+
+def test_in_flight_limit_and_priority_order():
+    async def scenario():
+        scheduler = LLMScheduler(0, 0, 2, 0, 0)
+        order, running, peak = [], [0], [0]
+
+        async def request(name, priority):
+            with priority_scope(priority):
+                async with scheduler.request(10):
+                    order.append(name)
+                    running[0] += 1
+                    peak[0] = max(peak[0], running[0])
+                    await asyncio.sleep(0.02)
+                    running[0] -= 1
+
+        # Two requests take the slots; of those queued behind them, priority 0 goes first.
+        first = [asyncio.ensure_future(request(f"first{number}", 0)) for number in range(2)]
+        await asyncio.sleep(0)
+        batch = [asyncio.ensure_future(request(f"batch{number}", 10)) for number in range(3)]
+        await asyncio.sleep(0)
+        interactive = asyncio.ensure_future(request("interactive", 0))
+        await asyncio.gather(*first, *batch, interactive)
+        return order, peak[0]
+
+    order, peak = asyncio.run(scenario())
+    assert peak == 2
+    assert order[:2] == ["first0", "first1"]
+    assert order[2] == "interactive"
+    assert order[3:] == ["batch0", "batch1", "batch2"]
@@ -0,0 +1,75 @@
+# tests/test_metrics.py
+import re
+
+from app.utils.metrics import Counter, Histogram, MetricsRegistry, RequestMetrics, end_request, span, start_request
+from benchmarks.generator import generate_flowchart
+
+
+def _value(text: str, sample: str) -> float:
+    match = re.search(rf"^{re.escape(sample)} (\S+)$", text, re.M)
+    assert match, f"{sample} not exported"
+    return float(match.group(1))
+
+
+def test_prometheus_text_format():
+    registry = MetricsRegistry()
+    calls = registry.counter("calls", "Calls made.", ("kind",))
+    sizes = registry.histogram("sizes", "Sizes seen.", buckets=(10, 100))
+    calls.inc(kind='say "hi"')
+    calls.inc(2, kind='say "hi"')
+    for size in (5, 50, 500):
+        sizes.observe(size)
+
+    text = registry.render()
+
+    assert '# TYPE calls_total counter' in text
+    assert 'calls_total{kind="say \\"hi\\""} 3' in text
+    assert 'sizes_bucket{le="10"} 1' in text
+    assert 'sizes_bucket{le="100"} 2' in text
+    assert 'sizes_bucket{le="+Inf"} 3' in text
+    assert "sizes_sum 555" in text and "sizes_count 3" in text
+
+
+def test_spans_add_up_per_request():
+    request_metrics = RequestMetrics()
+    token = start_request(request_metrics)
+    try:
+        for _ in range(3):
+            with span("test.stage"):
+                pass
+    finally:
+        end_request(token)
+
+    # Repeated stages are summed and counted.
+    assert re.fullmatch(r'test\.stage;dur=[\d.]+;desc="3x"', request_metrics.server_timing())
+
+
+def test_requests_report_server_timing_and_metrics(http, llm, flowchart_id):
+    http.post(f"/flowchart/{flowchart_id}", json=generate_flowchart(flowchart_id, 8, "chain"))
+    before = http.get("/metrics").text
+
+    response = http.post(f"/flowchart/{flowchart_id}/run")
+
+    stages = dict(re.findall(r"([\w.]+);dur=([\d.]+)", response.headers["server-timing"]))
+    assert {"app", "flowchart.sync_tables", "llm.request", "llm.solve"} <= set(stages)
+    assert float(stages["app"]) >= float(stages["llm.solve"])
+
+    after = http.get("/metrics")
+    assert after.headers["content-type"].startswith("text/plain")
+    run_count = 'http_request_duration_seconds_count{method="POST",route="/flowchart/{flowchart_id}/run",status="200"}'
+    previous_runs = _value(before, run_count) if run_count in before else 0
+    assert _value(after.text, run_count) == previous_runs + 1
+    assert _value(after.text, 'llm_tokens_total{kind="prompt"}') > 0
+    assert "dynamodb_payload_bytes" in after.text
+    assert 'stage_duration_seconds_count{stage="llm.request"}' in after.text
+
+
+def test_counters_and_histograms_are_labelled_independently():
+    counter = Counter("c", "doc", ("a",))
+    histogram = Histogram("h", "doc", ("a",), buckets=(1,))
+    counter.inc(a="x")
+    counter.inc(a="y")
+    histogram.observe(2, a="x")
+
+    assert list(counter.render())[2:] == ['c_total{a="x"} 1', 'c_total{a="y"} 1']
+    assert 'h_bucket{a="x",le="1"} 0' in list(histogram.render())
@@ -0,0 +1,124 @@
+# tests/test_process_solver.py
+from typing import Any, Dict, Optional
+
+import pytest
+
+from app.services.graph_index import GraphIndex
+from app.services.process_solver import COMPUTED_SOURCE, SOURCE_FIELD, solve_process_balances
+from app.utils.units import to_base
+
+
+def _prop(value: str = "", locked: bool = False, source: Optional[str] = None) -> Dict[str, Any]:
+    prop = {"value": value, "isLocked": locked}
+    if source is not None:
+        prop[SOURCE_FIELD] = source
+    return prop
+
+
+def _node(node_id: str, node_type: str) -> Dict[str, Any]:
+    return {"id": node_id, "type": node_type,
+            "data": {"label": node_id, "properties": {"operatingTemperature": _prop()}}}
+
+
+def _edge(edge_id: str, source: str, target: str, flow: Dict[str, Any] = None,
+          temperature: Dict[str, Any] = None) -> Dict[str, Any]:
+    return {"id": edge_id, "source": source, "target": target,
+            "data": {"properties": {"flowRate": flow or _prop(), "temperature": temperature or _prop()}}}
+
+
+def _value(item: Dict[str, Any], name: str) -> Dict[str, Any]:
+    return item["data"]["properties"][name]
+
+
+def test_split_merge_network_is_solved():
+    # Two feeds are mixed and the mix is split in two; one product flow is locked.
+    nodes = [_node("a", "input"), _node("b", "input"), _node("mixer", "mixer"),
+             _node("splitter", "splitter"), _node("c", "output"), _node("d", "output")]
+    edges = [
+        _edge("e1", "a", "mixer", _prop("100 kg/h", True), _prop("20 °C", True)),
+        _edge("e2", "b", "mixer", _prop("50 kg/h", True), _prop("80 °C", True)),
+        _edge("e3", "mixer", "splitter"),
+        _edge("e4", "splitter", "c", _prop("30 kg/h", True)),
+        _edge("e5", "splitter", "d"),
+    ]
+    by_id = {edge["id"]: edge for edge in edges}
+
+    result = solve_process_balances(GraphIndex(nodes, edges))
+
+    assert result["balance_conflicts"] == 0
+    assert to_base(_value(by_id["e3"], "flowRate")["value"], "mass_flow") == pytest.approx(150 / 3600)
+    assert to_base(_value(by_id["e5"], "flowRate")["value"], "mass_flow") == pytest.approx(120 / 3600)
+    assert _value(by_id["e5"], "flowRate")["value"].endswith("kg/h")
+    assert _value(by_id["e3"], "flowRate")[SOURCE_FIELD] == COMPUTED_SOURCE
+    # Flow-weighted mixing, then the split keeps the temperature.
+    for edge_id in ("e3", "e4", "e5"):
+        assert to_base(_value(by_id[edge_id], "temperature")["value"], "temperature") == pytest.approx(313.15)
+    assert to_base(_value(nodes[2], "operatingTemperature")["value"], "temperature") == pytest.approx(313.15)
+    assert {"e3", "e4", "e5"} <= result["edges"]
+    assert "mixer" in result["nodes"]
+    # Locked values are never touched.
+    assert _value(by_id["e4"], "flowRate") == _prop("30 kg/h", True)
+
+
+def test_underdetermined_flows_are_left_to_the_model():
+    # A feed split in two with neither product locked: the split ratio is unknown.
+    nodes = [_node("a", "input"), _node("splitter", "splitter"), _node("c", "output"), _node("d", "output")]
+    edges = [
+        _edge("e1", "a", "splitter", _prop("100 kg/h", True)),
+        _edge("e2", "splitter", "c", _prop("40 kg/h", source=COMPUTED_SOURCE)),
+        _edge("e3", "splitter", "d"),
+    ]
+
+    result = solve_process_balances(GraphIndex(nodes, edges))
+
+    assert _value(edges[2], "flowRate") == _prop()
+    # A value computed by an earlier run that no longer follows is released to the model.
+    assert _value(edges[1], "flowRate") == _prop("40 kg/h")
+    assert "e2" in result["edges"]
+    assert result["balance_conflicts"] == 0
+
+
+def test_locking_one_product_determines_the_other():
+    nodes = [_node("a", "input"), _node("splitter", "splitter"), _node("c", "output"), _node("d", "output")]
+    edges = [
+        _edge("e1", "a", "splitter", _prop("2 t/h", True)),
+        _edge("e2", "splitter", "c", _prop("500 kg/h", True)),
+        _edge("e3", "splitter", "d"),
+    ]
+
+    solve_process_balances(GraphIndex(nodes, edges))
+
+    assert to_base(_value(edges[2], "flowRate")["value"], "mass_flow") == pytest.approx(1500 / 3600)
+
+
+def test_conflicting_locked_flows_are_reported_and_not_propagated():
+    # 100 kg/h go in and 80 kg/h come out of a closed pair of valves: the locked values
+    # contradict each other, so the flow between the valves is not filled in.
+    nodes = [_node("a", "input"), _node("v1", "valve"), _node("v2", "valve"), _node("b", "output")]
+    edges = [
+        _edge("e1", "a", "v1", _prop("100 kg/h", True)),
+        _edge("e2", "v1", "v2"),
+        _edge("e3", "v2", "b", _prop("80 kg/h", True)),
+    ]
+
+    result = solve_process_balances(GraphIndex(nodes, edges))
+
+    assert result["balance_conflicts"] == 1
+    assert _value(edges[1], "flowRate") == _prop()
+    assert _value(edges[0], "flowRate") == _prop("100 kg/h", True)
+    assert _value(edges[2], "flowRate") == _prop("80 kg/h", True)
+
+
+def test_consistent_locked_flows_fill_the_chain():
+    nodes = [_node("a", "input"), _node("v1", "valve"), _node("v2", "valve"), _node("b", "output")]
+    edges = [
+        _edge("e1", "a", "v1", _prop("100 kg/h", True)),
+        _edge("e2", "v1", "v2"),
+        _edge("e3", "v2", "b"),
+    ]
+
+    result = solve_process_balances(GraphIndex(nodes, edges))
+
+    assert result["balance_conflicts"] == 0
+    for edge in edges[1:]:
+        assert to_base(_value(edge, "flowRate")["value"], "mass_flow") == pytest.approx(100 / 3600)
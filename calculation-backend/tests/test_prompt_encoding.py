@@ -0,0 +1,70 @@
+# tests/test_prompt_encoding.py
+import asyncio
+
+import app.services.llm_integration as llm_integration
+from app.config import LLM_MODEL
+from app.services.llm_integration import build_flowchart_prompt, get_llm_recommendations
+from app.services.prompt_encoding import build_compact_flowchart_prompt, expand_compact_response
+from app.utils.token_budget import count_tokens
+from benchmarks.fakes import answer_prompt
+from benchmarks.generator import generate_flowchart
+
+
+def _rows(prompt: str, section: str):
+    return prompt.split(f"\n{section}:\n", 1)[1].split("\n\n", 1)[0].splitlines()
+
+
+def test_rows_list_locked_values_and_open_numbers():
+    nodes = [{"id": "t1", "data": {"label": "Tank | main", "properties": {
+        "capacity": {"value": "10 m3", "isLocked": True},
+        "moc": {"value": "", "isLocked": False},
+        "duty": {"value": "3 kW", "isLocked": False, "source": "computed"}
+    }}}]
+    edges = [{"id": "e1", "source": "t1", "target": "p1", "data": {"properties": {
+        "flowRate": {"value": "5 kg/h", "isLocked": False}
+    }}}]
+
+    prompt = build_compact_flowchart_prompt("fc", nodes, edges)
+
+    assert "Property numbers: 0 capacity | 1 duty | 2 moc | 3 flowRate\n" in prompt
+    node_row, = _rows(prompt, "Nodes")
+    assert node_row.startswith('t1|"Tank | main"|')
+    # Locked and computed values are given; open ones only by number, without their value.
+    assert node_row.endswith("|0=10 m3;1=3 kW|2")
+    assert _rows(prompt, "Edges") == ["e1|t1>p1||3"]
+    assert "5 kg/h" not in prompt
+
+
+def test_compact_prompt_is_smaller_than_the_verbose_one():
+    flowchart = generate_flowchart("size", 40, "mixed")
+    compact = build_compact_flowchart_prompt("size", flowchart["nodes"], flowchart["edges"])
+    verbose = build_flowchart_prompt("size", flowchart["nodes"], flowchart["edges"])
+    assert count_tokens(compact, LLM_MODEL) * 2 < count_tokens(verbose, LLM_MODEL)
+
+
+def test_compact_answer_is_expanded_to_the_standard_form():
+    flowchart = generate_flowchart("answer", 8, "chain")
+    prompt = build_compact_flowchart_prompt("answer", flowchart["nodes"], flowchart["edges"])
+
+    answer = expand_compact_response(answer_prompt(prompt))
+
+    assert set(answer["nodes"]) == {node["id"] for node in flowchart["nodes"]}
+    node = flowchart["nodes"][1]
+    assert answer["nodes"][node["id"]]["properties"] == {
+        name: {"value": "1.0", "isLocked": False} for name in node["data"]["properties"]
+    }
+    # The feed's locked values are not asked for.
+    feed = next(edge for edge in flowchart["edges"] if edge["data"]["properties"]["flowRate"]["isLocked"])
+    assert feed["id"] not in answer["edges"]
+    # Answers in the standard form are left alone.
+    assert expand_compact_response(answer) == answer
+
+
+def test_prompt_over_the_limit_is_refused(llm, monkeypatch):
+    monkeypatch.setattr(llm_integration, "LLM_PROMPT_TOKEN_LIMIT", 50)
+    flowchart = generate_flowchart("limit", 20, "chain")
+
+    result = asyncio.run(get_llm_recommendations("limit", flowchart["nodes"], flowchart["edges"], force=True))
+
+    assert result["error"] == "Prompt exceeds token limit"
+    assert llm.calls == 0
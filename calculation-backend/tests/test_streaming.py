@@ -0,0 +1,105 @@
+# tests/test_streaming.py
+import json
+import random
+
+import pytest
+
+import app.services.llm_integration as llm_integration
+from app.utils.incremental_json import IncrementalBlockParser
+from benchmarks.fakes import FakeLLMClient
+from benchmarks.generator import generate_flowchart
+
+ANSWER = {
+    "nodes": {
+        "a": {"properties": {"moc": {"value": "SS316 {\"grade\": \"L\"}", "isLocked": False}}},
+        "b\"}": {"properties": {"sizes": [[1, 2], {"x": "]}"}], "note": "back\\slash é"}},
+        "c": {}
+    },
+    "edges": {
+        "e1": {"properties": {"flowRate": {"value": "10 kg/h"}}}
+    }
+}
+EXPECTED = [(section, item_id, block) for section, blocks in ANSWER.items() for item_id, block in blocks.items()]
+TEXT = "```json\n" + json.dumps(ANSWER, indent=1) + "\n```"
+
+
+def _feed(pieces):
+    parser = IncrementalBlockParser()
+    blocks = [block for piece in pieces for block in parser.feed(piece)]
+    return parser, blocks
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_parser_finds_the_same_blocks_however_the_answer_is_split(seed):
+    rng = random.Random(seed)
+    cuts = sorted(rng.sample(range(1, len(TEXT)), rng.randint(1, 40)))
+    pieces = [TEXT[start:end] for start, end in zip([0] + cuts, cuts + [len(TEXT)])]
+
+    parser, blocks = _feed(pieces)
+
+    assert blocks == EXPECTED
+    assert parser.text == TEXT
+
+
+def test_parser_one_character_at_a_time():
+    parser, blocks = _feed(TEXT)
+    assert blocks == EXPECTED
+    assert parser.text == TEXT
+
+
+def test_parser_reports_blocks_as_soon_as_they_close():
+    parser = IncrementalBlockParser()
+    assert parser.feed('{"nodes": {"a": {"properties": {"x": ') == []
+    assert parser.feed('"1"}}, "b": {') == [("nodes", "a", {"properties": {"x": "1"}})]
+    assert parser.feed("}}}") == [("nodes", "b", {})]
+
+
+def _lines(response):
+    return [json.loads(line) for line in response.text.splitlines()]
+
+
+def test_stream_yields_items_then_done(http, llm, flowchart_id):
+    flowchart = generate_flowchart(flowchart_id, 12, "chain")
+    http.post(f"/flowchart/{flowchart_id}", json=flowchart)
+
+    lines = _lines(http.post(f"/flowchart/{flowchart_id}/run/stream"))
+
+    done = lines[-1]
+    assert done["type"] == "done"
+    assert {line["type"] for line in lines[:-1]} <= {"node", "edge"}
+    streamed = {line["id"] for line in lines if line["type"] == "node"}
+    assert streamed == {node["id"] for node in flowchart["nodes"]}
+    # The last line of each node (solved values come first, the model's later) is what got stored.
+    stored = http.get(f"/flowchart/{flowchart_id}")
+    assert stored.headers["etag"] == f'"{done["version"]}"'
+    stored_nodes = {node["id"]: node["data"]["properties"] for node in stored.json()["nodes"]}
+    assert {line["id"]: line["properties"] for line in lines if line["type"] == "node"} == stored_nodes
+
+    assert http.post("/flowchart/missing/run/stream").status_code == 404
+
+
+class _UnparsableAnswers(FakeLLMClient):
+    # Streams valid blocks, but the answer as a whole cannot be parsed.
+    async def _stream(self, text, duration):
+        async for event in super()._stream(text + "} trailing", duration):
+            yield event
+
+
+def test_blocks_of_a_failed_answer_are_rolled_back(http, monkeypatch, flowchart_id):
+    monkeypatch.setattr(llm_integration, "_client", _UnparsableAnswers(latency=0, tokens_per_second=0))
+    flowchart = generate_flowchart(flowchart_id, 12, "chain")
+    http.post(f"/flowchart/{flowchart_id}", json=flowchart)
+
+    lines = _lines(http.post(f"/flowchart/{flowchart_id}/run/stream"))
+
+    streamed = [line for line in lines if line["type"] in ("node", "edge") and not line.get("reverted")]
+    reverted = {(line["type"], line["id"]): line["properties"] for line in lines if line.get("reverted")}
+    assert lines[-1]["type"] == "done"
+    assert reverted
+    assert {(line["type"], line["id"]) for line in streamed} >= set(reverted)
+    # No model value survives, in the stream or in the store.
+    for properties in reverted.values():
+        assert all(prop.get("source") != "llm" for prop in properties.values())
+    stored = http.get(f"/flowchart/{flowchart_id}").json()
+    assert all(prop.get("source") != "llm"
+               for item in stored["nodes"] + stored["edges"] for prop in item["data"]["properties"].values())
@@ -0,0 +1,78 @@
+# tests/test_versions.py
+import copy
+
+from benchmarks.generator import generate_flowchart
+
+
+def test_conditional_get(http, flowchart_id):
+    flowchart = generate_flowchart(flowchart_id, 8, "chain")
+    saved = http.post(f"/flowchart/{flowchart_id}", json=flowchart)
+    assert saved.json()["version"] == 1
+    assert saved.headers["etag"] == '"1"'
+
+    read = http.get(f"/flowchart/{flowchart_id}")
+    assert read.headers["etag"] == '"1"'
+    assert read.json()["version"] == 1
+    not_modified = http.get(f"/flowchart/{flowchart_id}", headers={"If-None-Match": '"1"'})
+    assert not_modified.status_code == 304
+    assert not_modified.content == b""
+
+    http.post(f"/flowchart/{flowchart_id}", json=flowchart)
+    assert http.get(f"/flowchart/{flowchart_id}", headers={"If-None-Match": '"1"'}).status_code == 200
+
+    # A projection has an ETag of its own.
+    projected = http.get(f"/flowchart/{flowchart_id}", params={"fields": "id,notes"})
+    etag = projected.headers["etag"]
+    assert etag.startswith('"2-')
+    assert http.get(f"/flowchart/{flowchart_id}", params={"fields": "id,notes"},
+                    headers={"If-None-Match": etag}).status_code == 304
+    assert http.get(f"/flowchart/{flowchart_id}", headers={"If-None-Match": etag}).status_code == 200
+
+    assert http.get("/flowchart/missing", headers={"If-None-Match": '"1"'}).status_code == 404
+
+
+def test_conditional_save(http, flowchart_id):
+    flowchart = generate_flowchart(flowchart_id, 8, "chain")
+    assert http.post(f"/flowchart/{flowchart_id}", json=flowchart, headers={"If-Match": "*"}).status_code == 412
+    http.post(f"/flowchart/{flowchart_id}", json=flowchart)
+
+    assert http.post(f"/flowchart/{flowchart_id}", json=flowchart, headers={"If-Match": '"1"'}).json()["version"] == 2
+    stale = http.post(f"/flowchart/{flowchart_id}", json=flowchart, headers={"If-Match": '"1"'})
+    assert stale.status_code == 409
+    assert http.post(f"/flowchart/{flowchart_id}", json={**flowchart, "version": 1}).status_code == 409
+    assert http.post(f"/flowchart/{flowchart_id}", json={**flowchart, "version": 2}).json()["version"] == 3
+    assert http.post(f"/flowchart/{flowchart_id}", json=flowchart, headers={"If-Match": "*"}).json()["version"] == 4
+    assert http.post(f"/flowchart/{flowchart_id}", json=flowchart, headers={"If-Match": "nonsense"}).status_code == 400
+    # Rejected saves changed nothing.
+    assert http.get(f"/flowchart/{flowchart_id}").headers["etag"] == '"4"'
+
+
+def test_rejected_save_leaves_the_winner_in_place(http, flowchart_id):
+    flowchart = generate_flowchart(flowchart_id, 8, "chain")
+    http.post(f"/flowchart/{flowchart_id}", json=flowchart)
+
+    # Two editors start from version 1; the first one to save wins.
+    first, second = copy.deepcopy(flowchart), copy.deepcopy(flowchart)
+    first["nodes"][2]["data"]["label"] = "first"
+    second["nodes"][2]["data"]["label"] = "second"
+    second["nodes"].pop()
+    assert http.post(f"/flowchart/{flowchart_id}", json=first, headers={"If-Match": '"1"'}).status_code == 200
+    assert http.post(f"/flowchart/{flowchart_id}", json=second, headers={"If-Match": '"1"'}).status_code == 409
+
+    stored = http.get(f"/flowchart/{flowchart_id}").json()
+    listed = {node["id"]: node for node in http.get(f"/flowchart/{flowchart_id}/nodes").json()["nodes"]}
+    assert stored["nodes"][2]["data"]["label"] == "first"
+    assert listed[first["nodes"][2]["id"]]["data"]["label"] == "first"
+    assert len(listed) == len(first["nodes"])
+
+
+def test_run_without_changes_keeps_the_version(http, llm, flowchart_id):
+    http.post(f"/flowchart/{flowchart_id}", json=generate_flowchart(flowchart_id, 8, "chain"))
+    ran = http.post(f"/flowchart/{flowchart_id}/run").json()
+    assert ran["version"] == 2
+    etag = http.get(f"/flowchart/{flowchart_id}").headers["etag"]
+
+    assert http.post(f"/flowchart/{flowchart_id}/run").json()["version"] == 2
+    done = http.post(f"/flowchart/{flowchart_id}/run/stream").text.splitlines()[-1]
+    assert '"version": 2' in done
+    assert http.get(f"/flowchart/{flowchart_id}", headers={"If-None-Match": etag}).status_code == 304
@@ -0,0 +1,92 @@
+# tests/test_viewport.py
+import math
+import uuid
+from typing import Dict, List, Optional
+
+import pytest
+
+from app.config import FLOWCHART_GRID_CELL_SIZE
+from benchmarks.generator import generate_flowchart
+
+BOX = (100.0, 0.0, 1300.0, 700.0)
+
+
+@pytest.fixture(scope="module")
+def flowchart(http):
+    # Only read by the tests, so saved once.
+    flowchart = generate_flowchart(f"test-viewport-{uuid.uuid4().hex[:12]}", 150, "mixed")
+    http.post(f"/flowchart/{flowchart['id']}", json=flowchart)
+    return flowchart
+
+
+def _list(http, flowchart_id: str, kind: str, **params) -> List[Dict]:
+    # Every page of a listing.
+    items, cursor = [], None
+    while True:
+        page = http.get(f"/flowchart/{flowchart_id}/{kind}",
+                        params={**params, **({"cursor": cursor} if cursor else {})}).json()
+        items += page[kind]
+        cursor = page["cursor"]
+        if not cursor:
+            return items
+
+
+def _inside(position: Dict[str, float], box=BOX) -> bool:
+    min_x, min_y, max_x, max_y = box
+    return min_x <= position["x"] <= max_x and min_y <= position["y"] <= max_y
+
+
+def _cell(position: Optional[Dict[str, float]]):
+    return math.floor(position["x"] / FLOWCHART_GRID_CELL_SIZE), math.floor(position["y"] / FLOWCHART_GRID_CELL_SIZE)
+
+
+def test_fields_projection(http, flowchart):
+    response = http.get(f"/flowchart/{flowchart['id']}", params={"fields": "id,notes"})
+    assert set(response.json()) <= {"id", "notes", "version"}
+    assert response.headers["etag"] != http.get(f"/flowchart/{flowchart['id']}").headers["etag"]
+
+    nodes = _list(http, flowchart["id"], "nodes", fields="position,data.label", limit=40)
+    assert len(nodes) == len(flowchart["nodes"])
+    assert all(set(node) <= {"id", "position", "data"} and set(node["data"]) == {"label"} for node in nodes)
+
+
+def test_nodes_in_a_box(http, flowchart):
+    expected = {node["id"] for node in flowchart["nodes"] if _inside(node["position"])}
+    assert expected
+
+    listed = _list(http, flowchart["id"], "nodes", bbox=",".join(map(str, BOX)), limit=7)
+
+    assert sorted(node["id"] for node in listed) == sorted(expected)
+
+
+def test_very_large_box_lists_everything(http, flowchart):
+    listed = _list(http, flowchart["id"], "nodes", bbox="-1e7,-1e7,1e7,1e7", limit=1000)
+    assert sorted(node["id"] for node in listed) == sorted(node["id"] for node in flowchart["nodes"])
+
+
+def test_edges_touching_a_box(http, flowchart):
+    position = {node["id"]: node["position"] for node in flowchart["nodes"]}
+    cells = {_cell({"x": x, "y": y})
+             for x in range(int(BOX[0]), int(BOX[2]) + 1, 50) for y in range(int(BOX[1]), int(BOX[3]) + 1, 50)}
+
+    listed = _list(http, flowchart["id"], "edges", bbox=",".join(map(str, BOX)), limit=9)
+    ids = [edge["id"] for edge in listed]
+
+    assert len(ids) == len(set(ids))
+    # Every edge with an endpoint in the box, and only edges with an endpoint in a cell of it.
+    assert {edge["id"] for edge in flowchart["edges"]
+            if _inside(position[edge["source"]]) or _inside(position[edge["target"]])} <= set(ids)
+    assert all(_cell(position[edge["source"]]) in cells or _cell(position[edge["target"]]) in cells
+               for edge in listed)
+
+
+def test_full_listing_pages(http, flowchart):
+    listed = _list(http, flowchart["id"], "edges", limit=13)
+    assert sorted(edge["id"] for edge in listed) == sorted(edge["id"] for edge in flowchart["edges"])
+
+
+def test_bad_requests(http, flowchart):
+    assert http.get(f"/flowchart/{flowchart['id']}/nodes", params={"bbox": "1,2,3"}).status_code == 400
+    assert http.get(f"/flowchart/{flowchart['id']}/nodes", params={"bbox": "5,0,1,1"}).status_code == 400
+    assert http.get(f"/flowchart/{flowchart['id']}/edges", params={"limit": 0}).status_code == 400
+    assert http.get(f"/flowchart/{flowchart['id']}/nodes", params={"cursor": "garbage"}).status_code == 400